@@ -2,7 +2,23 @@ from django.contrib import admin
 from .models import *
 # Register your models here.
 admin.site.register(CustomUser)
-admin.site.register(Appointment)
+admin.site.register(Patient)
 admin.site.register(Doctor)
-admin.site.register(MedicalRecord)
-admin.site.register(Patient)
\ No newline at end of file
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(admin.ModelAdmin):
+    # __str__ reads the doctor's name
+    list_select_related = ['doctor']
+
+
+@admin.register(MedicalRecord)
+class MedicalRecordAdmin(admin.ModelAdmin):
+    # __str__ reads the patient's and doctor's names
+    list_select_related = ['patient', 'doctor']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'name']
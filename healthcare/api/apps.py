@@ -6,4 +6,10 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        import api.signals
\ No newline at end of file
+        import api.signals
+        # registers the background jobs, in workers too
+        import api.tasks
+
+        from django.db.backends.signals import connection_created
+        from api.metrics import install_query_recorder
+        connection_created.connect(install_query_recorder, dispatch_uid='api.metrics')
@@ -0,0 +1,21 @@
+from django.urls import path
+
+from . import urls
+from .async_views import *
+
+# the routes of api.urls, with the read endpoints served by the async views
+# (writes on the same URLs stay sync), see healthcare.asgi_urls
+ASYNC_VIEWS = {
+    'patient-profile': AsyncPatientProfileView,
+    'doctor-profile': AsyncDoctorProfileView,
+    'appointments': AsyncAppointmentView,
+    'doctor-availability': AsyncDoctorAvailabilityView,
+    'doctor-availability-search': AsyncDoctorAvailabilitySearchView,
+    'medical-records': AsyncMedicalRecordListCreateView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+
+from .availability import aget_slot, aget_slots, date_range, slot_rows
+from .availability_cache import aget_or_build, aget_version, make_etag
+from .caller import aget_caller
+from .models import Doctor
+from .pagination import AppointmentCursorPagination, MedicalRecordCursorPagination
+from .serializers import MedicalRecordSerializer
+from .views import (
+    AppointmentView, DoctorAvailabilitySearchView, DoctorAvailabilityView, DoctorProfileView,
+    MedicalRecordListCreateView, PatientProfileView, get_expand,
+)
+
+
+async def alist(queryset):
+    return [instance async for instance in queryset]
+
+
+class AsyncAPIView:
+    """
+    Mixin that runs an APIView natively under ASGI.
+
+    Async handlers run on the event loop, with authentication and permission
+    checks (which may query) moved to a worker thread first. Sync handlers, the
+    write paths, run entirely in a worker thread like Django runs sync views.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(self.handle_sync)(handler, request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def handle_sync(self, handler, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        return handler(request, *args, **kwargs)
+
+
+class AsyncPatientProfileView(AsyncAPIView, PatientProfileView):
+    async def get(self, request):
+        patient = (await aget_caller(request)).patient
+        if patient is None:
+            return Response({"error": "Patient profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.serializer_class(patient).data, status=status.HTTP_200_OK)
+
+
+class AsyncDoctorProfileView(AsyncAPIView, DoctorProfileView):
+    async def get(self, request):
+        doctor = (await aget_caller(request)).doctor
+        if doctor is None:
+            return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.serializer_class(doctor).data, status=status.HTTP_200_OK)
+
+
+class AsyncAppointmentView(AsyncAPIView, AppointmentView):
+    async def get(self, request):
+        appointments = self.caller_queryset(await aget_caller(request))
+        if appointments is None:
+            return Response({"error": "Unauthorized user."}, status=status.HTTP_403_FORBIDDEN)
+
+        paginator = AppointmentCursorPagination()
+        page = await paginator.apaginate_queryset(appointments, request, view=self)
+        return self.list_response(request, paginator, page)
+
+
+class AsyncDoctorAvailabilityView(AsyncAPIView, DoctorAvailabilityView):
+    async def get(self, request, doctor_id):
+        date_str = request.query_params.get('date')  # YYYY-MM-DD
+        time_str = request.query_params.get('time')  # Optional HH:MM
+
+        if not date_str:
+            return Response({"error": "'date' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = make_etag(doctor_id, await aget_version(doctor_id), date_str, time_str or '')
+        if self.is_not_modified(request, etag):
+            return self.not_modified(etag)
+
+        status_code, data = await aget_or_build(
+            f'availability:{doctor_id}:{etag[1:-1]}',
+            lambda: self.abuild(doctor_id, date_str, time_str)
+        )
+        return self.cached_response(status_code, data, etag)
+
+    async def abuild(self, doctor_id, date_str, time_str):
+        try:
+            doctor = await Doctor.objects.aget(id=doctor_id)
+        except Doctor.DoesNotExist:
+            return status.HTTP_404_NOT_FOUND, {"error": "Doctor not found."}
+
+        try:
+            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            return status.HTTP_400_BAD_REQUEST, {"error": "Invalid date format. Use YYYY-MM-DD."}
+
+        slot = await aget_slot(doctor, date_obj)
+        result = self.describe(doctor_id, date_str, time_str, date_obj, slot)
+        if result is None:
+            is_booked = await self.booked_at(doctor, date_obj, time_str).aexists()
+            result = self.time_result(doctor_id, date_str, time_str, is_booked)
+        return result
+
+
+class AsyncDoctorAvailabilitySearchView(AsyncAPIView, DoctorAvailabilitySearchView):
+    async def get(self, request):
+        error, params = self.parse(request)
+        if error is not None:
+            return error
+        start_date, end_date, doctors = params
+        dates = date_range(start_date, end_date)
+
+        # the stored rows select their doctors with a subquery, so both reads are independent
+        doctors, stored = await asyncio.gather(alist(doctors), alist(slot_rows(doctors.values('id'), dates)))
+        doctors = self.page(doctors)
+
+        slots = await aget_slots(doctors, dates, stored=stored)
+        return self.respond(start_date, end_date, doctors, dates, slots)
+
+
+class AsyncMedicalRecordListCreateView(AsyncAPIView, MedicalRecordListCreateView):
+    async def get(self, request):
+        records = self.caller_queryset(await aget_caller(request))
+        if records is None:
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        paginator = MedicalRecordCursorPagination()
+        page = await paginator.apaginate_queryset(records, request, view=self)
+        serializer = MedicalRecordSerializer(page, many=True, context={'expand': get_expand(request)})
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,164 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .tokens import read_access_token, token_setting, user_from_claims
+
+
+class TokenCache:
+    """
+    Bounded, per-process token -> user cache with LRU and TTL eviction.
+
+    Entries hold the user's field values rather than the instance, so every
+    request gets a fresh user object and nothing loaded on one request
+    (profiles etc.) leaks into the next. Entries are invalidated explicitly on
+    logout and user changes, the TTL bounds how long other processes can serve
+    a stale entry.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, user_id, db, values)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        expires_at, user_id, db, values = entry
+        return self.user_model.from_db(db, self._field_names(), values)
+
+    def set(self, key, user):
+        values = tuple(getattr(user, name) for name in self._field_names())
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user.pk, user._state.db, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    @property
+    def user_model(self):
+        return Token._meta.get_field('user').related_model
+
+    def _field_names(self):
+        return [field.attname for field in self.user_model._meta.concrete_fields]
+
+
+token_cache = TokenCache(**{
+    key.lower(): value for key, value in getattr(settings, 'TOKEN_CACHE', {}).items()
+})
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that skips the Token + user query for tokens seen
+    recently by this process.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return (user, Token(key=key, user=user))
+
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        token_cache.set(key, token.user)
+        return (token.user, token)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate ``Authorization: Bearer <access token>`` with the signed
+    tokens from api.tokens. Verifying the signature is all it takes, there is
+    no query; the user is built from the token's claims.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2 or not token_setting('ENABLED'):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        try:
+            claims = read_access_token(auth[1].decode())
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return (user_from_claims(claims), claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Let a Prometheus scraper in with ``Authorization: Bearer <METRICS['TOKEN']>``.
+    Any other header is left to the next authentication class.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        expected = getattr(settings, 'METRICS', {}).get('TOKEN')
+        auth = get_authorization_header(request).split()
+        if not expected or len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if not hmac.compare_digest(auth[1], expected.encode()):
+            return None
+        return (AnonymousUser(), 'metrics')
+
+    def authenticate_header(self, request):
+        return self.keyword
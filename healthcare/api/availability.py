@@ -0,0 +1,285 @@
+from datetime import date as date_cls, datetime, time as time_cls, timedelta
+
+from django.db.models import F
+
+from .models import Appointment, Doctor, DoctorSlot
+from .replicas import read_from_primary, reading_from_replica
+
+SLOT_MINUTES = 30
+
+
+def working_hours(available_days, date):
+    """
+    Return the (start, end) datetimes a doctor works on ``date`` according to
+    their ``available_days`` schedule, or None if they don't work that day.
+
+    Raises ValueError (or KeyError/TypeError) if the day's entry is malformed.
+    """
+    day_name = date.strftime('%A')
+    if day_name not in available_days:
+        return None
+
+    start_time = datetime.strptime(available_days[day_name]["start"], "%H:%M")
+    end_time = datetime.strptime(available_days[day_name]["end"], "%H:%M")
+    return start_time, end_time
+
+
+def booked_rows(doctor_ids, start_date, end_date):
+    return Appointment.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start_date, end_date)
+    ).exclude(status='cancelled').values_list('doctor_id', 'date', 'time')
+
+
+def group_booked(rows):
+    booked = {}
+    for doctor_id, date, time in rows:
+        booked.setdefault((doctor_id, date), set()).add(time)
+    return booked
+
+
+def booked_times_by_day(doctor_ids, start_date, end_date):
+    """
+    Fetch the booked times of several doctors over a date range in a single
+    query, grouped as {(doctor_id, date): {time, ...}}.
+    """
+    return group_booked(booked_rows(doctor_ids, start_date, end_date))
+
+
+async def abooked_times_by_day(doctor_ids, start_date, end_date):
+    """Async version of booked_times_by_day."""
+    return group_booked([row async for row in booked_rows(doctor_ids, start_date, end_date)])
+
+
+def day_hours(doctor, date):
+    """
+    Return the (start, end) minutes since midnight a doctor works on ``date``,
+    or None if they don't work that day. Read from the compiled schedule,
+    falling back to parsing ``available_days`` when it didn't compile, which
+    raises like working_hours for a malformed day.
+    """
+    if doctor.schedule is not None:
+        return doctor.schedule[date.weekday()]
+    hours = working_hours(doctor.available_days, date)
+    if hours is None:
+        return None
+    start_time, end_time = hours
+    return start_time.hour * 60 + start_time.minute, end_time.hour * 60 + end_time.minute
+
+
+def minute_time(minutes):
+    return time_cls(minutes // 60, minutes % 60)
+
+
+def slot_count(start, end):
+    """Slots starting from ``start`` before ``end``, in minutes."""
+    return max(0, -(-(end - start) // SLOT_MINUTES))
+
+
+def build_slot(doctor, date, booked_times):
+    """
+    Compute the (unsaved) slot index row of a doctor for one date from their
+    schedule and booked times. Raises like working_hours on a malformed schedule.
+    """
+    slot = DoctorSlot(doctor=doctor, date=date)
+    hours = day_hours(doctor, date)
+    if hours is not None:
+        start, end = hours
+        slot.start_time, slot.end_time = minute_time(start), minute_time(end)
+        slot.slot_count = slot_count(start, end)
+        slot.booked_mask = 0
+        for booked in booked_times:
+            index = slot.slot_index(booked)
+            if index is not None:
+                slot.booked_mask |= 1 << index
+    return slot
+
+
+def date_range(start_date, end_date):
+    """Every date from start_date to end_date inclusive."""
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def slot_rows(doctor_ids, dates):
+    """Stored slot index rows of several doctors (ids or a subquery of them) on the given (sorted, distinct) dates."""
+    if len(dates) == (dates[-1] - dates[0]).days + 1:
+        in_dates = {'date__range': (dates[0], dates[-1])}
+    else:
+        in_dates = {'date__in': dates}
+    return DoctorSlot.objects.filter(doctor_id__in=doctor_ids, **in_dates)
+
+
+def build_missing(missing, slots, booked):
+    """
+    Build the rows of the missing (doctor, date) pairs into ``slots`` and
+    return the ones to store. Malformed schedules map to None.
+    """
+    new_slots = []
+    for doctor, date in missing:
+        try:
+            slot = build_slot(doctor, date, booked.get((doctor.id, date), set()))
+        except Exception:
+            slots[(doctor.id, date)] = None
+            continue
+        slots[(doctor.id, date)] = slot
+        new_slots.append(slot)
+    return new_slots
+
+
+def get_slots(doctors, dates):
+    """
+    Return the slot index rows of several doctors on the given dates as
+    {(doctor_id, date): DoctorSlot}, building and storing any missing rows.
+    Doctor-days whose schedule is malformed map to None.
+    """
+    doctor_ids = [doctor.id for doctor in doctors]
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    slots = {(slot.doctor_id, slot.date): slot for slot in slot_rows(doctor_ids, dates)}
+
+    missing = [(doctor, date) for doctor in doctors for date in dates if (doctor.id, date) not in slots]
+    if not missing:
+        return slots
+
+    # stored rows serve every later reader, never build them from a lagging replica
+    if reading_from_replica():
+        with read_from_primary():
+            current = Doctor.objects.only('id', 'available_days', 'schedule').in_bulk({doctor.id for doctor, date in missing})
+            missing = [(current.get(doctor.id, doctor), date) for doctor, date in missing]
+            booked = booked_times_by_day(doctor_ids, dates[0], dates[-1])
+    else:
+        booked = booked_times_by_day(doctor_ids, dates[0], dates[-1])
+    new_slots = build_missing(missing, slots, booked)
+
+    # a concurrent request may have built the same rows, keep whichever landed first
+    DoctorSlot.objects.bulk_create(new_slots, ignore_conflicts=True)
+    return slots
+
+
+async def aget_slots(doctors, dates, stored=None):
+    """
+    Async version of get_slots. ``stored`` takes the stored rows if the caller
+    already fetched them, e.g. concurrently with the doctors.
+    """
+    doctor_ids = [doctor.id for doctor in doctors]
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    if stored is None:
+        stored = [slot async for slot in slot_rows(doctor_ids, dates)]
+    slots = {(slot.doctor_id, slot.date): slot for slot in stored if slot.doctor_id in doctor_ids}
+
+    missing = [(doctor, date) for doctor in doctors for date in dates if (doctor.id, date) not in slots]
+    if not missing:
+        return slots
+
+    if reading_from_replica():
+        with read_from_primary():
+            current = await Doctor.objects.only('id', 'available_days', 'schedule').ain_bulk({doctor.id for doctor, date in missing})
+            missing = [(current.get(doctor.id, doctor), date) for doctor, date in missing]
+            booked = await abooked_times_by_day(doctor_ids, dates[0], dates[-1])
+    else:
+        booked = await abooked_times_by_day(doctor_ids, dates[0], dates[-1])
+    new_slots = build_missing(missing, slots, booked)
+    await DoctorSlot.objects.abulk_create(new_slots, ignore_conflicts=True)
+    return slots
+
+
+def get_slot(doctor, date):
+    """Return the slot index row of one doctor for one date (None if the schedule is malformed)."""
+    return get_slots([doctor], [date])[(doctor.id, date)]
+
+
+async def aget_slot(doctor, date):
+    """Async version of get_slot."""
+    return (await aget_slots([doctor], [date]))[(doctor.id, date)]
+
+
+def day_availability(slot, date):
+    """Build the availability entry for one doctor on one date from its slot index row."""
+    day_name = date.strftime('%A')
+    if slot is None:
+        return {
+            "date": date.isoformat(),
+            "available": False,
+            "error": f"Invalid time format in availability for {day_name}."
+        }
+
+    if not slot.is_working_day:
+        return {
+            "date": date.isoformat(),
+            "available": False,
+            "message": f"Doctor is not available on {day_name}."
+        }
+
+    time_slots = [
+        {"time": slot_time.strftime("%H:%M"), "available": available}
+        for slot_time, available in slot.time_slots()
+    ]
+    return {
+        "date": date.isoformat(),
+        "available": any(slot["available"] for slot in time_slots),
+        "time_slots": time_slots
+    }
+
+
+def _normalize(date, time):
+    # instances created with string values keep them until reloaded
+    if isinstance(date, str):
+        date = date_cls.fromisoformat(date)
+    if isinstance(time, str):
+        time = Appointment._meta.get_field('time').to_python(time)
+    return date, time
+
+
+def mark_free(doctor_id, date, time):
+    """
+    Clear the slot of a deleted or cancelled appointment in the index. Missing
+    rows are left alone, they're built from the remaining appointments later.
+    """
+    date, time = _normalize(date, time)
+    slot = DoctorSlot.objects.filter(doctor_id=doctor_id, date=date).first()
+    index = slot.slot_index(time) if slot is not None else None
+    if index is not None:
+        DoctorSlot.objects.filter(doctor_id=doctor_id, date=date).update(
+            booked_mask=F('booked_mask').bitand(~(1 << index))
+        )
+
+
+def mark_booked(doctor, date, time):
+    """
+    Set the slot of a newly booked appointment in the index, building the
+    day's row first if it's missing so a concurrent rebuild can't lose it.
+    """
+    mark_booked_many(doctor, [(date, time)])
+
+
+def mark_booked_many(doctor, date_times):
+    """
+    Set the slots of several appointments of one doctor, e.g. after a
+    bulk_create, with one index read and one update per distinct slot number.
+    """
+    date_times = [_normalize(date, time) for date, time in date_times]
+    if not date_times:
+        return
+
+    slots = get_slots([doctor], [date for date, time in date_times])
+
+    dates_by_bit = {}
+    for date, time in date_times:
+        slot = slots.get((doctor.id, date))
+        index = slot.slot_index(time) if slot is not None else None
+        if index is not None:
+            dates_by_bit.setdefault(1 << index, []).append(date)
+
+    for bit, bit_dates in dates_by_bit.items():
+        DoctorSlot.objects.filter(doctor_id=doctor.id, date__in=bit_dates).update(
+            booked_mask=F('booked_mask').bitor(bit)
+        )
+
+
+def reset_doctor_slots(doctor):
+    """Drop a doctor's index rows after a schedule change, they're rebuilt on the next lookup."""
+    DoctorSlot.objects.filter(doctor=doctor).delete()
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .replicas import reading_from_replica, replica_setting
+
+TIMEOUT = getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 300)
+# versions are made for any doctor id a client asks about, so they expire;
+# an expired one restarts from the clock like an evicted one
+VERSION_TIMEOUT = max(TIMEOUT, 24 * 3600)
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+
+def _version_key(doctor_id):
+    return f'availability:version:{doctor_id}'
+
+
+def get_version(doctor_id):
+    """
+    Current availability version of a doctor. A missing counter (never set or
+    evicted) restarts from the clock, never from a number used before, so old
+    entries can't come back to life.
+    """
+    key = _version_key(doctor_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(doctor_id):
+    """Async version of get_version."""
+    key = _version_key(doctor_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=VERSION_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(doctor_id):
+    try:
+        cache.incr(_version_key(doctor_id))
+    except ValueError:
+        cache.add(_version_key(doctor_id), time.time_ns(), timeout=VERSION_TIMEOUT)
+
+
+def invalidate_doctor(doctor_id):
+    """
+    Invalidate every cached availability response of a doctor. The version is
+    bumped right away and again once the current transaction commits, so that
+    responses other requests build from pre-commit data in between don't survive.
+    """
+    bump_version(doctor_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_version(doctor_id))
+
+
+def make_etag(doctor_id, version, *params):
+    digest = hashlib.md5(':'.join(str(part) for part in (doctor_id, version, *params)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def build_timeout():
+    # a response built from the replica may miss recent writes, don't keep it
+    # longer than a writer stays pinned to the primary
+    if reading_from_replica():
+        return min(TIMEOUT, replica_setting('STICKY_SECONDS'))
+    return TIMEOUT
+
+
+def get_or_build(key, build):
+    """
+    Return the cached value for ``key``, or build and cache it. Only one caller
+    builds a missing key at a time, the others wait briefly for its result
+    before falling back to building it themselves.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return build()
+
+    try:
+        value = build()
+        cache.set(key, value, timeout=build_timeout())
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+async def aget_or_build(key, abuild):
+    """Async version of get_or_build, ``abuild`` is a coroutine function."""
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not await cache.aadd(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+        return await abuild()
+
+    try:
+        value = await abuild()
+        await cache.aset(key, value, timeout=build_timeout())
+        return value
+    finally:
+        await cache.adelete(lock_key)
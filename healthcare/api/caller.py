@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+
+
+class Caller:
+    """
+    The user behind a request along with their role and profiles.
+
+    The role comes straight from the user row. Both profiles are fetched
+    together with one joined query the first time either is needed, and the
+    result is also cached on the user, so ``user.doctor_profile`` and
+    ``hasattr(user, 'patient_profile')`` don't query again either.
+    """
+    profile_names = ('doctor_profile', 'patient_profile')
+
+    def __init__(self, user):
+        self.user = user
+        self.role = user.role if user.is_authenticated else None
+        self.is_superuser = user.is_superuser
+        self._profiles = None
+
+    @property
+    def doctor(self):
+        return self.profiles['doctor_profile']
+
+    @property
+    def patient(self):
+        return self.profiles['patient_profile']
+
+    @property
+    def doctor_id(self):
+        return self._profile_id('doctor')
+
+    @property
+    def patient_id(self):
+        return self._profile_id('patient')
+
+    def _profile_id(self, role):
+        # signed access tokens carry the profile id, no need to load the profile
+        claims = getattr(self.user, 'token_claims', None)
+        if claims and claims.get('pid') is not None:
+            return claims['pid'] if claims['role'] == role else None
+        profile = self.profiles[f'{role}_profile']
+        return profile.id if profile is not None else None
+
+    @property
+    def profiles(self):
+        if self._profiles is None:
+            self._profiles = self._resolve_profiles()
+        return self._profiles
+
+    def _resolve_profiles(self):
+        if self._needs_query():
+            self._store(self._profile_query().first())
+        return self._cached_profiles()
+
+    async def aresolve(self):
+        """Resolve the profiles without blocking, for async views."""
+        if self._profiles is None:
+            if self._needs_query():
+                self._store(await self._profile_query().afirst())
+            self._profiles = self._cached_profiles()
+        return self
+
+    def _relations(self):
+        user_model = get_user_model()
+        return [getattr(user_model, name).related for name in self.profile_names]
+
+    def _needs_query(self):
+        return self.user.is_authenticated and not all(relation.is_cached(self.user) for relation in self._relations())
+
+    def _profile_query(self):
+        return get_user_model().objects.select_related(*self.profile_names).filter(pk=self.user.pk)
+
+    def _store(self, resolved):
+        # missing profiles come back cached as None, so nothing below queries
+        for relation in self._relations():
+            profile = relation.get_cached_value(resolved) if resolved is not None else None
+            if profile is not None:
+                relation.field.set_cached_value(profile, self.user)
+            relation.set_cached_value(self.user, profile)
+
+    def _cached_profiles(self):
+        if not self.user.is_authenticated:
+            return dict.fromkeys(self.profile_names)
+        return {
+            name: relation.get_cached_value(self.user)
+            for name, relation in zip(self.profile_names, self._relations())
+        }
+
+    def owns(self, obj):
+        """Whether the caller is the doctor or the patient of an appointment or record."""
+        return (
+            (self.doctor_id is not None and obj.doctor_id == self.doctor_id) or
+            (self.patient_id is not None and obj.patient_id == self.patient_id)
+        )
+
+
+def get_caller(request):
+    """Return the request's Caller, resolving it on first use."""
+    caller = getattr(request, '_caller', None)
+    if caller is None or caller.user is not request.user:
+        caller = Caller(request.user)
+        request._caller = caller
+    return caller
+
+
+async def aget_caller(request):
+    """Async version of get_caller, with the profiles already resolved."""
+    return await get_caller(request).aresolve()
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+
+from .availability import get_slots
+from .availability_cache import get_or_build
+from .models import Doctor, search_key
+
+FACETS_KEY = 'directory:specializations'
+
+# sorts after every character a search key can hold, so [prefix, prefix + END)
+# is every key starting with prefix
+END = '\U0010ffff'
+
+
+def prefix_filter(field, prefix):
+    """
+    Rows whose ``field`` starts with ``prefix``, as a range the field's index
+    can serve. SQLite's LIKE ignores the index (it is case-insensitive), and
+    the keys are normalized already.
+    """
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + END})
+
+
+def name_filter(text):
+    """Doctors whose name or surname starts with ``text``, None if it has no words."""
+    prefix = search_key(text)
+    if not prefix:
+        return None
+    return prefix_filter('search_name', prefix) | prefix_filter('search_surname', prefix)
+
+
+def specialization_counts(doctors):
+    """Doctors per specialization, spelling variants counted together."""
+    rows = doctors.order_by().values('search_specialization').annotate(
+        name=Min('specialization'), count=Count('id')
+    ).order_by('search_specialization')
+    return [{'specialization': row['name'], 'count': row['count']} for row in rows]
+
+
+def directory_facets():
+    """Doctors per specialization across the whole directory, cached until a doctor is added, removed or re-specialized."""
+    return get_or_build(FACETS_KEY, lambda: specialization_counts(Doctor.objects.all()))
+
+
+def invalidate_facets():
+    """Drop the cached facets now and again once the current transaction commits, like invalidate_doctor."""
+    cache.delete(FACETS_KEY)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(FACETS_KEY))
+
+
+def working_on(doctors, date):
+    """Narrow ``doctors`` to the ones whose schedule lists the weekday of ``date``, only they can have a free slot."""
+    return doctors.alias(works=F('working_days').bitand(1 << date.weekday())).filter(works__gt=0)
+
+
+def available_on(date):
+    """
+    Build a filter for DoctorCursorPagination.paginate_filtered keeping the
+    doctors with at least one free slot on ``date``, read from the slot index.
+    """
+    def keep(doctors):
+        slots = get_slots(doctors, [date])
+        return [doctor for doctor in doctors if has_free_slot(slots[(doctor.id, date)])]
+    return keep
+
+
+def has_free_slot(slot):
+    return slot is not None and slot.is_working_day and slot.booked_mask != (1 << slot.slot_count) - 1
@@ -0,0 +1,106 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import MedicalRecord
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+COLUMNS = [
+    'id', 'created_at', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name',
+    'appointment_id', 'diagnosis', 'treatment', 'notes',
+]
+
+
+def start_of_day(date):
+    """Midnight at the start of ``date`` in the current time zone."""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def export_queryset(start_date=None, end_date=None, doctor_ids=None):
+    """
+    Medical records to export, oldest first, optionally limited to a creation
+    date range (inclusive) and to some doctors. Patient and doctor names come
+    from the same query.
+    """
+    records = MedicalRecord.objects.select_related('patient', 'doctor').order_by('created_at', 'id')
+    # plain ranges on created_at, a __date lookup wraps the column in a
+    # function and record_created_idx can't serve it
+    if start_date is not None:
+        records = records.filter(created_at__gte=start_of_day(start_date))
+    if end_date is not None:
+        records = records.filter(created_at__lt=start_of_day(end_date + timedelta(days=1)))
+    if doctor_ids:
+        records = records.filter(doctor_id__in=doctor_ids)
+    return records
+
+
+def record_row(record):
+    return [
+        record.id,
+        record.created_at.isoformat(),
+        record.patient_id,
+        record.patient.full_name,
+        record.doctor_id,
+        record.doctor.full_name,
+        record.appointment_id,
+        record.diagnosis,
+        record.treatment,
+        record.notes,
+    ]
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+class RowEncoder:
+    """Encode records one line at a time in the given format."""
+
+    def __init__(self, format):
+        self.format = format
+        self.csv_writer = csv.writer(Echo())
+
+    def header(self):
+        if self.format == 'csv':
+            return self.csv_writer.writerow(COLUMNS)
+        return ''
+
+    def encode(self, record):
+        row = record_row(record)
+        if self.format == 'csv':
+            return self.csv_writer.writerow(row)
+        return json.dumps(dict(zip(COLUMNS, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_records(records, format, chunk_size=CHUNK_SIZE):
+    """
+    Yield an export line by line. Rows are fetched ``chunk_size`` at a time
+    and never cached on the queryset, so memory stays flat however many
+    records there are.
+    """
+    encoder = RowEncoder(format)
+    header = encoder.header()
+    if header:
+        yield header
+    for record in records.iterator(chunk_size=chunk_size):
+        yield encoder.encode(record)
+
+
+async def astream_records(records, format, chunk_size=CHUNK_SIZE):
+    """Async version of stream_records, for streaming under ASGI."""
+    encoder = RowEncoder(format)
+    header = encoder.header()
+    if header:
+        yield header
+    async for record in records.aiterator(chunk_size=chunk_size):
+        yield encoder.encode(record)
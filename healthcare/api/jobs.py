@@ -0,0 +1,126 @@
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+# job name -> function, filled in by the @job decorator
+JOBS = {}
+
+
+def queue_setting(name):
+    defaults = {'MAX_ATTEMPTS': 5, 'BACKOFF': 10, 'MAX_BACKOFF': 3600, 'LEASE': 600}
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, defaults[name])
+
+
+def job(func=None, max_attempts=None):
+    """
+    Register a function as a background job. ``func.delay(*args, **kwargs)``
+    queues a run of it, ``func.delay_many(args_list)`` one run per argument
+    tuple in a single insert; arguments are stored as JSON.
+    """
+    def register(func):
+        JOBS[func.__name__] = func
+        func.delay = lambda *args, **kwargs: enqueue(func.__name__, args, kwargs, max_attempts=max_attempts)
+        func.delay_many = lambda args_list: enqueue_many(func.__name__, args_list, max_attempts=max_attempts)
+        return func
+    return register(func) if func is not None else register
+
+
+def enqueue(name, args=(), kwargs=None, delay=0, max_attempts=None):
+    """
+    Queue a job. Called inside a transaction the job only becomes visible to
+    workers if that transaction commits.
+    """
+    if name not in JOBS:
+        raise LookupError(f"No job named {name!r}.")
+    return Job.objects.create(
+        name=name,
+        payload={'args': list(args), 'kwargs': kwargs or {}},
+        max_attempts=max_attempts or queue_setting('MAX_ATTEMPTS'),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(name, args_list, max_attempts=None):
+    """Queue one job per tuple of positional arguments with one insert, like enqueue."""
+    if name not in JOBS:
+        raise LookupError(f"No job named {name!r}.")
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(
+            name=name,
+            payload={'args': list(args), 'kwargs': {}},
+            max_attempts=max_attempts or queue_setting('MAX_ATTEMPTS'),
+            run_after=now,
+        )
+        for args in args_list
+    ])
+
+
+def due_jobs(now):
+    """Queued jobs whose time has come, and running jobs whose worker's claim expired."""
+    return Job.objects.filter(
+        Q(status='queued', run_after__lte=now) |
+        Q(status='running', locked_at__lt=now - timedelta(seconds=queue_setting('LEASE')))
+    )
+
+
+def claim(worker, limit=1):
+    """
+    Claim up to ``limit`` due jobs for ``worker``, oldest first. The claim is
+    a single conditional UPDATE that re-checks the job is still due, so
+    concurrent workers never get the same job.
+    """
+    now = timezone.now()
+    token = f"{worker[:60]}:{uuid.uuid4().hex}"
+    candidates = due_jobs(now).order_by('run_after', 'id').values('id')[:limit]
+    claimed = due_jobs(now).filter(id__in=candidates).update(
+        status='running', claimed_by=token, locked_at=now, attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return []
+    return list(Job.objects.filter(claimed_by=token).order_by('run_after', 'id'))
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts`` times."""
+    return min(queue_setting('BACKOFF') * 2 ** (attempts - 1), queue_setting('MAX_BACKOFF'))
+
+
+def run(job):
+    """
+    Run a claimed job and record the outcome: done, queued again after a
+    backoff, or failed once it has used up its attempts. Returns the status.
+    """
+    try:
+        handler = JOBS.get(job.name)
+        if handler is None:
+            raise LookupError(f"No job named {job.name!r}.")
+        handler(*job.payload.get('args', []), **job.payload.get('kwargs', {}))
+    except Exception:
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            fields = {'status': 'failed', 'finished_at': now}
+        else:
+            fields = {'status': 'queued', 'run_after': now + timedelta(seconds=backoff(job.attempts))}
+        fields['last_error'] = traceback.format_exc()
+    else:
+        fields = {'status': 'done', 'finished_at': timezone.now(), 'last_error': ''}
+
+    # only the worker still holding the claim may record the outcome
+    Job.objects.filter(id=job.id, claimed_by=job.claimed_by).update(locked_at=None, **fields)
+    return fields['status']
+
+
+def work(job):
+    """Run a job from a worker thread or process, releasing its connection as a request would."""
+    try:
+        return run(job)
+    finally:
+        close_old_connections()
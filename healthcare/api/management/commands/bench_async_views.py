@@ -0,0 +1,175 @@
+import asyncio
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import path
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from api import async_views, views
+from api.models import Appointment, CustomUser, MedicalRecord
+
+from .stress_booking import create_fixture
+
+# endpoint -> (sync view, async view, needs the doctor instead of a patient, route, URL name)
+ENDPOINTS = {
+    'appointments': (views.AppointmentView, async_views.AsyncAppointmentView, False, 'appointments/', 'appointments'),
+    'availability': (
+        views.DoctorAvailabilityView, async_views.AsyncDoctorAvailabilityView, False,
+        'appointments/doctor/<int:doctor_id>/availability/', 'doctor-availability',
+    ),
+    'search': (
+        views.DoctorAvailabilitySearchView, async_views.AsyncDoctorAvailabilitySearchView, False,
+        'appointments/availability/', 'doctor-availability-search',
+    ),
+    'records': (
+        views.MedicalRecordListCreateView, async_views.AsyncMedicalRecordListCreateView, False,
+        'medical-records/', 'medical-records',
+    ),
+    'patient-profile': (views.PatientProfileView, async_views.AsyncPatientProfileView, False, 'patients/profile/', 'patient-profile'),
+    'doctor-profile': (views.DoctorProfileView, async_views.AsyncDoctorProfileView, True, 'doctors/profile/', 'doctor-profile'),
+}
+
+
+class URLConf:
+    """A URLconf holding one implementation of the benchmarked endpoints, swapped in through ROOT_URLCONF."""
+
+    def __init__(self, implementation):
+        index = 1 if implementation == 'async' else 0
+        self.urlpatterns = [
+            path(f'api/{entry[3]}', entry[index].as_view(), name=entry[4]) for entry in ENDPOINTS.values()
+        ]
+
+
+def sync_only_middleware():
+    """The MIDDLEWARE entries that make Django run every ASGI request through a thread."""
+    return [name for name in settings.MIDDLEWARE if not getattr(import_string(name), 'async_capable', False)]
+
+
+async def asgi_get(application, url, query, headers):
+    """Send a GET through an ASGI application, return (status, body)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': url, 'raw_path': url.encode(), 'root_path': '', 'query_string': urlencode(query).encode(),
+        'headers': [(b'host', b'localhost'), *headers], 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    sent = asyncio.Event()
+    body_read = False
+    messages = []
+
+    async def receive():
+        nonlocal body_read
+        if not body_read:
+            body_read = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # the client stays connected until the response is out
+        await sent.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            sent.set()
+
+    await application(scope, receive, send)
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def fresh_user(user):
+    """A copy of ``user`` without any cached relations, as a new request would load it."""
+    copy = CustomUser(**{field.attname: getattr(user, field.attname) for field in CustomUser._meta.concrete_fields})
+    copy._state.adding = False
+    copy._state.db = user._state.db
+    return copy
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec of the sync and async implementations of the read endpoints through the "
+        "project's ASGI application (the full middleware stack and token authentication), at the same "
+        "concurrency. Creates (and afterwards deletes) its own doctor, patients and appointments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and implementation (default 500).")
+        parser.add_argument('--concurrency', type=int, default=10, help="Requests in flight at once (default 10).")
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append', help="Endpoint to run, repeatable (default all).")
+        parser.add_argument('--keep', action='store_true', help="Keep the fixture data afterwards.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        sync_only = sync_only_middleware()
+        if sync_only:
+            self.stdout.write(self.style.WARNING(
+                f"Sync-only middleware, every request goes through a thread: {', '.join(sync_only)}"
+            ))
+
+        doctor, users = create_fixture(options['concurrency'])
+        self.doctor = doctor
+        self.patients = users[1:]
+        self.tokens = {user.id: Token.objects.get_or_create(user=user)[0].key for user in users}
+        self.create_appointments()
+
+        application = get_asgi_application()
+        urlconfs = {label: URLConf(label) for label in ('sync', 'async')}
+        try:
+            for name in options['endpoint'] or sorted(ENDPOINTS):
+                results = {}
+                for label in ('sync', 'async'):
+                    with override_settings(ROOT_URLCONF=urlconfs[label]):
+                        elapsed = asyncio.run(self.run(application, name, options['requests'], options['concurrency']))
+                    results[label] = options['requests'] / elapsed
+                self.stdout.write(
+                    f"{name:16} sync {results['sync']:8.1f} req/s   async {results['async']:8.1f} req/s   "
+                    f"x{results['async'] / results['sync']:.2f}"
+                )
+        finally:
+            if not options['keep']:
+                CustomUser.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def create_appointments(self):
+        start = timezone.localdate() + timedelta(days=1)
+        Appointment.objects.bulk_create([
+            Appointment(patient_id=patient.patient_profile.id, doctor=self.doctor, date=start + timedelta(days=offset), time='09:00')
+            for offset, patient in enumerate(self.patients)
+        ])
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient_id=patient.patient_profile.id, doctor=self.doctor, diagnosis='Benchmark', treatment='None')
+            for patient in self.patients
+        ])
+
+    def make_request(self, name, index):
+        """(url, query, headers) of one request to an endpoint."""
+        as_doctor, route = ENDPOINTS[name][2], ENDPOINTS[name][3]
+        day = (timezone.localdate() + timedelta(days=index % 28)).isoformat()
+        url = '/api/' + route.replace('<int:doctor_id>', str(self.doctor.id))
+        if name == 'availability':
+            query = {'date': day}
+        elif name == 'search':
+            query = {'start_date': day, 'doctor_ids': str(self.doctor.id)}
+        else:
+            query = {}
+        user = self.doctor.user if as_doctor else self.patients[index % len(self.patients)]
+        return url, query, [(b'authorization', f'Token {self.tokens[user.id]}'.encode())]
+
+    async def run(self, application, name, count, concurrency):
+        requests = [self.make_request(name, index) for index in range(count)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(url, query, headers):
+            async with semaphore:
+                status_code, body = await asgi_get(application, url, query, headers)
+                if status_code != 200:
+                    raise CommandError(f"{name} returned {status_code}: {body[:200]!r}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*[call(*request) for request in requests])
+        return time.perf_counter() - started
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api.schema import clear_schema
+from healthcare.urls import cached_schema, schema_view
+
+# (label, path, query) of the requests a browser or probe sends
+ROUTES = [
+    ('root (swagger ui)', '/', {}),
+    ('swagger ui spec', '/', {'format': 'openapi'}),
+    ('swagger.json', '/swagger.json', {}),
+    ('redoc', '/redoc/', {}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of the schema routes served by drf_yasg's stock view, which introspects the "
+        "API on every hit, with the cached view from api.schema."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and view (default 200).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError("--requests must be positive.")
+        factory = RequestFactory()
+        views = {
+            'stock': {'ui': schema_view.with_ui('swagger'), 'redoc': schema_view.with_ui('redoc'), 'spec': schema_view.without_ui()},
+            'cached': {'ui': cached_schema.with_ui('swagger'), 'redoc': cached_schema.with_ui('redoc'), 'spec': cached_schema.without_ui()},
+        }
+        # the cached view builds the schema on its first hit, like a fresh process would
+        clear_schema()
+        for label, path, query in ROUTES:
+            results = {}
+            for name, view_set in views.items():
+                if path == '/swagger.json':
+                    view, kwargs = view_set['spec'], {'format': '.json'}
+                else:
+                    view, kwargs = view_set['redoc' if path == '/redoc/' else 'ui'], {}
+                latencies = []
+                for _ in range(options['requests']):
+                    request = factory.get(path, query)
+                    started = time.perf_counter()
+                    response = view(request, **kwargs)
+                    if hasattr(response, 'render'):
+                        response.render()
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"{name} {label} answered {response.status_code}.")
+                latencies.sort()
+                results[name] = latencies
+            self.report(label, results)
+
+    def report(self, label, results):
+        def p50(values):
+            return values[len(values) // 2] * 1000
+
+        stock, cached = p50(results['stock']), p50(results['cached'])
+        self.stdout.write(
+            f"{label:20} stock p50 {stock:8.2f} ms  max {results['stock'][-1] * 1000:8.2f}  "
+            f"cached p50 {cached:7.2f} ms  max {results['cached'][-1] * 1000:8.2f}  {stock / cached if cached else 0:6.1f}x"
+        )
@@ -0,0 +1,70 @@
+import random
+import time
+from functools import reduce
+from operator import and_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api.models import Doctor, MedicalRecord
+from api.search import match_query, search_available, search_records
+
+TERMS = ['pain', 'back pain', 'diabetes', 'migraine', 'medication', 'physio', 'referral specialist', 'asthma rest', 'follow', 'anaphylaxis']
+
+
+def like_search(text, doctor_id=None, limit=10):
+    """The baseline: every word in any of the three fields, newest first, no ranking."""
+    condition = reduce(and_, [
+        Q(diagnosis__icontains=word) | Q(treatment__icontains=word) | Q(notes__icontains=word)
+        for word in text.split()
+    ])
+    records = MedicalRecord.objects.filter(condition)
+    if doctor_id is not None:
+        records = records.filter(doctor_id=doctor_id)
+    return list(records.order_by('-created_at', '-id')[:limit])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure first-page search latency over the medical records already in the database, with the FTS5 "
+        "index and with the icontains scan it replaces, for one doctor's records and for all of them. Fill "
+        "the database first, e.g. generate_data --records 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help="Indexed searches per scope (default 200).")
+        parser.add_argument('--baseline-queries', type=int, default=20, help="icontains searches per scope (default 20).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("The database has no full-text index (search needs SQLite with FTS5).")
+        doctor_ids = list(Doctor.objects.values_list('id', flat=True))
+        if not doctor_ids:
+            raise CommandError("No records to search, run generate_data first.")
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{MedicalRecord.objects.count()} records, {len(doctor_ids)} doctors")
+
+        for scope in ('doctor', 'all'):
+            for label, search, count in (
+                ('fts5', lambda text, doctor_id: search_records(match_query(text), doctor_id=doctor_id, limit=11), options['queries']),
+                ('icontains', lambda text, doctor_id: like_search(text, doctor_id, limit=11), options['baseline_queries']),
+            ):
+                latencies, hits = [], 0
+                for _ in range(count):
+                    text = rng.choice(TERMS)
+                    doctor_id = rng.choice(doctor_ids) if scope == 'doctor' else None
+                    started = time.perf_counter()
+                    hits += len(search(text, doctor_id))
+                    latencies.append(time.perf_counter() - started)
+                self.report(f'{label} ({scope})', sorted(latencies), hits / max(count, 1))
+
+    def report(self, label, latencies, mean_hits):
+        if not latencies:
+            return
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+        self.stdout.write(
+            f"{label:20} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  max {latencies[-1] * 1000:8.2f} ms  "
+            f"rows/page {mean_hits:5.1f}"
+        )
@@ -0,0 +1,152 @@
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Appointment, CustomUser
+
+from .stress_booking import create_fixture
+
+
+def use_profile(profile):
+    """Make this process open its connections with one of settings.SQLITE_PROFILES."""
+    connections.close_all()
+    connections['default'].settings_dict.update(settings.SQLITE_PROFILES[profile])
+
+
+def run_worker(profile, user_ids, doctor_id, count, write_ratio, seed, start_at):
+    """
+    Send ``count`` requests as the given patients, booking random slots with
+    probability ``write_ratio`` and otherwise listing appointments or reading
+    availability. Returns (outcome counts, latencies).
+    """
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    use_profile(profile)
+    rng = random.Random(seed)
+    users = list(CustomUser.objects.filter(id__in=user_ids))
+    connections.close_all()
+    clients = []
+    for user in users:
+        client = APIClient()
+        client.force_authenticate(user=user)
+        clients.append(client)
+
+    outcomes = Counter()
+    latencies = []
+    first_day = timezone.localdate() + timedelta(days=1)
+    time.sleep(max(0, start_at - time.time()))
+    try:
+        for index in range(count):
+            client = rng.choice(clients)
+            day = (first_day + timedelta(days=rng.randrange(365))).isoformat()
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    slot = f'{8 + rng.randrange(9):02}:{rng.choice(["00", "30"])}'
+                    response = client.post(reverse('appointments'), {'doctor': doctor_id, 'date': day, 'time': slot}, format='json')
+                    outcomes['booked' if response.status_code == 201 else 'taken' if response.status_code == 409 else 'error'] += 1
+                elif index % 2:
+                    response = client.get(reverse('appointments'))
+                    outcomes['read' if response.status_code == 200 else 'error'] += 1
+                else:
+                    response = client.get(reverse('doctor-availability', args=[doctor_id]), {'date': day})
+                    outcomes['read' if response.status_code == 200 else 'error'] += 1
+            except OperationalError as exc:
+                outcomes['locked' if 'locked' in str(exc) else 'error'] += 1
+            except Exception:
+                outcomes['error'] += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    return outcomes, latencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark mixed booking/reading traffic from several processes, as gunicorn workers would send it, "
+        "under Django's stock SQLite setup and the tuned profile from settings.SQLITE_PROFILES. Reports "
+        "throughput and the rate of \"database is locked\" errors. Creates (and afterwards deletes) its own "
+        "doctor and patients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Processes sending requests (default 4).")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per process (default 200).")
+        parser.add_argument('--write-ratio', type=float, default=0.3, help="Share of requests that book (default 0.3).")
+        parser.add_argument(
+            '--profile', choices=sorted(settings.SQLITE_PROFILES), action='append', dest='profiles',
+            help="Profile to run, repeatable (default all, stock first)."
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help="Keep the fixture data afterwards.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError("bench_sqlite needs a file-backed SQLite database.")
+        if options['workers'] < 1 or options['requests'] < 1:
+            raise CommandError("--workers and --requests must be positive.")
+        if not 0 <= options['write_ratio'] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1.")
+
+        original = {name: connection.settings_dict[name] for name in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        doctor, users = create_fixture(options['workers'] * 4)
+        patient_ids = [user.id for user in users[1:]]
+        try:
+            for profile in options['profiles'] or sorted(settings.SQLITE_PROFILES):
+                self.report(profile, *self.run(profile, doctor.id, patient_ids, options))
+        finally:
+            connections.close_all()
+            connection.settings_dict.update(original)
+            if not options['keep']:
+                CustomUser.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def run(self, profile, doctor_id, patient_ids, options):
+        use_profile(profile)
+        # every profile books into the same empty calendar
+        Appointment.objects.filter(doctor_id=doctor_id).delete()
+        # the journal mode is stored in the database file, reset it so the
+        # stock profile really runs with a rollback journal
+        if 'journal_mode' not in settings.SQLITE_PROFILES[profile]['OPTIONS'].get('init_command', ''):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode=DELETE')
+            except OperationalError:
+                self.stderr.write(self.style.WARNING(
+                    f"Other connections hold the database, {profile} runs with its current journal mode."
+                ))
+        connections.close_all()
+
+        workers = options['workers']
+        start_at = time.time() + 1.0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    run_worker, profile, patient_ids[index::workers], doctor_id, options['requests'],
+                    options['write_ratio'], options['seed'] + index, start_at
+                )
+                for index in range(workers)
+            ]
+            results = [future.result() for future in futures]
+        elapsed = time.time() - start_at
+
+        outcomes = sum((result[0] for result in results), Counter())
+        latencies = sorted(latency for result in results for latency in result[1])
+        return outcomes, latencies, elapsed
+
+    def report(self, profile, outcomes, latencies, elapsed):
+        total = sum(outcomes.values())
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{profile:8} {total / elapsed:8.1f} req/s  locked {outcomes['locked']:5} ({outcomes['locked'] / total:6.1%})  "
+            f"other errors {outcomes['error']:4}  booked {outcomes['booked']:5}  taken {outcomes['taken']:4}  "
+            f"reads {outcomes['read']:5}  p95 {p95 * 1000:7.1f} ms"
+        )
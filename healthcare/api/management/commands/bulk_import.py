@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as date_cls
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from api.availability_cache import invalidate_doctor
+from api.directory import invalidate_facets
+from api.models import STATUS_CHOICES, Appointment, CustomUser, Doctor, DoctorSlot, Patient
+from api.provisioning import build_profile, bulk_create_users
+
+ROLES = {role for role, label in CustomUser.ROLE_CHOICES}
+STATUSES = {status for status, label in STATUS_CHOICES}
+PATIENT_FIELDS = ['age', 'gender', 'phone', 'address', 'insurance_number', 'insurance_provider']
+DOCTOR_FIELDS = ['specialization', 'bio', 'available_days']
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path, file_format):
+    """Yield (line number, row dict) from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            for number, row in enumerate(csv.DictReader(source), start=2):
+                yield number, {key: value for key, value in row.items() if value not in ('', None)}
+        else:
+            for number, line in enumerate(source, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except json.JSONDecodeError as exc:
+                        yield number, RowError(f"invalid JSON: {exc.msg}")
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def profile_values(role, row, username):
+    """The profile fields of a user row, as model field values."""
+    values = {'full_name': row.get('full_name') or username}
+    if role == 'patient':
+        values.update({name: row[name] for name in PATIENT_FIELDS if name in row})
+        if 'age' in values:
+            values['age'] = int(values['age'])
+    elif role == 'doctor':
+        values.update({name: row[name] for name in DOCTOR_FIELDS if name in row})
+        values.setdefault('specialization', 'General')
+        if isinstance(values.get('available_days'), str):
+            values['available_days'] = json.loads(values['available_days'])
+    return values
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import users with their patient/doctor profiles, or appointments, from a CSV or JSONL file. "
+        "Rows are inserted with bulk_create in one transaction per batch, passwords are hashed in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=['users', 'appointments'], default='users')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format', help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per transaction (default 1000).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Password hashing processes.")
+        parser.add_argument(
+            '--on-duplicate', choices=['skip', 'merge'], default='skip',
+            help="Existing emails: leave them alone (default) or update their profile from the row."
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        self.options = options
+        self.counts = {'created': 0, 'merged': 0, 'skipped': 0, 'failed': 0}
+        self.errors = []
+
+        started = time.perf_counter()
+        rows = read_rows(path, file_format)
+        if options['kind'] == 'users':
+            with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=django.setup) as pool:
+                for batch in batches(rows, options['batch_size']):
+                    self.import_users(batch, pool)
+        else:
+            for batch in batches(rows, options['batch_size']):
+                self.import_appointments(batch)
+        elapsed = time.perf_counter() - started
+
+        total = sum(self.counts.values())
+        for number, message in self.errors[:20]:
+            self.stderr.write(f"line {number}: {message}")
+        if len(self.errors) > 20:
+            self.stderr.write(f"... and {len(self.errors) - 20} more errors")
+        summary = ', '.join(f"{count} {name}" for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s): {summary}."
+        ))
+
+    def fail(self, number, message):
+        self.counts['failed'] += 1
+        self.errors.append((number, message))
+
+    # users
+
+    def import_users(self, batch, pool):
+        rows = {}
+        for number, row in batch:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                email = CustomUser.objects.normalize_email(str(row.get('email') or '').strip())
+                if not email:
+                    raise RowError("missing email")
+                role = row.get('role', 'patient')
+                if role not in ROLES:
+                    raise RowError(f"unknown role {role!r}")
+                username = row.get('username') or email.split('@')[0]
+                profile = profile_values(role, row, username)
+            except (RowError, ValueError, TypeError) as exc:
+                self.fail(number, str(exc))
+                continue
+            if email in rows:
+                self.fail(number, f"{email} appears twice in the file")
+                continue
+            rows[email] = (number, row, role, username, profile)
+
+        # one lookup for every email and username in the batch
+        existing = {}
+        taken_usernames = {}
+        for user in CustomUser.objects.filter(
+            Q(email__in=rows) | Q(username__in=[row[3] for row in rows.values()])
+        ).select_related('patient_profile', 'doctor_profile'):
+            existing[user.email] = user
+            taken_usernames[user.username] = user.email
+
+        new = {}
+        new_usernames = set()
+        merges = []
+        for email, (number, row, role, username, profile) in rows.items():
+            if email in existing:
+                if self.options['on_duplicate'] == 'skip':
+                    self.counts['skipped'] += 1
+                elif existing[email].role != role:
+                    self.fail(number, f"{email} already exists as a {existing[email].role}")
+                else:
+                    merges.append((existing[email], role, profile))
+            elif username in taken_usernames or username in new_usernames:
+                self.fail(number, f"username {username!r} is already taken")
+            else:
+                new[email] = (number, row, role, username, profile)
+                new_usernames.add(username)
+
+        passwords = list(pool.map(
+            make_password, [row.get('password') for number, row, role, username, profile in new.values()],
+            chunksize=max(len(new) // (self.options['workers'] * 4), 1)
+        ))
+
+        with transaction.atomic():
+            users = bulk_create_users(
+                [
+                    CustomUser(email=email, username=username, role=role, password=password)
+                    for (email, (number, row, role, username, profile)), password in zip(new.items(), passwords)
+                ],
+                profiles=[profile for number, row, role, username, profile in new.values()],
+            )
+            self.merge_profiles(merges)
+
+        self.counts['created'] += len(users)
+        self.counts['merged'] += len(merges)
+
+    def merge_profiles(self, merges):
+        """Update (or add) the profiles of existing users from their rows, in bulk."""
+        models = {'patient': (Patient, 'patient_profile'), 'doctor': (Doctor, 'doctor_profile')}
+        for role, (model, related_name) in models.items():
+            to_create, to_update, fields = [], [], set()
+            for user, row_role, profile in merges:
+                if row_role != role:
+                    continue
+                instance = getattr(user, related_name, None)
+                if instance is None:
+                    to_create.append(build_profile(user, **profile))
+                else:
+                    for name, value in profile.items():
+                        setattr(instance, name, value)
+                    fields.update(profile)
+                    to_update.append(instance)
+            if role == 'doctor':
+                # bulk_create and bulk_update skip save(), which fills the search columns and compiles the schedule
+                for instance in to_create + to_update:
+                    instance.set_search_keys()
+                    instance.compile_schedule()
+                fields.update(['search_name', 'search_surname', 'search_specialization', 'schedule', 'working_days'])
+            model.objects.bulk_create(to_create)
+            if to_update:
+                model.objects.bulk_update(to_update, sorted(fields))
+            if role == 'doctor' and to_update:
+                # bulk_update skips the signals that reset the slot index and availability cache
+                DoctorSlot.objects.filter(doctor__in=to_update).delete()
+                for instance in to_update:
+                    invalidate_doctor(instance.id)
+            if role == 'doctor' and (to_create or to_update):
+                invalidate_facets()
+
+    # appointments
+
+    def import_appointments(self, batch):
+        rows = []
+        for number, row in batch:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                patient_email = CustomUser.objects.normalize_email(row['patient_email'])
+                doctor_email = CustomUser.objects.normalize_email(row['doctor_email'])
+                appointment_date = date_cls.fromisoformat(row['date'])
+                appointment_time = Appointment._meta.get_field('time').to_python(row['time'])
+            except KeyError as exc:
+                self.fail(number, f"missing {exc.args[0]}")
+                continue
+            except (RowError, ValueError, TypeError) as exc:
+                self.fail(number, str(exc))
+                continue
+            except Exception as exc:
+                self.fail(number, ' '.join(getattr(exc, 'messages', [str(exc)])))
+                continue
+            rows.append((number, row, patient_email, doctor_email, appointment_date, appointment_time))
+
+        # one lookup per side, and one for the slots already taken
+        patients = dict(Patient.objects.filter(user__email__in={row[2] for row in rows}).values_list('user__email', 'id'))
+        doctors = dict(Doctor.objects.filter(user__email__in={row[3] for row in rows}).values_list('user__email', 'id'))
+        booked = set(
+            Appointment.objects.filter(doctor_id__in=doctors.values(), date__in={row[4] for row in rows})
+            .exclude(status='cancelled').values_list('doctor_id', 'date', 'time')
+        )
+
+        appointments = []
+        for number, row, patient_email, doctor_email, appointment_date, appointment_time in rows:
+            if patient_email not in patients:
+                self.fail(number, f"no patient with email {patient_email}")
+                continue
+            if doctor_email not in doctors:
+                self.fail(number, f"no doctor with email {doctor_email}")
+                continue
+            status = row.get('status', 'pending')
+            if status not in STATUSES:
+                self.fail(number, f"unknown status {status!r}")
+                continue
+            slot = (doctors[doctor_email], appointment_date, appointment_time)
+            if status != 'cancelled':
+                if slot in booked:
+                    self.counts['skipped'] += 1
+                    continue
+                booked.add(slot)
+            appointments.append(Appointment(
+                patient_id=patients[patient_email], doctor_id=slot[0], date=appointment_date, time=appointment_time,
+                status=status, reason=row.get('reason')
+            ))
+
+        with transaction.atomic():
+            Appointment.objects.bulk_create(appointments)
+            # bulk_create skips the signals that maintain the slot index, drop
+            # the touched days so they are rebuilt from the new appointments
+            DoctorSlot.objects.filter(
+                doctor_id__in={appointment.doctor_id for appointment in appointments},
+                date__in={appointment.date for appointment in appointments},
+            ).delete()
+            for doctor_id in {appointment.doctor_id for appointment in appointments}:
+                invalidate_doctor(doctor_id)
+
+        self.counts['created'] += len(appointments)
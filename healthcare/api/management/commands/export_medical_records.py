@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api.export import CHUNK_SIZE, FORMATS, export_queryset, stream_records
+
+
+class Command(BaseCommand):
+    help = "Stream medical records to a file (or stdout) as NDJSON or CSV without loading them all into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--output', help="File to write to (default stdout).")
+        parser.add_argument('--start-date', type=date.fromisoformat, help="Only records created on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--end-date', type=date.fromisoformat, help="Only records created on or before this date (YYYY-MM-DD).")
+        parser.add_argument('--doctor', type=int, action='append', dest='doctor_ids', help="Only records by this doctor id, repeatable.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=f"Rows fetched per query (default {CHUNK_SIZE}).")
+
+    def handle(self, *args, **options):
+        records = export_queryset(options['start_date'], options['end_date'], options['doctor_ids'])
+        lines = stream_records(records, options['output_format'], chunk_size=options['chunk_size'])
+
+        count = -1 if options['output_format'] == 'csv' else 0
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} records to {options['output']}."))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,198 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.availability import SLOT_MINUTES, day_hours, minute_time
+from api.models import Appointment, CustomUser, Doctor, MedicalRecord, Patient
+from api.provisioning import bulk_create_users
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+SPECIALIZATIONS = [
+    'General', 'Cardiology', 'Dermatology', 'Pediatrics', 'Neurology', 'Orthopedics',
+    'Psychiatry', 'Oncology', 'Gynecology', 'Ophthalmology', 'ENT', 'Endocrinology',
+]
+FIRST_NAMES = ['Amina', 'Brian', 'Chen', 'Diana', 'Emeka', 'Fatuma', 'George', 'Hana', 'Ivan', 'Joy', 'Kamau', 'Lena']
+LAST_NAMES = ['Otieno', 'Smith', 'Wanjiru', 'Garcia', 'Kim', 'Mwangi', 'Okafor', 'Novak', 'Achieng', 'Silva']
+DIAGNOSES = ['Hypertension', 'Type 2 diabetes', 'Migraine', 'Influenza', 'Back pain', 'Asthma', 'Anxiety', 'Dermatitis']
+TREATMENTS = ['Rest and fluids', 'Prescribed medication', 'Physiotherapy', 'Lifestyle changes', 'Referral to specialist']
+REASONS = ['Checkup', 'Follow-up', 'Consultation', 'Lab results', 'Prescription renewal', None]
+# (status, weight) for appointments before and after today
+PAST_STATUSES = [('completed', 80), ('cancelled', 15), ('confirmed', 5)]
+FUTURE_STATUSES = [('pending', 50), ('confirmed', 45), ('cancelled', 5)]
+
+
+def random_schedule(rng):
+    """A weekly schedule of 3 to 6 working days, starting and ending on the half hour."""
+    days = rng.sample(WEEKDAYS, rng.randint(3, 5)) + (['Saturday'] if rng.random() < 0.3 else [])
+    schedule = {}
+    for day in days:
+        start = rng.randrange(14, 21)  # half hours, 07:00 to 10:00
+        end = start + rng.randrange(8, 21)  # 4 to 10 hours later
+        schedule[day] = {'start': f'{start // 2:02}:{start % 2 * 30:02}', 'end': f'{end // 2:02}:{end % 2 * 30:02}'}
+    return schedule
+
+
+def random_name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def weighted(rng, choices):
+    return rng.choices([value for value, weight in choices], [weight for value, weight in choices])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic doctors (with varied schedules), patients, appointments and medical records with "
+        "bulk_create, for load testing. Every generated user's email starts with --prefix and their password "
+        "is 'password'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=2000)
+        parser.add_argument('--patients', type=int, default=200000)
+        parser.add_argument('--appointments', type=int, default=1000000)
+        parser.add_argument(
+            '--records', type=int, default=500000,
+            help="Medical records, attached to completed appointments first (default 500000)."
+        )
+        parser.add_argument('--days', type=int, default=365, help="Appointments spread over this many days around today (default 365).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk_create and transaction (default 5000).")
+        parser.add_argument('--prefix', default='synthetic', help="Email prefix of the generated users (default synthetic).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help="Delete users generated earlier with the same prefix first.")
+
+    def handle(self, *args, **options):
+        for name in ('doctors', 'patients', 'appointments', 'records', 'days', 'batch_size'):
+            if options[name] < 0 or (name in ('days', 'batch_size') and options[name] == 0):
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if options['appointments'] and not (options['doctors'] and options['patients']):
+            raise CommandError("Appointments need at least one doctor and one patient.")
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.tag = f"{options['prefix']}-{options['seed']}-{int(time.time())}"
+
+        if options['clear']:
+            self.timed("Deleted earlier data", lambda: CustomUser.objects.filter(email__startswith=f"{options['prefix']}-").delete()[1].get('api.CustomUser', 0))
+
+        # hashing once keeps user creation at bulk insert speed
+        self.password = make_password('password')
+        self.doctors = self.timed("Created doctors", self.create_doctors)
+        self.patient_ids = self.timed("Created patients", self.create_patients)
+        self.records_left = options['records']
+        self.timed("Created appointments", self.create_appointments)
+        self.timed("Created standalone medical records", self.create_standalone_records)
+
+    def timed(self, label, step):
+        started = time.perf_counter()
+        result = step()
+        elapsed = time.perf_counter() - started
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(f"{label}: {count} in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s)")
+        return result
+
+    def users(self, role, count):
+        """Yield batches of (unsaved users, profile fields)."""
+        for start in range(0, count, self.batch_size):
+            users, profiles = [], []
+            for index in range(start, min(start + self.batch_size, count)):
+                username = f'{self.tag}-{role}-{index}'
+                users.append(CustomUser(email=f'{username}@example.com', username=username, role=role, password=self.password))
+                profiles.append(self.profile_fields(role))
+            yield users, profiles
+
+    def profile_fields(self, role):
+        rng = self.rng
+        if role == 'doctor':
+            return {
+                'full_name': f'Dr. {random_name(rng)}',
+                'specialization': rng.choice(SPECIALIZATIONS),
+                'available_days': random_schedule(rng),
+            }
+        return {
+            'full_name': random_name(rng),
+            'age': rng.randint(1, 95),
+            'gender': rng.choice(['male', 'female', 'other']),
+            'phone': f'+2547{rng.randrange(10 ** 8):08}',
+            'address': f'{rng.randint(1, 999)} Synthetic Road',
+        }
+
+    def create_doctors(self):
+        for users, profiles in self.users('doctor', self.options['doctors']):
+            bulk_create_users(users, profiles)
+        return list(Doctor.objects.filter(user__email__startswith=f'{self.tag}-').only('id', 'available_days', 'schedule'))
+
+    def create_patients(self):
+        for users, profiles in self.users('patient', self.options['patients']):
+            bulk_create_users(users, profiles)
+        return list(Patient.objects.filter(user__email__startswith=f'{self.tag}-').values_list('id', flat=True))
+
+    def create_appointments(self):
+        """
+        Spread the appointments over the doctors, each booking a random sample
+        of their own free slots so the one-booking-per-slot constraint holds.
+        """
+        rng = self.rng
+        today = timezone.localdate()
+        first_day = today - timedelta(days=self.options['days'] // 2)
+        days = [first_day + timedelta(days=offset) for offset in range(self.options['days'])]
+        per_doctor, extra = divmod(self.options['appointments'], len(self.doctors) or 1)
+
+        buffer = []
+        created = 0
+        for index, doctor in enumerate(self.doctors):
+            slots = [
+                (day, minute_time(minutes))
+                for day in days if (hours := day_hours(doctor, day))
+                for minutes in range(hours[0], hours[1], SLOT_MINUTES)
+            ]
+            for day, slot_time in rng.sample(slots, min(per_doctor + (index < extra), len(slots))):
+                status = weighted(rng, PAST_STATUSES if day < today else FUTURE_STATUSES)
+                buffer.append(Appointment(
+                    patient_id=rng.choice(self.patient_ids), doctor_id=doctor.id, date=day, time=slot_time,
+                    status=status, reason=rng.choice(REASONS)
+                ))
+                if len(buffer) >= self.batch_size:
+                    created += self.flush_appointments(buffer)
+                    buffer = []
+        return created + self.flush_appointments(buffer)
+
+    def flush_appointments(self, appointments):
+        """Insert a batch of appointments and the medical records of the completed ones."""
+        if not appointments:
+            return 0
+        with transaction.atomic():
+            Appointment.objects.bulk_create(appointments)
+            records = [
+                self.record(appointment.patient_id, appointment.doctor_id, appointment)
+                for appointment in appointments if appointment.status == 'completed'
+            ][:self.records_left]
+            MedicalRecord.objects.bulk_create(records)
+        self.records_left -= len(records)
+        return len(appointments)
+
+    def record(self, patient_id, doctor_id, appointment=None):
+        rng = self.rng
+        return MedicalRecord(
+            patient_id=patient_id, doctor_id=doctor_id, appointment=appointment,
+            diagnosis=rng.choice(DIAGNOSES), treatment=rng.choice(TREATMENTS),
+            notes=rng.choice([None, 'Follow-up in a week', 'Review in a month'])
+        )
+
+    def create_standalone_records(self):
+        """Records without an appointment, for whatever --records the completed appointments didn't cover."""
+        created = 0
+        while self.records_left > 0 and self.doctors and self.patient_ids:
+            count = min(self.records_left, self.batch_size)
+            MedicalRecord.objects.bulk_create([
+                self.record(self.rng.choice(self.patient_ids), self.rng.choice(self.doctors).id) for _ in range(count)
+            ])
+            self.records_left -= count
+            created += count
+        return created
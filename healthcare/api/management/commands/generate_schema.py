@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.schema import schema_setting, write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema and write it as openapi.json and openapi.yaml to OPENAPI_SCHEMA['DIR'], "
+        "where the schema views read it from instead of introspecting the API. Run it on every deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Write here instead of OPENAPI_SCHEMA['DIR'].")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or schema_setting('DIR')
+        if not directory:
+            raise CommandError("Set OPENAPI_SCHEMA['DIR'] (OPENAPI_SCHEMA_DIR) or pass --dir.")
+        rendered = write_schema(directory)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote the schema to {directory} ({len(rendered.content['json'])} bytes of JSON, ETag {rendered.etags['json']})."
+        ))
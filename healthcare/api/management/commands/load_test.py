@@ -0,0 +1,303 @@
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import urls
+from api.models import Appointment, CustomUser, Doctor, MedicalRecord, Patient
+from api.tokens import issue_tokens
+
+from .bench_async_views import fresh_user
+
+
+class Fixture:
+    """Existing users and rows the scenarios pick from."""
+
+    def __init__(self, rng, size=50):
+        self.rng = rng
+        self.doctors = list(Doctor.objects.select_related('user').order_by('?')[:size])
+        self.patients = list(Patient.objects.select_related('user').order_by('?')[:size])
+        if not self.doctors or not self.patients:
+            raise CommandError("Needs doctors and patients to work with, run generate_data first.")
+        self.admin = CustomUser.objects.create_superuser(
+            email=f'loadtest-admin-{uuid.uuid4().hex[:8]}@example.com', username=f'loadtest-admin-{uuid.uuid4().hex[:8]}',
+            password=None, role='admin'
+        )
+        doctor_ids = [doctor.id for doctor in self.doctors]
+        self.appointments = list(Appointment.objects.filter(doctor_id__in=doctor_ids).values_list('id', 'doctor_id')[:1000])
+        self.records = list(MedicalRecord.objects.filter(doctor_id__in=doctor_ids).values_list('id', 'doctor_id')[:1000])
+        self.doctor_users = {doctor.id: doctor.user for doctor in self.doctors}
+
+    def doctor(self):
+        return self.rng.choice(self.doctors)
+
+    def patient(self):
+        return self.rng.choice(self.patients)
+
+    def future_day(self, within=60):
+        return (timezone.localdate() + timedelta(days=self.rng.randrange(1, within))).isoformat()
+
+    def slot(self):
+        return f'{self.rng.randrange(8, 17):02}:{self.rng.choice(["00", "30"])}'
+
+
+# Each scenario builds one request: (user or None, method, url, data). Keyed
+# by route name, every route in api/urls.py should have at least one.
+def register(f):
+    email = f'loadtest-{uuid.uuid4().hex}@example.com'
+    return None, 'post', reverse('register'), {'email': email, 'username': email[:-12], 'password': 'password', 'role': 'patient'}
+
+
+def login(f):
+    # generated users all have the password "password"
+    return None, 'post', reverse('login'), {'email': f.patient().user.email, 'password': 'password'}
+
+
+def logout(f):
+    return f.patient().user, 'post', reverse('logout'), {}
+
+
+def token_refresh(f):
+    return None, 'post', reverse('token-refresh'), {'refresh': issue_tokens(f.patient().user)['refresh']}
+
+
+def token_cache_stats(f):
+    return f.admin, 'get', reverse('token-cache-stats'), None
+
+
+def patient_profile(f):
+    return f.patient().user, 'get', reverse('patient-profile'), None
+
+
+def doctor_profile(f):
+    return f.doctor().user, 'get', reverse('doctor-profile'), None
+
+
+def directory_landing(f):
+    return f.patient().user, 'get', reverse('doctor-directory'), None
+
+
+def directory_search(f):
+    doctor = f.doctor()
+    return f.patient().user, 'get', reverse('doctor-directory'), {
+        'q': doctor.search_surname[:3], 'specialization': doctor.specialization, 'date': f.future_day(14),
+    }
+
+
+def patient_appointments(f):
+    return f.patient().user, 'get', reverse('appointments'), {'expand': 'doctor'}
+
+
+def doctor_appointments(f):
+    return f.doctor().user, 'get', reverse('appointments'), None
+
+
+def book(f):
+    return f.patient().user, 'post', reverse('appointments'), {'doctor': f.doctor().id, 'date': f.future_day(365), 'time': f.slot()}
+
+
+def book_series(f):
+    return f.patient().user, 'post', reverse('appointment-series'), {
+        'doctor': f.doctor().id, 'date': f.future_day(365), 'time': f.slot(), 'frequency': 'weekly', 'count': 3,
+    }
+
+
+def update_appointment(f):
+    if not f.appointments:
+        return book(f)
+    appointment_id, doctor_id = f.rng.choice(f.appointments)
+    return f.doctor_users[doctor_id], 'put', reverse('appointment-update', args=[appointment_id]), {'status': 'confirmed'}
+
+
+def availability(f):
+    return f.patient().user, 'get', reverse('doctor-availability', args=[f.doctor().id]), {'date': f.future_day()}
+
+
+def availability_search(f):
+    start = timezone.localdate() + timedelta(days=f.rng.randrange(1, 60))
+    doctor_ids = ','.join(str(doctor.id) for doctor in f.rng.sample(f.doctors, min(5, len(f.doctors))))
+    return f.patient().user, 'get', reverse('doctor-availability-search'), {
+        'start_date': start.isoformat(), 'end_date': (start + timedelta(days=6)).isoformat(), 'doctor_ids': doctor_ids,
+    }
+
+
+def doctor_records(f):
+    return f.doctor().user, 'get', reverse('medical-records'), {'expand': 'patient'}
+
+
+def patient_records(f):
+    return f.patient().user, 'get', reverse('medical-records'), None
+
+
+def create_record(f):
+    return f.doctor().user, 'post', reverse('medical-records'), {
+        'patient': f.patient().id, 'diagnosis': 'Load test', 'treatment': 'None',
+    }
+
+
+def search_records(f):
+    return f.doctor().user, 'get', reverse('medical-record-search'), {'q': f.rng.choice(SEARCH_TERMS)}
+
+
+def export_records(f):
+    # one doctor's records, a whole-table export per request would swamp every other number
+    return f.admin, 'get', reverse('medical-record-export'), {'doctor_ids': str(f.doctor().id)}
+
+
+def update_record(f):
+    if not f.records:
+        return create_record(f)
+    record_id, doctor_id = f.rng.choice(f.records)
+    return f.doctor_users[doctor_id], 'patch', reverse('medical-record-detail', args=[record_id]), {'notes': 'Reviewed'}
+
+
+SEARCH_TERMS = ['pain', 'diabetes', 'medication', 'migraine rest', 'physio', 'follow']
+
+
+# route name -> [(scenario label, build, writes)]
+SCENARIOS = {
+    'register': [('register', register, True)],
+    'login': [('login', login, False)],
+    'logout': [('logout', logout, True)],
+    'token-refresh': [('token refresh', token_refresh, True)],
+    'token-cache-stats': [('token cache stats', token_cache_stats, False)],
+    'patient-profile': [('patient profile', patient_profile, False)],
+    'doctor-profile': [('doctor profile', doctor_profile, False)],
+    'doctor-directory': [
+        ('directory landing', directory_landing, False),
+        ('directory search', directory_search, False),
+    ],
+    'appointments': [
+        ('appointments (patient)', patient_appointments, False),
+        ('appointments (doctor)', doctor_appointments, False),
+        ('book appointment', book, True),
+    ],
+    'appointment-series': [('book series', book_series, True)],
+    'appointment-update': [('update appointment', update_appointment, True)],
+    'doctor-availability': [('availability', availability, False)],
+    'doctor-availability-search': [('availability search', availability_search, False)],
+    'medical-records': [
+        ('records (doctor)', doctor_records, False),
+        ('records (patient)', patient_records, False),
+        ('create record', create_record, True),
+    ],
+    'medical-record-search': [('search records', search_records, False)],
+    'medical-record-export': [('export records', export_records, False)],
+    'medical-record-detail': [('update record', update_record, True)],
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted ``values``."""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)] if values else 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every route in api/urls.py in-process with concurrent clients and report p50/p95/p99 latency, "
+        "throughput and queries per request, optionally as JSON to diff between runs. Works on existing data "
+        "(see generate_data). Clients are force-authenticated, so timings exclude token lookup. Write scenarios "
+        "leave their bookings and records behind, use --read-only to skip them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario (default 200).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients (default 8).")
+        parser.add_argument('--route', action='append', dest='routes', help="Only this route name, repeatable.")
+        parser.add_argument('--read-only', action='store_true', help="Skip scenarios that write.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        route_names = [pattern.name for pattern in urls.urlpatterns if pattern.name]
+        unknown = set(options['routes'] or []) - set(route_names)
+        if unknown:
+            raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}.")
+        uncovered = [name for name in route_names if name not in SCENARIOS]
+        for name in uncovered:
+            self.stderr.write(self.style.WARNING(f"No scenario for route {name}."))
+
+        # expected 4xx responses (taken slots, ...) would otherwise be logged one by one
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        rng = random.Random(options['seed'])
+        fixture = Fixture(rng)
+        results = {}
+        try:
+            for name in route_names:
+                if options['routes'] and name not in options['routes']:
+                    continue
+                for label, build, writes in SCENARIOS.get(name, []):
+                    if writes and options['read_only']:
+                        continue
+                    requests = [build(fixture) for _ in range(options['requests'])]
+                    results[label] = self.run(name, requests, options['concurrency'])
+                    self.report(label, results[label])
+        finally:
+            CustomUser.objects.filter(email__startswith='loadtest-').delete()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'config': {key: options[key] for key in ('requests', 'concurrency', 'read_only', 'seed')},
+                    'uncovered_routes': uncovered,
+                    'scenarios': results,
+                }, output, indent=2, sort_keys=True)
+                output.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} scenarios to {options['output']}."))
+
+    def run(self, route, requests, concurrency):
+        local = threading.local()
+
+        def send(request):
+            user, method, url, data = request
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = APIClient()
+            # a fresh copy, so nothing cached on the user by one request helps the next
+            client.force_authenticate(user=fresh_user(user) if user is not None else None)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json' if method != 'get' else None)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            return response.status_code, elapsed, len(queries)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(send, requests))
+        wall = time.perf_counter() - started
+
+        latencies = sorted(elapsed for status_code, elapsed, queries in outcomes)
+        query_counts = [queries for status_code, elapsed, queries in outcomes]
+        return {
+            'route': route,
+            'requests': len(outcomes),
+            'statuses': {str(code): count for code, count in sorted(Counter(code for code, *rest in outcomes).items())},
+            'throughput': round(len(outcomes) / wall, 1),
+            'latency_ms': {f'p{p}': round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+            'queries': {'mean': round(sum(query_counts) / len(query_counts), 2), 'max': max(query_counts)},
+        }
+
+    def report(self, label, result):
+        latency = result['latency_ms']
+        statuses = ' '.join(f'{code}:{count}' for code, count in result['statuses'].items())
+        self.stdout.write(
+            f"{label:24} {result['throughput']:8.1f} req/s  p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  "
+            f"p99 {latency['p99']:8.2f} ms  queries {result['queries']['mean']:6.2f} (max {result['queries']['max']})  {statuses}"
+        )
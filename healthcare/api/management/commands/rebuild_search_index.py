@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text index of medical records from the records table. The triggers keep it in sync, "
+        "this is for repairs and after restoring data the triggers didn't see."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--optimize', action='store_true', help="Merge the index into a single segment afterwards.")
+
+    def handle(self, *args, **options):
+        if not search_available(options['database']):
+            raise CommandError("The database has no full-text index (search needs SQLite with FTS5).")
+        started = time.perf_counter()
+        rebuild_index(options['database'], optimize=options['optimize'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index in {time.perf_counter() - started:.1f}s."))
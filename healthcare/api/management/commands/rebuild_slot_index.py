@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.availability import booked_times_by_day, build_slot
+from api.models import Doctor, DoctorSlot
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the doctor slot index from scratch using doctors' schedules and their appointments, from today on. "
+        "Past days are rebuilt on demand when read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Days from today to index for every doctor (default 30).")
+        parser.add_argument('--batch-size', type=int, default=200, help="Doctors processed per batch (default 200).")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        upcoming = [today + timedelta(days=offset) for offset in range(max(options['days'], 0))]
+        batch_size = options['batch_size']
+
+        created = skipped = 0
+        doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(doctor_ids), batch_size):
+            # one transaction per batch: transactions take the write lock when
+            # they begin, bookings only wait for the batch in progress
+            with transaction.atomic():
+                batch = list(
+                    Doctor.objects.filter(id__in=doctor_ids[start:start + batch_size]).only('id', 'available_days', 'schedule')
+                )
+                DoctorSlot.objects.filter(doctor__in=batch).delete()
+
+                booked = booked_times_by_day([doctor.id for doctor in batch], today, date.max)
+                booked_dates = {}
+                for doctor_id, day in booked:
+                    booked_dates.setdefault(doctor_id, set()).add(day)
+
+                slots = []
+                for doctor in batch:
+                    for day in sorted(booked_dates.get(doctor.id, set()).union(upcoming)):
+                        try:
+                            slots.append(build_slot(doctor, day, booked.get((doctor.id, day), set())))
+                        except (KeyError, TypeError, ValueError):
+                            # what working_hours raises on a malformed day
+                            skipped += 1
+
+                DoctorSlot.objects.bulk_create(slots, batch_size=1000)
+                created += len(slots)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {created} doctor-days for {len(doctor_ids)} doctors."))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} doctor-days with a malformed schedule."))
@@ -0,0 +1,60 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.jobs import claim, work
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (confirmation emails, post-appointment records) with a pool of "
+        "threads or processes. Jobs are claimed from the database, failures are retried with exponential backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Jobs run at once (default 4).")
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread', help="Run jobs in threads (default) or processes.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle (default 1).")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling forever.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers must be positive.")
+
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        counts = {'done': 0, 'queued': 0, 'failed': 0}
+        if options['pool'] == 'process':
+            # forked workers must open their own connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        self.stdout.write(f"Worker {name} running jobs in a {options['pool']} pool of {workers}.")
+        in_flight = set()
+        try:
+            with pool:
+                while True:
+                    # only claim what the pool can start right away
+                    jobs = claim(name, workers - len(in_flight)) if len(in_flight) < workers else []
+                    in_flight.update(pool.submit(work, job) for job in jobs)
+                    if not in_flight:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    finished, in_flight = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        counts[future.result()] += 1
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping, waiting for running jobs to finish.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['done']} done, {counts['queued']} to retry, {counts['failed']} failed."
+        ))
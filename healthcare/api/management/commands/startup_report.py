@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SCRIPT = (
+    "import json, sys\n"
+    "from api.startup import profile_startup\n"
+    "print(json.dumps(profile_startup(sys.argv[1], warm=sys.argv[2] == '1')))\n"
+)
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of each top-level import from ``python -X importtime`` output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # nested imports are indented under the module that pulled them in
+        if not name.startswith('  '):
+            name = name.strip()
+            totals[name] = totals.get(name, 0) + int(cumulative_us)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the project in a fresh interpreter, as a worker would, and report where the time goes: the "
+        "heaviest top-level imports, each app's import, models import and ready(), the URLconf and handler, "
+        "the warmup steps and the first requests. A module imported by several apps is charged to the first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/appointments/', help="Path of the timed requests (default /api/appointments/).")
+        parser.add_argument('--no-warmup', action='store_true', help="Skip the warmup, to see what the first request pays without it.")
+        parser.add_argument('--top', type=int, default=15, help="Top-level imports to list (default 15).")
+        parser.add_argument('--json', action='store_true', help="Print the raw report as JSON.")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'healthcare.settings')}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT, options['path'], '0' if options['no_warmup'] else '1'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup failed:\n{result.stderr[-2000:]}")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(result.stderr)
+        report['imports'] = dict(sorted(imports.items(), key=lambda item: -item[1])[:options['top']])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.print_report(report)
+
+    def print_report(self, report):
+        def ms(seconds):
+            return f"{seconds * 1000:9.1f} ms"
+
+        self.stdout.write(f"{'settings':32} {ms(report['settings'])}")
+        self.stdout.write(f"{'django.setup()':32} {ms(report['setup'])}")
+        for label, record in report['apps'].items():
+            self.stdout.write(
+                f"  {label:30} import {ms(record['import'])}  models {ms(record.get('import_models', 0))}  "
+                f"ready {ms(record.get('ready', 0))}"
+            )
+        self.stdout.write(f"{'wsgi handler':32} {ms(report['handler'])}")
+        for step, seconds in report['warmup'].items():
+            self.stdout.write(f"{'warmup ' + step:32} {ms(seconds)}")
+        for index, request in enumerate(report['requests'], 1):
+            label = f"request {index} ({request['status'][:3]})"
+            self.stdout.write(f"{label:32} {ms(request['seconds'])}")
+        self.stdout.write("heaviest top-level imports (cumulative):")
+        for name, microseconds in report['imports'].items():
+            self.stdout.write(f"  {name:30} {ms(microseconds / 1e6)}")
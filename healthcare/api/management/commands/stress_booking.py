@@ -0,0 +1,107 @@
+import logging
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import CustomUser, Doctor
+from api.provisioning import bulk_create_users
+
+WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def book(patient_user_id, payload, start_at):
+    """Wait for the common start time, then POST one booking and return its status code."""
+    try:
+        user = CustomUser.objects.get(id=patient_user_id)
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user=user)
+
+        time.sleep(max(0, start_at - time.time()))
+        return client.post(reverse('appointments'), payload, format='json').status_code
+    finally:
+        connections.close_all()
+
+
+def create_fixture(count):
+    """Create one doctor and ``count`` patients, with their profiles, without going through registration."""
+    tag = uuid.uuid4().hex[:8]
+    users = bulk_create_users(
+        [CustomUser(email=f'stress-{tag}-doctor@example.com', username=f'stress-{tag}-doctor', role='doctor')] +
+        [CustomUser(email=f'stress-{tag}-{index}@example.com', username=f'stress-{tag}-{index}', role='patient') for index in range(count)],
+        profiles=[{
+            'full_name': f'Stress {tag}', 'specialization': 'Stress',
+            'available_days': {day: {'start': '08:00', 'end': '17:00'} for day in WEEK},
+        }] + [{}] * count
+    )
+    return Doctor.objects.select_related('user').get(user=users[0]), users
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire N simultaneous bookings at the same doctor slot from threads or processes and check that exactly "
+        "one succeeds and the rest get 409. Creates (and afterwards deletes) its own doctor and patients. "
+        "Process mode needs a file-backed database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help="Number of simultaneous bookings (default 20).")
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--rounds', type=int, default=1, help="Number of slots to contend for, one after another.")
+        parser.add_argument('--keep', action='store_true', help="Keep the fixture data afterwards.")
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        if count < 2:
+            raise CommandError("--requests must be at least 2.")
+
+        # every losing booking would otherwise log a "Conflict" warning
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        doctor, users = create_fixture(count)
+        patient_ids = [user.id for user in users[1:]]
+        failures = []
+
+        try:
+            for round_number in range(options['rounds']):
+                payload = {
+                    'doctor': doctor.id,
+                    'date': (timezone.localdate() + timedelta(days=7 + round_number)).isoformat(),
+                    'time': '09:00',
+                }
+                statuses = self.run_round(options['mode'], patient_ids, payload)
+
+                summary = ', '.join(f'{code}: {number}' for code, number in sorted(statuses.items()))
+                self.stdout.write(f"Round {round_number + 1}: {summary}")
+                if statuses[201] != 1 or statuses[201] + statuses[409] != count:
+                    failures.append(round_number + 1)
+        finally:
+            if not options['keep']:
+                CustomUser.objects.filter(id__in=[user.id for user in users]).delete()
+
+        if failures:
+            raise CommandError(f"Expected exactly one 201 and {count - 1} 409s, rounds {failures} differed.")
+        self.stdout.write(self.style.SUCCESS(f"{options['rounds']} round(s) of {count} concurrent bookings: exactly one succeeded each time."))
+
+    def run_round(self, mode, patient_ids, payload):
+        # leave the workers enough time to start and connect before they fire together
+        start_at = time.time() + 1.0
+        if mode == 'process':
+            # forked workers must not share the parent's connections, spawned
+            # ones (macOS, forkserver) start without Django set up
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=len(patient_ids), initializer=django.setup)
+        else:
+            executor = ThreadPoolExecutor(max_workers=len(patient_ids))
+
+        with executor:
+            futures = [executor.submit(book, patient_id, payload, start_at) for patient_id in patient_ids]
+            return Counter(future.result() for future in futures)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.replicas import REPLICA, copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the default SQLite database over the replica with SQLite's backup API, to try "
+        "REPLICA_ROUTING locally. With --interval it keeps copying, like a lagging replica."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Copy again every this many seconds until interrupted.")
+
+    def handle(self, *args, **options):
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError("--interval must be positive.")
+        try:
+            while True:
+                try:
+                    copy_sqlite_database('default', REPLICA)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                self.stdout.write(self.style.SUCCESS(f"Copied default to {REPLICA}."))
+                if options['interval'] is None:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
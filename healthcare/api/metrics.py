@@ -0,0 +1,282 @@
+import copy
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .authentication import token_cache
+
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# query counters of the request being served, see record_query
+_current = ContextVar('request_metrics', default=None)
+
+# a worker's snapshot counts towards gauges for this many flush intervals;
+# files of recycled workers stay behind, their caches don't
+GAUGE_FLUSHES = 3
+
+
+def metrics_setting(name):
+    defaults = {
+        'ENABLED': True,
+        'TOKEN': '',
+        'DIR': None,
+        'FLUSH_SECONDS': 5,
+        'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    }
+    return getattr(settings, 'METRICS', {}).get(name, defaults[name])
+
+
+class QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries and their time against the current request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver, the wrapper list outlives reconnects so only add it once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    """
+    Per-process request totals by (route, method). Observing a request takes
+    one lock and a few additions; with METRICS['DIR'] set the totals are also
+    written to a file of their own there, so /metrics can add up all workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._name = f'metrics-{self._pid}-{uuid.uuid4().hex[:8]}.json'
+        self._series = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, route, method, status_code, seconds, queries, response_bytes):
+        buckets = metrics_setting('BUCKETS')
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked worker starts from zero, not from its parent's totals
+                self._reset()
+            series = self._series.get((route, method))
+            if series is None:
+                series = self._series[(route, method)] = {
+                    'route': route, 'method': method, 'statuses': {}, 'buckets': [0] * len(buckets),
+                    'count': 0, 'seconds': 0.0, 'queries': 0, 'query_seconds': 0.0, 'response_bytes': 0,
+                }
+            status_code = str(status_code)
+            series['statuses'][status_code] = series['statuses'].get(status_code, 0) + 1
+            for index, bound in enumerate(buckets):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+                    break
+            series['count'] += 1
+            series['seconds'] += seconds
+            series['queries'] += queries.count
+            series['query_seconds'] += queries.seconds
+            series['response_bytes'] += response_bytes
+
+    def snapshot(self):
+        with self._lock:
+            series = copy.deepcopy(list(self._series.values()))
+        return {'series': series, 'token_cache': token_cache.stats(), 'written_at': time.time()}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def flush_due(self):
+        return bool(metrics_setting('DIR')) and time.monotonic() - self._flushed_at >= metrics_setting('FLUSH_SECONDS')
+
+    def maybe_flush(self):
+        if self.flush_due():
+            self.flush()
+
+    def flush(self):
+        """Write this process's totals to METRICS['DIR'], atomically replacing the last write."""
+        directory = metrics_setting('DIR')
+        self._flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, os.path.join(directory, self._name))
+
+    def collect(self):
+        """Snapshots of every process, or just this one without METRICS['DIR']."""
+        directory = metrics_setting('DIR')
+        if not directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """
+    Add up the series and token cache counters of several snapshots. The
+    cache size is a gauge, only snapshots written in the last GAUGE_FLUSHES
+    flush intervals count towards it.
+    """
+    fresh_after = time.time() - GAUGE_FLUSHES * metrics_setting('FLUSH_SECONDS')
+    series = {}
+    cache = {'size': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+    for snapshot in snapshots:
+        for item in snapshot['series']:
+            key = (item['route'], item['method'])
+            if key not in series:
+                series[key] = copy.deepcopy(item)
+                continue
+            total = series[key]
+            for name in ('count', 'seconds', 'queries', 'query_seconds', 'response_bytes'):
+                total[name] += item[name]
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], item['buckets'])]
+            for code, count in item['statuses'].items():
+                total['statuses'][code] = total['statuses'].get(code, 0) + count
+        for name in ('hits', 'misses', 'evictions'):
+            cache[name] += snapshot['token_cache'][name]
+        if snapshot.get('written_at', 0) >= fresh_after:
+            cache['size'] += snapshot['token_cache']['size']
+    return [series[key] for key in sorted(series)], cache
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render(snapshots):
+    """The merged snapshots in the Prometheus text exposition format."""
+    series, cache = merge(snapshots)
+    buckets = metrics_setting('BUCKETS')
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{labels} {value}' for labels, value in samples)
+
+    family('api_requests_total', 'counter', 'Requests by route, method and response status.', [
+        (_labels(route=item['route'], method=item['method'], status=code), count)
+        for item in series for code, count in sorted(item['statuses'].items())
+    ])
+
+    lines.append('# HELP api_request_duration_seconds Time spent serving requests.')
+    lines.append('# TYPE api_request_duration_seconds histogram')
+    for item in series:
+        route, method = item['route'], item['method']
+        cumulative = 0
+        for bound, count in zip(buckets, item['buckets']):
+            cumulative += count
+            lines.append(f'api_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+        lines.append(f'api_request_duration_seconds_bucket{_labels(route=route, method=method, le="+Inf")} {item["count"]}')
+        labels = _labels(route=route, method=method)
+        lines.append(f'api_request_duration_seconds_sum{labels} {item["seconds"]}')
+        lines.append(f'api_request_duration_seconds_count{labels} {item["count"]}')
+
+    for name, key, kind, help_text in (
+        ('api_db_queries_total', 'queries', 'counter', 'Database queries run while serving requests.'),
+        ('api_db_query_seconds_total', 'query_seconds', 'counter', 'Time spent in database queries while serving requests.'),
+        ('api_response_bytes_total', 'response_bytes', 'counter', 'Response body bytes sent, streamed bodies not included.'),
+    ):
+        family(name, kind, help_text, [(_labels(route=item['route'], method=item['method']), item[key]) for item in series])
+
+    family('api_token_cache_entries', 'gauge', 'Entries in the token caches of the processes that wrote their totals recently.', [('', cache['size'])])
+    for name in ('hits', 'misses', 'evictions'):
+        family(f'api_token_cache_{name}_total', 'counter', f'Token cache {name}.', [('', cache[name])])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Time every request and count its queries against the URL name it resolved to.
+    Runs natively under both WSGI and ASGI, so async requests stay on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics_setting('ENABLED'):
+            return self.get_response(request)
+        queries = QueryStats()
+        token = _current.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, queries)
+        registry.maybe_flush()
+        return response
+
+    async def __acall__(self, request):
+        if not metrics_setting('ENABLED'):
+            return await self.get_response(request)
+        # the async ORM runs queries in a thread with a copy of this context,
+        # which still points at the same QueryStats
+        queries = QueryStats()
+        token = _current.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, queries)
+        if registry.flush_due():
+            # file I/O, keep it off the event loop
+            await sync_to_async(registry.flush)()
+        return response
+
+    def observe(self, request, response, seconds, queries):
+        # unresolved paths share one label, so scanners can't blow up the series count
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.observe(route, method, response.status_code, seconds, queries, response_bytes)
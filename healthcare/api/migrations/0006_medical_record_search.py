@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# External-content FTS5 index over the record text, kept in sync by triggers
+# so bulk inserts and raw updates are indexed too. Besides the text it
+# indexes a "scope" column of d<doctor_id> and p<patient_id> tokens, read from
+# the view below, so a search limited to one doctor's or patient's records
+# intersects two doclists instead of joining every match against the records
+# table. SQLite only; on other databases search reports itself unavailable.
+SCOPE = "'d' || {row}.doctor_id || ' p' || {row}.patient_id"
+
+CREATE = [
+    f"""
+    CREATE VIEW api_medicalrecord_search AS
+    SELECT id, diagnosis, treatment, notes, {SCOPE.format(row='api_medicalrecord')} AS scope FROM api_medicalrecord
+    """,
+    """
+    CREATE VIRTUAL TABLE api_medicalrecord_fts USING fts5(
+        diagnosis, treatment, notes, scope,
+        content='api_medicalrecord_search', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER api_medicalrecord_fts_insert AFTER INSERT ON api_medicalrecord BEGIN
+        INSERT INTO api_medicalrecord_fts(rowid, diagnosis, treatment, notes, scope)
+        VALUES (new.id, new.diagnosis, new.treatment, new.notes, {SCOPE.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER api_medicalrecord_fts_delete AFTER DELETE ON api_medicalrecord BEGIN
+        INSERT INTO api_medicalrecord_fts(api_medicalrecord_fts, rowid, diagnosis, treatment, notes, scope)
+        VALUES ('delete', old.id, old.diagnosis, old.treatment, old.notes, {SCOPE.format(row='old')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER api_medicalrecord_fts_update
+    AFTER UPDATE OF diagnosis, treatment, notes, doctor_id, patient_id ON api_medicalrecord BEGIN
+        INSERT INTO api_medicalrecord_fts(api_medicalrecord_fts, rowid, diagnosis, treatment, notes, scope)
+        VALUES ('delete', old.id, old.diagnosis, old.treatment, old.notes, {SCOPE.format(row='old')});
+        INSERT INTO api_medicalrecord_fts(rowid, diagnosis, treatment, notes, scope)
+        VALUES (new.id, new.diagnosis, new.treatment, new.notes, {SCOPE.format(row='new')});
+    END
+    """,
+    "INSERT INTO api_medicalrecord_fts(api_medicalrecord_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS api_medicalrecord_fts_update',
+    'DROP TRIGGER IF EXISTS api_medicalrecord_fts_delete',
+    'DROP TRIGGER IF EXISTS api_medicalrecord_fts_insert',
+    'DROP TABLE IF EXISTS api_medicalrecord_fts',
+    'DROP VIEW IF EXISTS api_medicalrecord_search',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_revoked_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2 on 2026-10-18 17:37
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# frozen copies of api.models.search_key and doctor_search_keys as of this
+# migration, so later changes to them don't change what it computes
+
+NAME_TITLES = {'dr', 'doctor', 'prof', 'mr', 'mrs', 'ms'}
+
+
+def search_key(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def doctor_search_keys(full_name, specialization):
+    words = search_key(full_name).split()
+    while len(words) > 1 and words[0] in NAME_TITLES:
+        words.pop(0)
+    return {
+        'search_name': ' '.join(words),
+        'search_surname': words[-1] if words else '',
+        'search_specialization': search_key(specialization),
+    }
+
+
+def fill_search_keys(apps, schema_editor):
+    Doctor = apps.get_model('api', 'Doctor')
+    doctors = list(Doctor.objects.only('id', 'full_name', 'specialization'))
+    for doctor in doctors:
+        for name, value in doctor_search_keys(doctor.full_name, doctor.specialization).items():
+            setattr(doctor, name, value)
+    Doctor.objects.bulk_update(doctors, ['search_name', 'search_surname', 'search_specialization'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_medical_record_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='search_specialization',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='search_surname',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['search_name', 'id'], name='doctor_search_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['search_surname'], name='doctor_search_surname_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['search_specialization', 'search_name', 'id'], name='doctor_search_spec_idx'),
+        ),
+    ]
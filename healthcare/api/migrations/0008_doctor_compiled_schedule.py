@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 17:44
+
+import datetime
+
+from django.db import migrations, models
+
+# frozen copy of api.models.compile_schedule as of this migration, so later
+# changes to it don't change what it computes
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def compile_schedule(available_days):
+    if not isinstance(available_days, dict):
+        return None, 0
+    schedule, working_days, malformed = [], 0, False
+    for index, day in enumerate(WEEKDAYS):
+        if day not in available_days:
+            schedule.append(None)
+            continue
+        working_days |= 1 << index
+        try:
+            start = datetime.datetime.strptime(available_days[day]['start'], '%H:%M')
+            end = datetime.datetime.strptime(available_days[day]['end'], '%H:%M')
+        except (KeyError, TypeError, ValueError):
+            malformed = True
+            continue
+        schedule.append([start.hour * 60 + start.minute, end.hour * 60 + end.minute])
+    return (None if malformed else schedule), working_days
+
+
+def fill_schedules(apps, schema_editor):
+    Doctor = apps.get_model('api', 'Doctor')
+    doctors = list(Doctor.objects.only('id', 'available_days'))
+    for doctor in doctors:
+        doctor.schedule, doctor.working_days = compile_schedule(doctor.available_days)
+    Doctor.objects.bulk_update(doctors, ['schedule', 'working_days'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_doctor_directory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='schedule',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='working_days',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_schedules, migrations.RunPython.noop),
+    ]
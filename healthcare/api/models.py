@@ -1,6 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
+import datetime
+import re
+import unicodedata
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
@@ -38,6 +41,52 @@ class Patient(models.Model):
     def __str__(self):
         return self.full_name
 
+NAME_TITLES = {'dr', 'doctor', 'prof', 'mr', 'mrs', 'ms'}
+
+def search_key(text):
+    """Lowercase ``text`` without accents or punctuation, words separated by single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+def doctor_search_keys(full_name, specialization):
+    """The values of a doctor's search columns."""
+    words = search_key(full_name).split()
+    # "Dr. Jane Smith" is found as "jane" or "smith"
+    while len(words) > 1 and words[0] in NAME_TITLES:
+        words.pop(0)
+    return {
+        'search_name': ' '.join(words),
+        'search_surname': words[-1] if words else '',
+        'search_specialization': search_key(specialization),
+    }
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def compile_schedule(available_days):
+    """
+    Compile an ``available_days`` schedule into (schedule, working_days):
+    the working hours of each weekday from Monday as [start, end] minutes
+    since midnight (None when off), and a bitmask of the weekdays listed
+    (bit 0 is Monday). The schedule is None if any day is malformed.
+    """
+    if not isinstance(available_days, dict):
+        return None, 0
+    schedule, working_days, malformed = [], 0, False
+    for index, day in enumerate(WEEKDAYS):
+        if day not in available_days:
+            schedule.append(None)
+            continue
+        working_days |= 1 << index
+        try:
+            start = datetime.datetime.strptime(available_days[day]['start'], '%H:%M')
+            end = datetime.datetime.strptime(available_days[day]['end'], '%H:%M')
+        except (KeyError, TypeError, ValueError):
+            malformed = True
+            continue
+        schedule.append([start.hour * 60 + start.minute, end.hour * 60 + end.minute])
+    return (None if malformed else schedule), working_days
+
 class Doctor(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='doctor_profile')
     full_name = models.CharField(max_length=255)
@@ -47,9 +96,56 @@ class Doctor(models.Model):
     # simple availability as days + time range
     available_days = models.JSONField(default=dict)
 
+    # available_days compiled on save, see compile_schedule
+    schedule = models.JSONField(null=True, blank=True, editable=False)
+    working_days = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # normalized copies for the directory's prefix search, set on save
+    search_name = models.CharField(max_length=255, default='', editable=False)
+    search_surname = models.CharField(max_length=255, default='', editable=False)
+    search_specialization = models.CharField(max_length=100, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # prefix ranges on the name or surname, paged by (search_name, id)
+            models.Index(fields=['search_name', 'id'], name='doctor_search_name_idx'),
+            models.Index(fields=['search_surname'], name='doctor_search_surname_idx'),
+            models.Index(fields=['search_specialization', 'search_name', 'id'], name='doctor_search_spec_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} - {self.specialization}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the schedule as loaded so saves can tell if it changed
+        instance._loaded_available_days = instance.__dict__.get('available_days')
+        instance._loaded_specialization = instance.__dict__.get('specialization')
+        return instance
+
+    def set_search_keys(self):
+        """Fill the search columns from the name and specialization. bulk_create and bulk_update need this called first."""
+        for name, value in doctor_search_keys(self.full_name, self.specialization).items():
+            setattr(self, name, value)
+
+    def compile_schedule(self):
+        """Fill schedule and working_days from available_days. bulk_create and bulk_update need this called first."""
+        self.schedule, self.working_days = compile_schedule(self.available_days)
+
+    def save(self, *args, **kwargs):
+        self.set_search_keys()
+        self.compile_schedule()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'full_name', 'specialization'} & update_fields:
+                update_fields |= {'search_name', 'search_surname', 'search_specialization'}
+            if 'available_days' in update_fields:
+                update_fields |= {'schedule', 'working_days'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 STATUS_CHOICES = [
     ('pending', 'Pending'),
     ('confirmed', 'Confirmed'),
@@ -66,11 +162,36 @@ class Appointment(models.Model):
     reason = models.TextField(blank=True, null=True)
 
     class Meta:
-        unique_together = ('doctor', 'date', 'time')  # prevents double-booking
+        constraints = [
+            # prevents double-booking, cancelled appointments free their slot
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_appointment_slot',
+            ),
+        ]
+        indexes = [
+            # listings and availability filter by one side and page by (date, time, id)
+            models.Index(fields=['doctor', 'date', 'time'], name='appointment_doctor_date_idx'),
+            models.Index(fields=['patient', 'date', 'time'], name='appointment_patient_date_idx'),
+            models.Index(fields=['status'], name='appointment_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.time} with Dr. {self.doctor.full_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the slot as loaded so saves can tell what changed
+        instance._loaded_slot = (
+            instance.__dict__.get('doctor_id'),
+            instance.__dict__.get('date'),
+            instance.__dict__.get('time'),
+            instance.__dict__.get('status'),
+        )
+        return instance
+
 class MedicalRecord(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='medical_records')
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='created_records')
@@ -80,5 +201,111 @@ class MedicalRecord(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # listings filter by one side (or none, for admins) and page by (created_at, id)
+            models.Index(fields=['patient', 'created_at'], name='record_patient_created_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='record_doctor_created_idx'),
+            models.Index(fields=['created_at'], name='record_created_idx'),
+        ]
+
     def __str__(self):
         return f"Record for {self.patient.full_name} by Dr. {self.doctor.full_name}"
+
+
+class DoctorSlot(models.Model):
+    """
+    Materialized slot index: one row per doctor per day holding the day's
+    working window and a bitmap of booked slots (bit i is the i-th 30 minute
+    slot from start_time).
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    # both empty when the doctor doesn't work that day
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    slot_count = models.PositiveSmallIntegerField(default=0)
+    booked_mask = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('doctor', 'date')
+
+    def __str__(self):
+        return f"Slots for Dr. {self.doctor_id} on {self.date}"
+
+    @property
+    def is_working_day(self):
+        return self.start_time is not None
+
+    def covers(self, time):
+        return self.is_working_day and self.start_time <= time < self.end_time
+
+    def slot_index(self, time):
+        """Return the slot number starting exactly at ``time``, or None if off the grid."""
+        if not self.covers(time) or time.second or time.microsecond:
+            return None
+        offset = (time.hour * 60 + time.minute) - (self.start_time.hour * 60 + self.start_time.minute)
+        if offset % 30:
+            return None
+        index = offset // 30
+        return index if index < self.slot_count else None
+
+    def is_booked(self, index):
+        return bool(self.booked_mask >> index & 1)
+
+    def time_slots(self):
+        """Yield (time, available) for every slot of the day."""
+        if not self.is_working_day:
+            return
+        start_minutes = self.start_time.hour * 60 + self.start_time.minute
+        for index in range(self.slot_count):
+            minutes = start_minutes + index * 30
+            yield datetime.time(minutes // 60, minutes % 60), not self.is_booked(index)
+
+
+JOB_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+]
+
+class Job(models.Model):
+    """
+    A background job for the database-backed queue in api.jobs. Workers claim
+    queued jobs whose run_after has passed with a conditional UPDATE, so two
+    workers never run the same job.
+    """
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # set by the worker that claimed the job, locked_at expires the claim
+    claimed_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # workers poll for the oldest due jobs of a status
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+class RevokedToken(models.Model):
+    """
+    Denylist of revoked signed refresh tokens (see api.tokens), by token id.
+    Rows are only needed until the token would have expired anyway.
+    """
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
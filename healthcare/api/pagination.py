@@ -0,0 +1,212 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination over a fixed, unique, ascending ordering.
+
+    The cursor carries the ordering values of the row at the page boundary,
+    so every page is a single indexed range query no matter how deep the
+    client scrolls, and no COUNT is ever run.
+    """
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE or 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request)
+        return self.set_page([instance async for instance in page_queryset])
+
+    def page_queryset(self, queryset, request):
+        """Narrow the queryset to the rows of the requested page, plus one."""
+        # one extra row tells us if there is another page
+        return self.ordered_queryset(queryset, request)[:self.page_size + 1]
+
+    def ordered_queryset(self, queryset, request):
+        """Order the queryset for the requested direction and start it at the cursor."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(name) for name in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        self.position, self.reverse = position, reverse
+
+        if reverse:
+            queryset = queryset.order_by(*[f'-{name}' for name in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, reverse))
+        return queryset
+
+    def set_page(self, results):
+        position, reverse = self.position, self.reverse
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def after(self, position, reverse):
+        """
+        Build the row-value comparison (a, b, c) > (x, y, z) as
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z).
+        """
+        lookup = 'lt' if reverse else 'gt'
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            equal = {self.ordering[i]: position[i] for i in range(index)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+        return condition
+
+    def position_of(self, instance):
+        return [field.value_to_string(instance) for field in self.fields]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = cursor['p']
+            reverse = bool(cursor.get('r'))
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # stepped past the end, go back to the first page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AppointmentCursorPagination(KeysetCursorPagination):
+    ordering = ('date', 'time', 'id')
+
+
+class MedicalRecordCursorPagination(KeysetCursorPagination):
+    ordering = ('created_at', 'id')
+
+
+class SearchCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over search results ordered by (rank, id). The rank is
+    computed by the search query rather than stored, so pages are fetched by
+    a callable instead of by filtering a queryset.
+    """
+    ordering = ('rank', 'id')
+
+    def paginate_search(self, search, request):
+        """``search(position, reverse, limit)`` returns the rows after (or before) position, with rank and id."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [models.FloatField(), models.BigIntegerField()]
+        for field, name in zip(self.fields, self.ordering):
+            field.set_attributes_from_name(name)
+
+        position, reverse = self.decode_cursor(request)
+        self.position, self.reverse = position, reverse
+        return self.set_page(search(position, reverse, self.page_size + 1))
+
+
+class DoctorCursorPagination(KeysetCursorPagination):
+    ordering = ('search_name', 'id')
+    chunk_size = 100
+
+    def paginate_filtered(self, queryset, request, keep):
+        """
+        Paginate the rows that pass a filter SQL can't express. ``keep(rows)``
+        returns the ones to show, in order. Rows are read in chunks from the
+        cursor on until the page is full.
+        """
+        ordered = remaining = self.ordered_queryset(queryset, request)
+        results = []
+        while True:
+            chunk = list(remaining[:self.chunk_size])
+            results.extend(keep(chunk))
+            if len(results) > self.page_size or len(chunk) < self.chunk_size:
+                break
+            last = [getattr(chunk[-1], name) for name in self.ordering]
+            remaining = ordered.filter(self.after(last, self.reverse))
+        return self.set_page(results[:self.page_size + 1])
+
+
+class DoctorAvailabilityPagination(DoctorCursorPagination):
+    # every doctor on a page costs up to DoctorAvailabilitySearchView.max_days slot index rows
+    page_size = 50
+    max_page_size = 50
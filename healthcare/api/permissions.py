@@ -1,33 +1,35 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from .caller import get_caller
 
 class IsPatient(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'patient'
+        return get_caller(request).role == 'patient'
 
 class IsDoctor(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'doctor'
+        return get_caller(request).role == 'doctor'
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'admin'
+        return get_caller(request).role == 'admin'
+
+class CanReadMetrics(BasePermission):
+    def has_permission(self, request, view):
+        # the scraper authenticates with METRICS['TOKEN'], see MetricsTokenAuthentication
+        return request.auth == 'metrics' or IsAdmin().has_permission(request, view)
 
 
 class IsDoctorOrPatientOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        return (
-            (hasattr(user, 'doctor_profile') and obj.doctor.user == user) or
-            (hasattr(user, 'patient_profile') and obj.patient.user == user)
-        )
+        return get_caller(request).owns(obj)
 
 class IsDoctorOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        if user.is_superuser:
+        caller = get_caller(request)
+        if caller.is_superuser:
             return True
-        if hasattr(user, 'doctor_profile') and obj.doctor == user.doctor_profile:
+        if caller.doctor_id is not None and obj.doctor_id == caller.doctor_id:
             return True
-        if hasattr(user, 'patient_profile') and obj.patient == user.patient_profile:
+        if caller.patient_id is not None and obj.patient_id == caller.patient_id:
             return request.method in SAFE_METHODS
-        return False
\ No newline at end of file
+        return False
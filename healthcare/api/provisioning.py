@@ -0,0 +1,80 @@
+from django.db import transaction
+
+from .directory import invalidate_facets
+from .models import CustomUser, Doctor, Patient
+
+PROFILE_MODELS = {
+    'patient': Patient,
+    'doctor': Doctor,
+}
+
+
+def default_profile_fields(user):
+    """The fields a freshly registered user's profile starts with."""
+    fields = {'full_name': user.get_full_name() or user.username}
+    if user.role == 'doctor':
+        # no working days until the doctor fills in their schedule
+        fields.update({'specialization': 'General', 'available_days': {}})
+    return fields
+
+
+def build_profile(user, **fields):
+    """
+    Return the unsaved profile matching the user's role, with ``fields``
+    overriding the defaults, or None for roles without a profile (admins).
+    """
+    model = PROFILE_MODELS.get(user.role)
+    if model is None:
+        return None
+    return model(user=user, **{**default_profile_fields(user), **fields})
+
+
+def provision_profile(user, **fields):
+    """Create the profile matching the user's role, if it has one."""
+    profile = build_profile(user, **fields)
+    if profile is not None:
+        profile.save()
+    return profile
+
+
+def provision_profiles(users, fields=None):
+    """
+    Create the profiles of several users with one bulk_create per role.
+    ``fields`` optionally lists per-user field overrides, in the order of ``users``.
+    """
+    by_model = {}
+    for index, user in enumerate(users):
+        profile = build_profile(user, **(fields[index] if fields else {}))
+        if profile is not None:
+            by_model.setdefault(type(profile), []).append(profile)
+
+    profiles = []
+    for model, model_profiles in by_model.items():
+        if model is Doctor:
+            # bulk_create skips save() and the signals, which fill the search
+            # columns and the compiled schedule and drop the facets
+            for profile in model_profiles:
+                profile.set_search_keys()
+                profile.compile_schedule()
+            invalidate_facets()
+        profiles.extend(model.objects.bulk_create(model_profiles))
+    return profiles
+
+
+@transaction.atomic
+def create_user(email, username, password=None, role='patient', profile=None, **extra_fields):
+    """Create a user and the matching profile in one transaction."""
+    user = CustomUser.objects.create_user(email=email, username=username, password=password, role=role, **extra_fields)
+    provision_profile(user, **(profile or {}))
+    return user
+
+
+@transaction.atomic
+def bulk_create_users(users, profiles=None, batch_size=None):
+    """
+    Insert unsaved users and their profiles in one transaction, one
+    bulk_create for the users and one per profile role.
+    """
+    users = CustomUser.objects.bulk_create(users, batch_size=batch_size)
+    provision_profiles(users, profiles)
+    return users
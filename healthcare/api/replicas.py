@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+# set while a view serves a read that may come from the replica
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_setting(name):
+    defaults = {'ENABLED': False, 'STICKY_SECONDS': 10}
+    return getattr(settings, 'REPLICA_ROUTING', {}).get(name, defaults[name])
+
+
+def replica_enabled():
+    return replica_setting('ENABLED') and REPLICA in settings.DATABASES
+
+
+def reading_from_replica():
+    return _use_replica.get() and replica_enabled()
+
+
+@contextmanager
+def read_from_primary():
+    """Send the reads inside the block to the primary even where the replica is allowed."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica while a view marked them safe for it (see
+    ReplicaReadMixin), everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return REPLICA if reading_from_replica() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Keep a user's reads on the primary for the next STICKY_SECONDS, so they see their own writes."""
+    cache.set(_pin_key(user_id), 1, timeout=replica_setting('STICKY_SECONDS'))
+
+
+async def apin_to_primary(user_id):
+    """Async version of pin_to_primary."""
+    await cache.aset(_pin_key(user_id), 1, timeout=replica_setting('STICKY_SECONDS'))
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id)) is not None
+
+
+class ReplicaReadMixin:
+    """
+    Serve the view's safe requests from the replica, unless the caller wrote
+    something in the last STICKY_SECONDS. Authentication and permission checks
+    still read from the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if request.method in SAFE_METHODS and replica_enabled() and not (user.is_authenticated and is_pinned(user.pk)):
+            _use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        _use_replica.set(False)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin users to the primary after any request that may have written. Each
+    request starts reading from the primary and whatever a view switched on
+    is reset when it ends, under WSGI and natively under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        if self.may_have_written(request):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        if self.may_have_written(request):
+            user = getattr(request, 'user', None)
+            if isinstance(user, SimpleLazyObject):
+                # the session user, not resolved by a view yet; loading it queries
+                user = await request.auser()
+            if user is not None and user.is_authenticated:
+                await apin_to_primary(user.pk)
+        return response
+
+    def may_have_written(self, request):
+        return request.method not in SAFE_METHODS and replica_enabled()
+
+
+def copy_sqlite_database(source, target):
+    """
+    Copy a SQLite database over another with SQLite's online backup API, both
+    given as connection aliases. Used to keep a local SQLite replica in sync.
+    """
+    for alias in (source, target):
+        if connections[alias].vendor != 'sqlite':
+            raise ValueError(f"{alias} is not a SQLite database.")
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
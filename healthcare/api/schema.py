@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import SwaggerYAMLRenderer, _SpecRenderer
+
+API_INFO = openapi.Info(
+    title="Healthcare Appointment API",
+    default_version='v1',
+    description="API documentation for the healthcare appointment scheduling system.",
+    owner="the-quiesscent-hub.vercel.app",
+    contact=openapi.Contact(email="ephesianslewis@gmail.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+FILES = {'json': 'openapi.json', 'yaml': 'openapi.yaml'}
+
+_lock = threading.Lock()
+_rendered = None
+
+
+def schema_setting(name):
+    defaults = {'DIR': None, 'MAX_AGE': 24 * 3600}
+    return getattr(settings, 'OPENAPI_SCHEMA', {}).get(name, defaults[name])
+
+
+class RenderedSchema:
+    """The schema encoded once as JSON and YAML, with an ETag per encoding."""
+
+    def __init__(self, json, yaml):
+        self.content = {'json': json, 'yaml': yaml}
+        self.etags = {name: f'"{hashlib.md5(content).hexdigest()}"' for name, content in self.content.items()}
+
+
+def build_schema():
+    """
+    Introspect every view and serializer and encode the result. The schema is
+    public and built without a request, so it is the same for every caller and
+    leaves the host for the UI to fill in.
+    """
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return RenderedSchema(OpenAPICodecJson([]).encode(schema), OpenAPICodecYaml([]).encode(schema))
+
+
+def write_schema(directory):
+    rendered = build_schema()
+    os.makedirs(directory, exist_ok=True)
+    for name, filename in FILES.items():
+        with open(os.path.join(directory, filename), 'wb') as file:
+            file.write(rendered.content[name])
+    return rendered
+
+
+def read_schema(directory):
+    try:
+        content = {}
+        for name, filename in FILES.items():
+            with open(os.path.join(directory, filename), 'rb') as file:
+                content[name] = file.read()
+    except FileNotFoundError:
+        return None
+    return RenderedSchema(**content)
+
+
+def get_schema():
+    """
+    The rendered schema, read from OPENAPI_SCHEMA['DIR'] when `generate_schema`
+    wrote it there on deploy, otherwise built on first use. Either way only
+    once per process.
+    """
+    global _rendered
+    if _rendered is None:
+        with _lock:
+            if _rendered is None:
+                directory = schema_setting('DIR')
+                _rendered = (directory and read_schema(directory)) or build_schema()
+    return _rendered
+
+
+def clear_schema():
+    global _rendered
+    _rendered = None
+
+
+def cached_schema_view(schema_view):
+    """
+    A drf_yasg schema view class that answers spec requests (swagger.json,
+    ?format=openapi, ...) from get_schema() with an ETag and a long max-age
+    instead of introspecting the API again. The UI pages stay as they were;
+    drf_yasg builds them without looking at any endpoint.
+    """
+
+    class CachedSchemaView(schema_view):
+
+        def get(self, request, version='', format=None):
+            if not isinstance(request.accepted_renderer, _SpecRenderer):
+                return super().get(request, version, format)
+
+            name = 'yaml' if isinstance(request.accepted_renderer, SwaggerYAMLRenderer) else 'json'
+            rendered = get_schema()
+            etag = rendered.etags[name]
+            if_none_match = request.headers.get('If-None-Match', '')
+            if if_none_match.strip() == '*' or etag in parse_etags(if_none_match):
+                response = HttpResponse(status=304)
+            else:
+                response = HttpResponse(rendered.content[name], content_type=request.accepted_renderer.media_type)
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, max_age=schema_setting('MAX_AGE'))
+            return response
+
+    return CachedSchemaView
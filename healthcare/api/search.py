@@ -0,0 +1,102 @@
+import re
+from html import escape
+
+from django.db import connections
+
+from .models import MedicalRecord
+
+FTS_TABLE = 'api_medicalrecord_fts'
+
+# bm25 weights of diagnosis, treatment, notes and the scope tokens
+WEIGHTS = (10.0, 4.0, 1.0, 0.0)
+TEXT_COLUMNS = ('diagnosis', 'treatment', 'notes')
+
+# snippet() marks matches with these, they are swapped for <mark> tags once
+# the rest of the text has been HTML-escaped
+START, END = '\x02', '\x03'
+
+_available = {}
+
+
+def search_available(using='default'):
+    """
+    Whether the database behind ``using`` has the FTS5 index (SQLite only).
+    Only a yes is remembered, the index appears once migrations have run.
+    """
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+            return False
+        _available[using] = True
+    return True
+
+
+def match_query(text):
+    """
+    Turn free text into an FTS5 query matching every word (or a word form,
+    the index stems them) in the record text. A word ending in * matches as a
+    prefix; prefixes cost more, so only on request. Words are quoted, so
+    nothing else the user types is read as FTS5 syntax. None if there are no
+    words.
+    """
+    words = re.findall(r'(\w+)(\*?)', text.lower())
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"{star}' for word, star in words)
+    return f"{{{' '.join(TEXT_COLUMNS)}}} : ({terms})"
+
+
+def highlight(snippet):
+    return escape(snippet).replace(START, '<mark>').replace(END, '</mark>')
+
+
+def search_records(query, doctor_id=None, patient_id=None, position=None, reverse=False, limit=10, using='default'):
+    """
+    Records matching ``query`` (see match_query), best first (lowest bm25
+    rank, then id), optionally limited to one doctor's or patient's.
+    ``position`` is the (rank, id) of the row to continue after, or before
+    when ``reverse``. Each record gets ``rank`` and an HTML ``snippet`` of the
+    best matching field with the matches marked.
+    """
+    if doctor_id is not None:
+        query += f' AND scope : "d{int(doctor_id)}"'
+    if patient_id is not None:
+        query += f' AND scope : "p{int(patient_id)}"'
+    snippets = ', '.join(f"snippet({FTS_TABLE}, {column}, %s, %s, '…', 16)" for column in range(len(TEXT_COLUMNS)))
+    sql = [
+        f"SELECT rowid, bm25({FTS_TABLE}, {', '.join(['%s'] * len(WEIGHTS))}) AS match_rank, {snippets}"
+        f" FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    ]
+    params = [*WEIGHTS, *[START, END] * len(TEXT_COLUMNS), query]
+    if position is not None:
+        operator = '<' if reverse else '>'
+        # match_rank, FTS5 tables have a hidden rank column of their own
+        sql.append(f'AND (match_rank {operator} %s OR (match_rank = %s AND rowid {operator} %s))')
+        params.extend([position[0], position[0], position[1]])
+    direction = 'DESC' if reverse else 'ASC'
+    sql.append(f'ORDER BY match_rank {direction}, rowid {direction} LIMIT %s')
+    params.append(limit)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        rows = cursor.fetchall()
+
+    records = MedicalRecord.objects.using(using).select_related('doctor', 'patient').in_bulk([row[0] for row in rows])
+    results = []
+    for record_id, rank, *snippets in rows:
+        record = records.get(record_id)
+        # deleted between the two queries
+        if record is not None:
+            # the first field with a match, diagnosis over treatment over notes
+            snippet = next((text for text in snippets if text and START in text), snippets[0] or '')
+            record.rank, record.snippet = rank, highlight(snippet)
+            results.append(record)
+    return results
+
+
+def rebuild_index(using='default', optimize=False):
+    """Rebuild the index from the records table, optionally merging its segments afterwards."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from .models import *
-from datetime import datetime
+from .provisioning import create_user
+from datetime import datetime, timedelta
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
@@ -10,7 +11,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['email', 'username', 'password', 'role']
 
     def create(self, validated_data):
-        user = CustomUser.objects.create_user(
+        # the patient/doctor profile is created in the same transaction
+        user = create_user(
             email=validated_data['email'],
             username=validated_data['username'],
             password=validated_data['password'],
@@ -33,17 +35,15 @@ class PatientSerializer(serializers.ModelSerializer):
 class DoctorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Doctor
-        fields = '__all__'
+        exclude = ['search_name', 'search_surname', 'search_specialization', 'schedule', 'working_days']
         read_only_fields = ['user']
 
     def validate_available_days(self, value):
-        valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
         if not isinstance(value, dict):
             raise serializers.ValidationError("available_days must be a dictionary.")
 
         for day, time_range in value.items():
-            if day not in valid_days:
+            if day not in WEEKDAYS:
                 raise serializers.ValidationError(f"'{day}' is not a valid weekday.")
 
             if not isinstance(time_range, dict):
@@ -56,8 +56,8 @@ class DoctorSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(f"'{day}' must have both 'start' and 'end' times.")
 
             try:
-                start_time = datetime.datetime.strptime(start, "%H:%M").time()
-                end_time = datetime.datetime.strptime(end, "%H:%M").time()
+                start_time = datetime.strptime(start, "%H:%M").time()
+                end_time = datetime.strptime(end, "%H:%M").time()
             except ValueError:
                 raise serializers.ValidationError(f"Invalid time format for '{day}'. Use 'HH:MM'.")
 
@@ -66,14 +66,80 @@ class DoctorSerializer(serializers.ModelSerializer):
 
         return value
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class DoctorSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Doctor
+        fields = ['id', 'full_name', 'specialization']
+
+class PatientSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ['id', 'full_name']
+
+class ExpandableFieldsMixin:
+    """
+    Replaces related ids with embedded summaries for the names passed in the
+    ``expand`` context, e.g. ``context={'expand': {'doctor'}}``. Callers should
+    select_related the expanded relations.
+    """
+    expandable_fields = {
+        'doctor': DoctorSummarySerializer,
+        'patient': PatientSummarySerializer,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.context.get('expand', ()):
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+class AppointmentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = '__all__'
         read_only_fields = ['patient']
+        # double-booking is enforced by the database constraint at insert time,
+        # a pre-insert exists() check would race with concurrent bookings
+        validators = []
 
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class MedicalRecordSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = MedicalRecord
         fields = '__all__'
         read_only_fields = ['doctor']
+
+class AppointmentSeriesSerializer(serializers.Serializer):
+    FREQUENCIES = {'weekly': 7, 'biweekly': 14}
+    MAX_OCCURRENCES = 52
+
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    date = serializers.DateField(help_text="Date of the first occurrence.")
+    time = serializers.TimeField()
+    reason = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    frequency = serializers.ChoiceField(choices=list(FREQUENCIES))
+    count = serializers.IntegerField(required=False, min_value=1, max_value=MAX_OCCURRENCES)
+    until = serializers.DateField(required=False, help_text="Last possible date of an occurrence.")
+
+    def validate(self, data):
+        if ('count' in data) == ('until' in data):
+            raise serializers.ValidationError("Provide exactly one of 'count' or 'until'.")
+        if 'until' in data:
+            if data['until'] < data['date']:
+                raise serializers.ValidationError({'until': "'until' must not be before 'date'."})
+            step = self.FREQUENCIES[data['frequency']]
+            if (data['until'] - data['date']).days // step + 1 > self.MAX_OCCURRENCES:
+                raise serializers.ValidationError({'until': f"A series can have at most {self.MAX_OCCURRENCES} occurrences."})
+        return data
+
+    def occurrences(self):
+        """Dates of every occurrence in the series."""
+        data = self.validated_data
+        step = timedelta(days=self.FREQUENCIES[data['frequency']])
+        if 'count' in data:
+            return [data['date'] + step * index for index in range(data['count'])]
+        dates = []
+        current = data['date']
+        while current <= data['until']:
+            dates.append(current)
+            current += step
+        return dates
@@ -1,24 +1,80 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import CustomUser, Doctor, Patient
+from rest_framework.authtoken.models import Token
+from .models import Appointment, CustomUser, Doctor
+from .availability import mark_booked, mark_free, reset_doctor_slots
+from .authentication import token_cache
+from .availability_cache import invalidate_doctor
+from .directory import invalidate_facets
+
+# slot index maintenance, these run inside the writing transaction
+
+@receiver(post_save, sender=Appointment)
+def update_slot_index_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_slot', None)
+    current = (instance.doctor_id, instance.date, instance.time, instance.status)
+    was_active = previous is not None and previous[3] != 'cancelled'
+    is_active = instance.status != 'cancelled'
+    moved = previous is None or previous[:3] != current[:3]
+
+    if was_active and (moved or not is_active):
+        mark_free(previous[0], previous[1], previous[2])
+
+    if is_active and (created or moved or not was_active):
+        mark_booked(instance.doctor, instance.date, instance.time)
+
+    invalidate_doctor(instance.doctor_id)
+    if previous is not None and previous[0] != instance.doctor_id:
+        invalidate_doctor(previous[0])
+
+    instance._loaded_slot = current
+
+
+@receiver(post_delete, sender=Appointment)
+def update_slot_index_on_delete(sender, instance, **kwargs):
+    if instance.status != 'cancelled':
+        mark_free(instance.doctor_id, instance.date, instance.time)
+    invalidate_doctor(instance.doctor_id)
+
+
+@receiver(post_save, sender=Doctor)
+def reset_slot_index_on_schedule_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_loaded_available_days', None) != instance.available_days:
+        reset_doctor_slots(instance)
+    instance._loaded_available_days = instance.available_days
+
+
+# availability responses are cached per doctor version, any profile change invalidates them
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_availability_on_doctor_change(sender, instance, **kwargs):
+    invalidate_doctor(instance.id)
+
+
+# the directory's specialization counts change with the set of doctors and their specializations
+
+@receiver(post_save, sender=Doctor)
+def invalidate_facets_on_doctor_save(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_loaded_specialization', None) != instance.specialization:
+        invalidate_facets()
+    instance._loaded_specialization = instance.specialization
+
+
+@receiver(post_delete, sender=Doctor)
+def invalidate_facets_on_doctor_delete(sender, instance, **kwargs):
+    invalidate_facets()
+
+
+# token cache invalidation, covers logout, deactivation and any other user change
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
 
-@receiver(post_save, sender=CustomUser)
-def create_doctor_profile(sender, instance, created, **kwargs):
-    if created and instance.role == 'doctor':
-        Doctor.objects.create(
-            user=instance,
-            full_name=instance.get_full_name(),
-            specialization='General',  # or leave it blank to be filled later
-            available_days=["Monday", "Tuesday"],
-            available_time_start="09:00:00",
-            available_time_end="17:00:00"
-        )
 
 @receiver(post_save, sender=CustomUser)
-def create_doctor_profile(sender, instance, created, **kwargs):
-    if created and instance.role == 'patient':
-        Patient.objects.create(
-            user=instance,
-            full_name=instance.username,
-        )
\ No newline at end of file
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
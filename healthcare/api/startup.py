@@ -0,0 +1,153 @@
+import logging
+import time
+
+from django.apps import AppConfig
+from django.conf import settings
+
+# imported by startup_report before Django is set up, so anything that needs
+# settings or the app registry is imported inside the functions
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_setting(name):
+    defaults = {'ENABLED': True, 'SCHEMA': True}
+    return getattr(settings, 'WARMUP', {}).get(name, defaults[name])
+
+
+def view_classes():
+    """The view classes of every URL pattern, included ones too."""
+    from django.urls import URLResolver, get_resolver
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            else:
+                view_class = getattr(pattern.callback, 'cls', None) or getattr(pattern.callback, 'view_class', None)
+                if view_class is not None:
+                    yield view_class
+
+    return list(dict.fromkeys(walk(get_resolver().url_patterns)))
+
+
+def warm_urls():
+    # importing the URLconf imports every view, the reverse lookup compiles every pattern
+    from django.urls import get_resolver
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def warm_views():
+    """Resolve and import each API view's renderers, parsers, authentication and permission classes."""
+    from rest_framework.views import APIView
+    for view_class in view_classes():
+        if issubclass(view_class, APIView):
+            view = view_class()
+            view.get_renderers()
+            view.get_parsers()
+            view.get_authenticators()
+            view.get_throttles()
+            view.get_content_negotiator()
+
+
+def warm_serializers():
+    """Build each serializer's fields once, which fills the model metadata caches they read."""
+    from rest_framework.serializers import BaseSerializer
+
+    from . import serializers
+    for serializer_class in vars(serializers).values():
+        if isinstance(serializer_class, type) and issubclass(serializer_class, BaseSerializer) \
+                and serializer_class.__module__ == serializers.__name__:
+            try:
+                serializer_class(context={}).fields
+            except (KeyError, AttributeError) as error:
+                # a serializer reading context['request'] or the instance while
+                # building its fields warms up on first use instead
+                logger.debug("Skipped warming up %s: %r", serializer_class.__name__, error)
+
+
+def warm_schema():
+    from .schema import get_schema
+    get_schema()
+
+
+STEPS = [('urls', warm_urls), ('views', warm_views), ('serializers', warm_serializers), ('schema', warm_schema)]
+
+
+def warm_up():
+    """
+    Do the work the first request would otherwise pay for. Nothing here opens
+    a database connection, so it is safe before a preforking server forks.
+    Returns the seconds each step took.
+    """
+    timings = {}
+    for name, step in STEPS:
+        if name == 'schema' and not warmup_setting('SCHEMA'):
+            continue
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def warm_up_if_enabled():
+    """Called by the WSGI and ASGI entry points once the application is loaded."""
+    if warmup_setting('ENABLED'):
+        return warm_up()
+
+
+def profile_startup(path, warm=True):
+    """
+    Boot Django the way a worker does and time each phase: settings, each
+    app's import, models import and ready(), the URLconf, the WSGI handler,
+    the warmup and the first two requests to ``path``. Must run in a fresh
+    interpreter, nothing counts if it was imported already.
+    """
+    report = {'apps': {}}
+    started = time.perf_counter()
+    settings.INSTALLED_APPS
+    report['settings'] = time.perf_counter() - started
+
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        started = time.perf_counter()
+        config = create(cls, entry)
+        record = report['apps'][config.label] = {'import': time.perf_counter() - started}
+        for method in ('import_models', 'ready'):
+            def timed(original=getattr(config, method), method=method):
+                started = time.perf_counter()
+                original()
+                record[method] = time.perf_counter() - started
+            setattr(config, method, timed)
+        return config
+
+    import django
+    AppConfig.create = classmethod(timed_create)
+    try:
+        started = time.perf_counter()
+        django.setup()
+        report['setup'] = time.perf_counter() - started
+    finally:
+        AppConfig.create = classmethod(create)
+
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    report['handler'] = time.perf_counter() - started
+
+    report['warmup'] = warm_up() if warm else {}
+
+    from django.test import RequestFactory
+    report['requests'] = []
+    for _ in range(2):
+        environ = RequestFactory().get(path).environ
+        statuses = []
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(response)
+        response.close()
+        report['requests'].append({'status': statuses[0], 'seconds': time.perf_counter() - started})
+    return report
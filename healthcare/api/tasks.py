@@ -1,26 +1,30 @@
-# from celery import shared_task
-# from django.core.mail import send_mail
-# from .models import Appointment
+from django.conf import settings
+from django.core.mail import send_mail
 
-# @shared_task
-# def send_appointment_confirmation_email(appointment_id):
-#     appointment = Appointment.objects.get(id=appointment_id)
-#     subject = f"Appointment Confirmed: {appointment.date} {appointment.time}"
-#     message = f"Your appointment with Dr. {appointment.doctor.full_name} is confirmed."
-#     recipient = appointment.patient.user.email
-#     send_mail(subject, message, 'from@example.com', [recipient])
+from .jobs import job
+from .models import Appointment, MedicalRecord
 
-# @shared_task
-# def create_medical_record_after_appointment(appointment_id):
-#     appointment = Appointment.objects.get(id=appointment_id)
-#     # Assuming you've already set up a MedicalRecord model as per earlier steps
-#     # Automatically create a medical record after a completed appointment
-#     from records.models import MedicalRecord
-#     MedicalRecord.objects.create(
-#         patient=appointment.patient,
-#         doctor=appointment.doctor,
-#         appointment=appointment,
-#         diagnosis="No diagnosis yet",
-#         prescription="None",
-#         notes="Follow-up in a week"
-#     )
+
+@job
+def send_appointment_confirmation_email(appointment_id):
+    appointment = Appointment.objects.select_related('doctor', 'patient__user').get(id=appointment_id)
+    subject = f"Appointment {appointment.get_status_display()}: {appointment.date} {appointment.time:%H:%M}"
+    message = f"Your appointment with Dr. {appointment.doctor.full_name} is {appointment.status}."
+    recipient = appointment.patient.user.email
+    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+
+@job
+def create_medical_record_after_appointment(appointment_id):
+    appointment = Appointment.objects.get(id=appointment_id)
+    # retried runs find the record the first one created
+    MedicalRecord.objects.get_or_create(
+        appointment=appointment,
+        defaults={
+            'patient_id': appointment.patient_id,
+            'doctor_id': appointment.doctor_id,
+            'diagnosis': "No diagnosis yet",
+            'treatment': "None",
+            'notes': "Follow-up in a week",
+        }
+    )
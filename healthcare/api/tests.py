@@ -1,11 +1,44 @@
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
+from django.test import TransactionTestCase, override_settings
 from rest_framework import status
 from django.urls import reverse
 from .models import *
 from rest_framework.exceptions import NotFound
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
-from datetime import datetime
+from django.conf import settings
+from datetime import datetime, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
+from api.management.commands.stress_booking import create_fixture as create_stress_fixture
+from api.management.commands.bench_async_views import sync_only_middleware
+from .authentication import token_cache
+from .caller import Caller, get_caller
+from .availability_cache import get_or_build
+from django.core.cache import cache
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time as wall_clock
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+from .async_views import AsyncAPIView
+from . import views as sync_views
+from . import urls as api_urls
+from .metrics import MetricsMiddleware, merge, registry
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from .schema import build_schema, clear_schema
+from .startup import warm_up, warm_up_if_enabled
+from .provisioning import provision_profiles
+from .tokens import read_refresh_token, revoke_refresh_token
+import csv
+import json
+import os
+import tempfile
+from django.utils import timezone
 
 class RegisterViewTest(APITestCase):
 
@@ -635,6 +668,34 @@ class AppointmentUpdateViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'Appointment status updated.')
 
+    def test_update_appointment_invalid_status(self):
+        """
+        Test that the appointment update rejects a status outside the choices
+        """
+        self.client.login(email='doctor@example.com', password='password123')
+
+        response = self.client.put(self.url, {'status': 'postponed'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'pending')
+
+    def test_reactivate_rebooked_appointment(self):
+        """
+        Test that reactivating a cancelled appointment whose slot was booked again is a conflict
+        """
+        self.client.login(email='doctor@example.com', password='password123')
+        response = self.client.put(self.url, {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        other = Patient.objects.create(user=create_user('rebooking@example.com', 'patient'), full_name='Rebooking Patient')
+        Appointment.objects.create(patient=other, doctor=self.doctor_profile, date="2025-04-10", time="10:00:00")
+
+        response = self.client.put(self.url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'cancelled')
+
     def test_update_appointment_status_without_status(self):
         """
         Test that the appointment update fails if no status is provided
@@ -821,4 +882,2332 @@ class MedicalRecordViewTest(APITestCase):
         response = self.client.delete(reverse('medical-record-detail', args=[self.medical_records.id]))
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(response.data['error'], 'You do not have permission to delete this record.')
\ No newline at end of file
+        self.assertEqual(response.data['error'], 'You do not have permission to delete this record.')
+
+def create_user(email, role):
+    """Create a user with the given role and no profile, so tests can attach their own."""
+    return get_user_model().objects.create_user(email=email, username=email.split('@')[0], role=role)
+
+
+class DoctorAvailabilitySearchViewTest(APITestCase):
+
+    def setUp(self):
+        schedule = {
+            'Monday': {'start': '09:00', 'end': '12:00'},
+            'Wednesday': {'start': '13:00', 'end': '15:30'},
+        }
+        self.cardiologists = []
+        for index in range(2):
+            user = create_user(f'cardio{index}@example.com', 'doctor')
+            self.cardiologists.append(Doctor.objects.create(
+                user=user, full_name=f'Cardio {index}', specialization='Cardiology', available_days=schedule
+            ))
+        other_user = create_user('derm@example.com', 'doctor')
+        self.dermatologist = Doctor.objects.create(
+            user=other_user, full_name='Derm', specialization='Dermatology', available_days=schedule
+        )
+
+        patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=patient_user, full_name='Test Patient')
+        self.client.force_authenticate(user=patient_user)
+
+        # 2025-04-14 is a Monday, 2025-04-16 a Wednesday
+        Appointment.objects.create(patient=self.patient, doctor=self.cardiologists[0], date='2025-04-14', time='09:30')
+        Appointment.objects.create(patient=self.patient, doctor=self.cardiologists[1], date='2025-04-16', time='13:00')
+
+        self.url = reverse('doctor-availability-search')
+
+    def test_search_by_specialization_matches_per_day_endpoint(self):
+        """
+        Test that every doctor-day in the search agrees with the per-day availability endpoint
+        """
+        response = self.client.get(self.url, {
+            'start_date': '2025-04-14', 'end_date': '2025-04-20', 'specialization': 'cardiology'
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['doctor_id'] for doctor in response.data['doctors']], [d.id for d in self.cardiologists])
+
+        for doctor in response.data['doctors']:
+            self.assertEqual(len(doctor['days']), 7)
+            for day in doctor['days']:
+                single = self.client.get(
+                    reverse('doctor-availability', args=[doctor['doctor_id']]), {'date': day['date']}
+                )
+                if 'time_slots' in single.data:
+                    self.assertEqual(day['time_slots'], single.data['time_slots'])
+                else:
+                    self.assertFalse(day['available'])
+                    self.assertEqual(day['message'], single.data['message'])
+
+    def test_search_by_doctor_ids(self):
+        """
+        Test searching an explicit list of doctors and that booked slots are reported
+        """
+        response = self.client.get(self.url, {
+            'start_date': '2025-04-14', 'doctor_ids': f'{self.cardiologists[0].id},{self.dermatologist.id}'
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        doctors = {doctor['doctor_id']: doctor for doctor in response.data['doctors']}
+        self.assertEqual(set(doctors), {self.cardiologists[0].id, self.dermatologist.id})
+
+        slots = doctors[self.cardiologists[0].id]['days'][0]['time_slots']
+        self.assertEqual(len(slots), 6)
+        self.assertEqual([slot['time'] for slot in slots if not slot['available']], ['09:30'])
+
+    def test_search_uses_constant_queries(self):
+        """
+        Test that the search runs one doctor query and one slot index query regardless of range size
+        """
+        params = {'start_date': '2025-04-01', 'end_date': '2025-04-30', 'specialization': 'Cardiology'}
+        self.client.get(self.url, params)  # builds the slot index
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_search_by_specialization_is_paged(self):
+        """
+        Test that a specialization search returns the doctors a page at a time, matching spelling variants
+        """
+        Doctor.objects.filter(pk=self.cardiologists[1].pk).update(specialization='cardiology.', search_specialization='cardiology')
+        with mock.patch('api.pagination.DoctorAvailabilityPagination.page_size', 1):
+            response = self.client.get(self.url, {'start_date': '2025-04-14', 'specialization': 'Cardiology'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([doctor['doctor_id'] for doctor in response.data['doctors']], [self.cardiologists[0].id])
+            self.assertIsNone(response.data['previous'])
+
+            response = self.client.get(response.data['next'])
+            self.assertEqual([doctor['doctor_id'] for doctor in response.data['doctors']], [self.cardiologists[1].id])
+            self.assertIsNone(response.data['next'])
+
+    def test_search_invalid_parameters(self):
+        """
+        Test that missing or malformed search parameters are rejected
+        """
+        response = self.client.get(self.url, {'specialization': 'Cardiology'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {'start_date': '2025-04-14'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {'start_date': '2025-04-14', 'end_date': '2025-06-14', 'specialization': 'Cardiology'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {'start_date': '2025-04-14', 'doctor_ids': 'a,b'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class DoctorSlotIndexTest(APITestCase):
+
+    def setUp(self):
+        self.doctor_user = create_user('doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Slot', specialization='General Practitioner',
+            available_days={'Monday': {'start': '09:00', 'end': '11:00'}}
+        )
+        self.patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Test Patient')
+
+        # 2025-04-14 is a Monday
+        self.date = datetime(2025, 4, 14).date()
+        self.url = reverse('doctor-availability', args=[self.doctor.id])
+
+    def booked_times(self):
+        slot = DoctorSlot.objects.get(doctor=self.doctor, date=self.date)
+        return [time.strftime('%H:%M') for time, available in slot.time_slots() if not available]
+
+    def test_booking_updates_index(self):
+        """
+        Test that creating an appointment sets its slot in the index
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:30')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='10:30:00')
+
+        self.assertEqual(self.booked_times(), ['09:30', '10:30'])
+
+    def test_booking_endpoint_checks_working_hours(self):
+        """
+        Test that bookings are checked against the indexed working hours
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        url = reverse('appointments')
+
+        response = self.client.post(url, {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.booked_times(), ['10:00'])
+
+        response = self.client.post(url, {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '11:00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "Time selected is outside of doctor's working hours.")
+
+        response = self.client.post(url, {'doctor': self.doctor.id, 'date': '2025-04-15', 'time': '10:00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Doctor is not available on Tuesday.')
+
+    def test_cancel_and_delete_free_slot(self):
+        """
+        Test that cancelling or deleting an appointment frees its slot, and a cancelled slot can be rebooked
+        """
+        first = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        second = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:30')
+
+        self.client.force_authenticate(user=self.doctor_user)
+        response = self.client.put(reverse('appointment-update', args=[first.id]), {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.booked_times(), ['09:30'])
+
+        response = self.client.delete(reverse('appointment-update', args=[second.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.booked_times(), [])
+
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        self.assertEqual(self.booked_times(), ['09:00'])
+
+    def test_schedule_change_resets_index(self):
+        """
+        Test that changing the schedule through the profile endpoint is reflected in the index
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        self.client.force_authenticate(user=self.doctor_user)
+        self.client.get(self.url, {'date': '2025-04-14'})
+
+        response = self.client.put(reverse('doctor-profile'), {
+            'available_days': {'Monday': {'start': '08:00', 'end': '09:30'}}
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(DoctorSlot.objects.filter(doctor=self.doctor).exists())
+
+        response = self.client.get(self.url, {'date': '2025-04-14'})
+        self.assertEqual(response.data['time_slots'], [
+            {'time': '08:00', 'available': True},
+            {'time': '08:30', 'available': True},
+            {'time': '09:00', 'available': False},
+        ])
+
+    def test_availability_reads_index(self):
+        """
+        Test that a warm availability lookup is a doctor read plus one index read
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        self.client.get(self.url, {'date': '2025-04-14'})
+        # drop the cached response, only the index should stay warm
+        cache.clear()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'date': '2025-04-14'})
+        self.assertEqual(len(response.data['time_slots']), 4)
+
+    def test_rebuild_command(self):
+        """
+        Test that the rebuild command recreates the index from appointments, from today on
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='10:00')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='10:30', status='cancelled')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-07', time='10:00')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-05-12', time='10:00')
+        DoctorSlot.objects.filter(doctor=self.doctor).update(booked_mask=0)
+
+        with mock.patch('django.utils.timezone.localdate', return_value=self.date):
+            call_command('rebuild_slot_index', days=7, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(self.booked_times(), ['10:00'])
+        # the 7 upcoming days and the later booking, not the past one
+        self.assertEqual(DoctorSlot.objects.filter(doctor=self.doctor).count(), 8)
+        self.assertFalse(DoctorSlot.objects.filter(doctor=self.doctor, date='2025-04-07').exists())
+
+    def test_rebuild_command_skips_malformed_days_only(self):
+        """
+        Test that a malformed schedule day is reported as skipped, while other errors are raised
+        """
+        Doctor.objects.filter(pk=self.doctor.pk).update(available_days={'Monday': {'start': '9am'}}, schedule=None)
+        output = StringIO()
+        with mock.patch('django.utils.timezone.localdate', return_value=self.date):
+            call_command('rebuild_slot_index', days=7, stdout=output)
+        self.assertIn('Skipped 1 doctor-days', output.getvalue())
+
+        with mock.patch('api.management.commands.rebuild_slot_index.build_slot', side_effect=RuntimeError('bug')):
+            with self.assertRaises(RuntimeError):
+                call_command('rebuild_slot_index', days=7, stdout=StringIO())
+
+
+class CursorPaginationTest(APITestCase):
+
+    def setUp(self):
+        self.doctor_user = create_user('doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(user=self.doctor_user, full_name='Dr. Page', specialization='General Practitioner')
+        self.patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Test Patient')
+
+        # several appointments share a date so the time and id tie-breakers are exercised
+        for day in range(1, 6):
+            for hour in (9, 11, 10, 14, 13):
+                Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=f'2025-05-{day:02d}', time=f'{hour}:00')
+
+        for index in range(23):
+            MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis=f'Diagnosis {index}')
+        # identical timestamps must still page in id order
+        MedicalRecord.objects.filter(diagnosis__in=['Diagnosis 3', 'Diagnosis 4', 'Diagnosis 5']).update(
+            created_at=MedicalRecord.objects.get(diagnosis='Diagnosis 3').created_at
+        )
+
+    def walk(self, url, params=None):
+        pages = []
+        response = self.client.get(url, params or {})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_appointments_page_in_date_time_id_order(self):
+        """
+        Test that walking the appointment cursor returns every appointment once, in (date, time, id) order
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        pages = self.walk(reverse('appointments'), {'page_size': 10})
+
+        self.assertEqual([len(page['appointments']) for page in pages], [10, 10, 5])
+        self.assertIsNone(pages[0]['previous'])
+        ids = [appointment['id'] for page in pages for appointment in page['appointments']]
+        expected = list(Appointment.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+        # walking back from the last page returns the previous page
+        previous = self.client.get(pages[-1]['previous'])
+        self.assertEqual(
+            [appointment['id'] for appointment in previous.data['appointments']],
+            [appointment['id'] for appointment in pages[1]['appointments']]
+        )
+
+    def test_medical_records_page_in_created_at_id_order(self):
+        """
+        Test that walking the medical record cursor returns every record once, in (created_at, id) order
+        """
+        self.client.force_authenticate(user=self.doctor_user)
+        pages = self.walk(reverse('medical-records'))
+
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 3])
+        ids = [record['id'] for page in pages for record in page['results']]
+        expected = list(MedicalRecord.objects.order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_pages_never_count(self):
+        """
+        Test that a deep page is a single range query without a COUNT
+        """
+        self.client.force_authenticate(user=self.doctor_user)
+        first = self.client.get(reverse('medical-records'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(first.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        """
+        Test that a tampered cursor is rejected
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('appointments'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ListQueryBudgetTest(APITestCase):
+    """
+    Every list endpoint must cost a fixed number of queries, however many rows it returns.
+    """
+
+    def setUp(self):
+        self.doctor_user = create_user('doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Budget', specialization='General Practitioner',
+            available_days={'Monday': {'start': '08:00', 'end': '17:00'}}
+        )
+        self.patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Test Patient')
+        self.admin_user = create_user('admin@example.com', 'admin')
+        self.admin_user.is_superuser = True
+
+        start = datetime(2025, 1, 1).date()
+        Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, doctor=self.doctor, date=start + timedelta(days=index // 10), time=f'{8 + index % 10}:00')
+            for index in range(500)
+        ])
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient=self.patient, doctor=self.doctor, diagnosis=f'Diagnosis {index}')
+            for index in range(500)
+        ])
+
+    def assertMaxQueries(self, limit, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), limit, '\n'.join(query['sql'] for query in queries.captured_queries))
+        return response
+
+    def test_appointments_budget(self):
+        """
+        Test that a page of 100 expanded appointments costs a fixed handful of queries
+        """
+        for user in (self.patient_user, self.doctor_user):
+            self.client.force_authenticate(user=user)
+            response = self.assertMaxQueries(3, reverse('appointments'), {'page_size': 100, 'expand': 'doctor,patient'})
+
+            appointment = response.data['appointments'][0]
+            self.assertEqual(len(response.data['appointments']), 100)
+            self.assertEqual(appointment['doctor'], {'id': self.doctor.id, 'full_name': 'Dr. Budget', 'specialization': 'General Practitioner'})
+            self.assertEqual(appointment['patient'], {'id': self.patient.id, 'full_name': 'Test Patient'})
+
+    def test_appointments_without_expand_keep_ids(self):
+        """
+        Test that related ids are returned unless an expansion is requested
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('appointments'))
+
+        self.assertEqual(response.data['appointments'][0]['doctor'], self.doctor.id)
+        self.assertEqual(response.data['appointments'][0]['patient'], self.patient.id)
+
+    def test_medical_records_budget(self):
+        """
+        Test that a page of 100 expanded records costs a fixed handful of queries for every role
+        """
+        for user in (self.patient_user, self.doctor_user, self.admin_user):
+            self.client.force_authenticate(user=user)
+            response = self.assertMaxQueries(3, reverse('medical-records'), {'page_size': 100, 'expand': 'doctor,patient'})
+            self.assertEqual(len(response.data['results']), 100)
+            self.assertEqual(response.data['results'][0]['doctor']['full_name'], 'Dr. Budget')
+
+    def test_availability_budget(self):
+        """
+        Test that availability lookups stay within a fixed budget on a warm slot index
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        url = reverse('doctor-availability', args=[self.doctor.id])
+        self.client.get(url, {'date': '2025-01-06'})
+        self.assertMaxQueries(2, url, {'date': '2025-01-06'})
+
+        url = reverse('doctor-availability-search')
+        params = {'start_date': '2025-01-01', 'end_date': '2025-01-31', 'doctor_ids': str(self.doctor.id)}
+        self.client.get(url, params)
+        self.assertMaxQueries(2, url, params)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class QueryPlanTest(APITestCase):
+    """
+    Every query the list, availability and booking views run against appointments
+    and medical records must be served by an index rather than a full table scan.
+    """
+    tables = ('api_appointment', 'api_medicalrecord')
+
+    def setUp(self):
+        self.doctor_user = create_user('doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Plan', specialization='General Practitioner',
+            available_days={'Monday': {'start': '08:00', 'end': '17:00'}}
+        )
+        self.patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Test Patient')
+        self.admin_user = create_user('admin@example.com', 'admin')
+        self.admin_user.is_superuser = True
+
+        start = datetime(2025, 1, 6).date()
+        Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, doctor=self.doctor, date=start + timedelta(weeks=index // 10), time=f'{8 + index % 10}:00')
+            for index in range(50)
+        ])
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient=self.patient, doctor=self.doctor, diagnosis=f'Diagnosis {index}')
+            for index in range(50)
+        ])
+
+    def assertIndexedQueries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {}, format='json')
+            self.assertLess(response.status_code, 500)
+            next_page = response.data.get('next') if isinstance(response.data, dict) else None
+            if next_page:
+                self.client.get(next_page)
+
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(table in sql for table in self.tables):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                full_scan = step.startswith('SCAN') and 'INDEX' not in step and step != 'SCAN CONSTANT ROW'
+                self.assertFalse(full_scan, f'Full table scan in:\n{sql}\n{plan}')
+
+    def test_appointment_queries_use_indexes(self):
+        """
+        Test the appointment listing, availability and booking queries for each role
+        """
+        for user in (self.patient_user, self.doctor_user):
+            self.client.force_authenticate(user=user)
+            self.assertIndexedQueries('get', reverse('appointments'), {'expand': 'doctor,patient'})
+            self.assertIndexedQueries('get', reverse('doctor-availability', args=[self.doctor.id]), {'date': '2025-02-03'})
+            self.assertIndexedQueries('get', reverse('doctor-availability', args=[self.doctor.id]), {'date': '2025-02-10', 'time': '08:15'})
+            self.assertIndexedQueries('get', reverse('doctor-availability-search'), {
+                'start_date': '2025-02-01', 'end_date': '2025-02-28', 'doctor_ids': str(self.doctor.id)
+            })
+            self.assertIndexedQueries('get', reverse('doctor-availability-search'), {
+                'start_date': '2025-02-01', 'end_date': '2025-02-28', 'specialization': self.doctor.specialization
+            })
+
+        self.client.force_authenticate(user=self.patient_user)
+        self.assertIndexedQueries('post', reverse('appointments'), {'doctor': self.doctor.id, 'date': '2025-06-02', 'time': '09:00'})
+
+    def test_medical_record_queries_use_indexes(self):
+        """
+        Test the medical record listing queries for each role
+        """
+        for user in (self.patient_user, self.doctor_user, self.admin_user):
+            self.client.force_authenticate(user=user)
+            self.assertIndexedQueries('get', reverse('medical-records'), {'expand': 'doctor,patient'})
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    """
+    Bookings racing for the same slot must resolve to one 201 and 409s, never a 500.
+    """
+    client_class = APIClient
+
+    def test_simultaneous_bookings_single_winner(self):
+        """
+        Test that simultaneous bookings from several threads produce exactly one appointment
+        """
+        output = StringIO()
+        call_command('stress_booking', requests=8, rounds=2, stdout=output)
+
+        self.assertIn('exactly one succeeded', output.getvalue())
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_simultaneous_bookings_from_processes(self):
+        """
+        Test that simultaneous bookings from several processes on the file-backed database produce exactly one appointment
+        """
+        output = StringIO()
+        call_command('stress_booking', requests=4, mode='process', stdout=output)
+
+        self.assertIn('exactly one succeeded', output.getvalue())
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_booking_conflict_returns_409(self):
+        """
+        Test that a booking losing on the unique constraint maps to 409 instead of a 500
+        """
+        doctor, users = create_stress_fixture(2)
+        self.client.force_authenticate(user=users[1])
+        payload = {'doctor': doctor.id, 'date': '2025-04-14', 'time': '09:00'}
+
+        self.assertEqual(self.client.post(reverse('appointments'), payload, format='json').status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(user=users[2])
+        response = self.client.post(reverse('appointments'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['message'], 'This slot is already booked.')
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class AppointmentSeriesViewTest(APITestCase):
+
+    def setUp(self):
+        self.doctor_user = create_user('doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Series', specialization='Physiotherapy',
+            available_days={'Monday': {'start': '09:00', 'end': '12:00'}}
+        )
+        self.patient_user = create_user('patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Test Patient')
+        self.client.force_authenticate(user=self.patient_user)
+        self.url = reverse('appointment-series')
+
+    def test_book_weekly_series(self):
+        """
+        Test that a weekly series books every occurrence and marks each in the slot index
+        """
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly', 'count': 4, 'reason': 'Physio'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([occurrence['date'] for occurrence in response.data['occurrences']], [
+            datetime(2025, 4, 14).date(), datetime(2025, 4, 21).date(), datetime(2025, 4, 28).date(), datetime(2025, 5, 5).date()
+        ])
+        self.assertEqual(Appointment.objects.filter(patient=self.patient, reason='Physio').count(), 4)
+
+        for slot in DoctorSlot.objects.filter(doctor=self.doctor):
+            self.assertEqual([time.strftime('%H:%M') for time, available in slot.time_slots() if not available], ['10:00'])
+
+    def test_series_queues_confirmations(self):
+        """
+        Test that a booked series queues one confirmation email job per appointment, and a rejected one none
+        """
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly', 'count': 3
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        jobs = Job.objects.order_by('id')
+        self.assertEqual({job.name for job in jobs}, {'send_appointment_confirmation_email'})
+        self.assertEqual(
+            [job.payload['args'] for job in jobs],
+            [[occurrence['appointment']['id']] for occurrence in response.data['occurrences']]
+        )
+
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly', 'count': 3
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_book_biweekly_series_until(self):
+        """
+        Test that a biweekly series ending on a date books every other week up to it
+        """
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '09:30', 'frequency': 'biweekly', 'until': '2025-05-25'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['occurrences']), 3)
+
+    def test_series_with_conflict_books_nothing(self):
+        """
+        Test that one conflicting occurrence rejects the whole series with per-occurrence results
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-21', time='10:00')
+
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly', 'count': 3
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([occurrence.get('message') for occurrence in response.data['occurrences']], [
+            None, 'This slot is already booked.', None
+        ])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_series_outside_schedule(self):
+        """
+        Test that occurrences outside the doctor's schedule are rejected
+        """
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-15', 'time': '10:00', 'frequency': 'weekly', 'count': 2
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['occurrences'][0]['message'], 'Doctor is not available on Tuesday.')
+
+        response = self.client.post(self.url, {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '12:00', 'frequency': 'weekly', 'count': 2
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_series_invalid_recurrence(self):
+        """
+        Test that a series needs exactly one of count or until, within the occurrence cap
+        """
+        base = {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly'}
+        for extra in ({}, {'count': 2, 'until': '2025-05-01'}, {'count': 53}, {'until': '2027-01-01'}, {'until': '2025-04-01'}):
+            response = self.client.post(self.url, {**base, **extra}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, extra)
+
+    def test_series_query_count_is_constant(self):
+        """
+        Test that booking a series costs the same number of queries whatever its length
+        """
+        counts = []
+        for time, count in (('09:00', 2), ('11:00', 20)):
+            # a fresh user each time, the first request caches its profiles
+            self.client.force_authenticate(user=get_user_model().objects.get(pk=self.patient_user.pk))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {
+                    'doctor': self.doctor.id, 'date': '2025-04-14', 'time': time, 'frequency': 'weekly', 'count': count
+                }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user('cached@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.user, full_name='Cached Patient')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('appointments')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_cache_hit_skips_token_lookup(self):
+        """
+        Test that a repeated request with the same token doesn't query the token or user tables
+        """
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        auth_queries = [query['sql'] for query in queries if 'authtoken_token' in query['sql']]
+        self.assertEqual(auth_queries, [])
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_invalid_token(self):
+        """
+        Test that an unknown token is rejected and never cached
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-token')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_logout_invalidates_token(self):
+        """
+        Test that a token stops working right after logout even though it was cached
+        """
+        self.client.get(self.url)
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(token_cache.stats()['size'], 0)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivation_invalidates_token(self):
+        """
+        Test that deactivating a user drops their cached token
+        """
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(token_cache.stats()['size'], 0)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cached_user_is_fresh_per_request(self):
+        """
+        Test that cache hits rebuild the user rather than sharing one instance
+        """
+        self.client.get(self.url)
+        first = token_cache.get(self.token.key)
+        second = token_cache.get(self.token.key)
+        self.assertEqual(first.pk, self.user.pk)
+        self.assertEqual(first.role, 'patient')
+        self.assertIsNot(first, second)
+
+    def test_lru_and_ttl_eviction(self):
+        """
+        Test that the cache stays within its size bound and drops expired entries
+        """
+        from .authentication import TokenCache
+
+        cache = TokenCache(max_size=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, self.user)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache = TokenCache(max_size=2, ttl=0)
+        cache.set('a', self.user)
+        self.assertIsNone(cache.get('a'))
+
+    def test_stats_endpoint_requires_admin(self):
+        """
+        Test that only admins can read the cache counters
+        """
+        url = reverse('token-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = create_user('cache-admin@example.com', 'admin')
+        self.client.credentials()
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'size', 'max_size', 'ttl', 'hits', 'misses', 'evictions'})
+
+
+class CallerResolutionTest(APITestCase):
+    def setUp(self):
+        self.doctor_user = create_user('caller-doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Caller', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '12:00'}}
+        )
+        self.other_doctor_user = create_user('caller-other@example.com', 'doctor')
+        self.other_doctor = Doctor.objects.create(user=self.other_doctor_user, full_name='Dr. Other', specialization='General')
+        self.patient_user = create_user('caller-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Caller Patient')
+        self.other_patient_user = create_user('caller-other-patient@example.com', 'patient')
+        Patient.objects.create(user=self.other_patient_user, full_name='Other Patient')
+
+        self.appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='10:00')
+        self.url = reverse('appointment-update', args=[self.appointment.id])
+
+    def fresh(self, user):
+        return get_user_model().objects.get(pk=user.pk)
+
+    def test_profiles_resolved_with_one_query(self):
+        """
+        Test that both profiles are resolved with a single query and cached on the user
+        """
+        request = type('Request', (), {'user': self.fresh(self.patient_user)})()
+        with CaptureQueriesContext(connection) as queries:
+            caller = get_caller(request)
+            self.assertEqual(caller.patient, self.patient)
+            self.assertIsNone(caller.doctor)
+            self.assertTrue(hasattr(request.user, 'patient_profile'))
+            self.assertFalse(hasattr(request.user, 'doctor_profile'))
+            self.assertIs(get_caller(request), caller)
+        self.assertEqual(len(queries), 1)
+
+    def test_role_checks_do_not_query(self):
+        """
+        Test that role-only permissions don't need the profiles
+        """
+        request = type('Request', (), {'user': self.fresh(self.doctor_user)})()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_caller(request).role, 'doctor')
+        self.assertEqual(len(queries), 0)
+
+    def test_delete_appointment_owner_only(self):
+        """
+        Test that only the appointment's doctor or patient can delete it
+        """
+        for user in (self.other_doctor_user, self.other_patient_user):
+            self.client.force_authenticate(user=self.fresh(user))
+            response = self.client.delete(self.url)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(response.data['error'], 'You do not have permission to delete this appointment.')
+
+        self.client.force_authenticate(user=self.fresh(self.patient_user))
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_delete_appointment_resolves_profiles_once(self):
+        """
+        Test that a delete resolves the caller's profiles with one query however many checks run
+        """
+        self.client.force_authenticate(user=self.fresh(self.other_patient_user))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(self.url)
+        profile_queries = [query['sql'] for query in queries if 'api_patient' in query['sql'] or 'api_doctor"' in query['sql']]
+        self.assertEqual(len(profile_queries), 1)
+
+    def test_profile_views_use_caller(self):
+        """
+        Test that the profile views read the profile from the caller and 404 when it's missing
+        """
+        self.client.force_authenticate(user=self.fresh(self.doctor_user))
+        response = self.client.get(reverse('doctor-profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['full_name'], 'Dr. Caller')
+
+        self.client.force_authenticate(user=self.fresh(create_user('caller-new@example.com', 'patient')))
+        response = self.client.get(reverse('patient-profile'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AvailabilityCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor_user = create_user('cache-doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Cache', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '11:00'}}
+        )
+        self.patient_user = create_user('cache-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Cache Patient')
+        self.client.force_authenticate(user=self.patient_user)
+        self.url = reverse('doctor-availability', args=[self.doctor.id])
+
+    def test_repeat_request_served_from_cache(self):
+        """
+        Test that a repeated availability request doesn't touch the database
+        """
+        first = self.client.get(self.url, {'date': '2025-04-14'})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, {'date': '2025-04-14'})
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_versions_expire(self):
+        """
+        Test that availability versions, made for any doctor id asked about, are stored with a finite timeout
+        """
+        from .availability_cache import TIMEOUT, VERSION_TIMEOUT
+
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            self.client.get(reverse('doctor-availability', args=[999999]), {'date': '2025-04-14'})
+        self.assertEqual(add.call_args_list[0].kwargs['timeout'], VERSION_TIMEOUT)
+        self.assertGreaterEqual(VERSION_TIMEOUT, TIMEOUT)
+
+    def test_booking_and_cancellation_invalidate(self):
+        """
+        Test that booking and cancelling change the cached availability
+        """
+        self.client.get(self.url, {'date': '2025-04-14', 'time': '09:30'})
+
+        response = self.client.post(reverse('appointments'), {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '09:30'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(self.client.get(self.url, {'date': '2025-04-14', 'time': '09:30'}).data['available'])
+
+        appointment = Appointment.objects.get(id=response.data['appointment']['id'])
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertTrue(self.client.get(self.url, {'date': '2025-04-14', 'time': '09:30'}).data['available'])
+
+    def test_series_booking_invalidates(self):
+        """
+        Test that bulk-created series bookings invalidate the cached availability too
+        """
+        self.client.get(self.url, {'date': '2025-04-21', 'time': '10:00'})
+        response = self.client.post(reverse('appointment-series'), {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00', 'frequency': 'weekly', 'count': 2
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(self.client.get(self.url, {'date': '2025-04-21', 'time': '10:00'}).data['available'])
+
+    def test_schedule_change_invalidates(self):
+        """
+        Test that a doctor profile update changes the cached availability
+        """
+        self.client.get(self.url, {'date': '2025-04-14'})
+        self.doctor.available_days = {'Monday': {'start': '09:00', 'end': '10:00'}}
+        self.doctor.save()
+
+        response = self.client.get(self.url, {'date': '2025-04-14'})
+        self.assertEqual([slot['time'] for slot in response.data['time_slots']], ['09:00', '09:30'])
+
+    def test_conditional_get(self):
+        """
+        Test that a matching If-None-Match gets a 304 until the doctor's appointments change
+        """
+        etag = self.client.get(self.url, {'date': '2025-04-14'})['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'date': '2025-04-14'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+
+        response = self.client.get(self.url, {'date': '2025-04-15'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        response = self.client.get(self.url, {'date': '2025-04-14'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_errors_carry_no_etag(self):
+        """
+        Test that error responses are not marked cacheable
+        """
+        response = self.client.get(reverse('doctor-availability', args=[9999]), {'date': '2025-04-14'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+    def test_single_flight(self):
+        """
+        Test that concurrent misses for the same key build the value once
+        """
+        builds = []
+
+        def build():
+            builds.append(1)
+            sleep(0.2)
+            return 'value'
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: get_or_build('single-flight-test', build), range(8)))
+
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(builds), 1)
+
+
+@override_settings(ROOT_URLCONF='healthcare.asgi_urls')
+class AsyncReadViewTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor_user = create_user('async-doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Async', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '11:00'}}
+        )
+        self.patient_user = create_user('async-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Async Patient')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:30')
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis='Flu', treatment='Rest')
+
+    def compare(self, sync_view, path, params, user, **kwargs):
+        """Call the sync view directly and the mounted async view through the client."""
+        request = APIRequestFactory().get(path, params)
+        force_authenticate(request, user=get_user_model().objects.get(pk=user.pk))
+        expected = sync_view.as_view()(request, **kwargs)
+
+        cache.clear()
+        self.client.force_authenticate(user=get_user_model().objects.get(pk=user.pk))
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.data)
+        return response
+
+    def test_read_paths_are_async(self):
+        """
+        Test that the read endpoints are served by async views
+        """
+        for name, kwargs in (
+            ('appointments', {}), ('doctor-availability', {'doctor_id': self.doctor.id}),
+            ('doctor-availability-search', {}), ('medical-records', {}),
+            ('patient-profile', {}), ('doctor-profile', {}),
+        ):
+            view_class = resolve(reverse(name, kwargs=kwargs)).func.view_class
+            self.assertTrue(issubclass(view_class, AsyncAPIView), name)
+            self.assertTrue(view_class.view_is_async, name)
+
+    def test_wsgi_keeps_sync_views(self):
+        """
+        Test that outside of ASGI the read endpoints keep their sync views and the other routes are shared
+        """
+        with override_settings(ROOT_URLCONF='healthcare.urls'):
+            view_class = resolve(reverse('appointments')).func.view_class
+            self.assertIs(view_class, sync_views.AppointmentView)
+            self.assertFalse(view_class.view_is_async)
+        self.assertIs(resolve(reverse('appointment-series')).func.view_class, sync_views.AppointmentSeriesView)
+
+    def test_async_matches_sync(self):
+        """
+        Test that the async read views return what the sync ones do
+        """
+        self.compare(sync_views.AppointmentView, reverse('appointments'), {'expand': 'doctor'}, self.patient_user)
+        self.compare(sync_views.MedicalRecordListCreateView, reverse('medical-records'), {}, self.doctor_user)
+        self.compare(sync_views.PatientProfileView, reverse('patient-profile'), {}, self.patient_user)
+        self.compare(sync_views.DoctorProfileView, reverse('doctor-profile'), {}, self.doctor_user)
+        self.compare(
+            sync_views.DoctorAvailabilityView, reverse('doctor-availability', args=[self.doctor.id]),
+            {'date': '2025-04-14'}, self.patient_user, doctor_id=self.doctor.id
+        )
+        self.compare(
+            sync_views.DoctorAvailabilityView, reverse('doctor-availability', args=[self.doctor.id]),
+            {'date': '2025-04-14', 'time': '09:45'}, self.patient_user, doctor_id=self.doctor.id
+        )
+        for params in ({'start_date': '2025-04-14', 'end_date': '2025-04-21', 'doctor_ids': str(self.doctor.id)},
+                       {'start_date': '2025-04-14', 'specialization': 'general'}):
+            response = self.compare(sync_views.DoctorAvailabilitySearchView, reverse('doctor-availability-search'), params, self.patient_user)
+            self.assertEqual(len(response.json()['doctors']), 1)
+
+    def test_async_errors_and_writes(self):
+        """
+        Test that permission errors and the sync write handlers still work on async views
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        self.assertEqual(self.client.get(reverse('doctor-profile')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('doctor-availability', args=[9999]), {'date': '2025-04-14'}).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(reverse('appointments'), {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('appointments'), {'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('appointments')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AsyncViewBenchmarkTest(TransactionTestCase):
+    def test_benchmark_command(self):
+        """
+        Test that the benchmark runs every endpoint both ways and cleans up after itself
+        """
+        output = StringIO()
+        call_command('bench_async_views', requests=4, concurrency=2, stdout=output)
+
+        self.assertEqual(output.getvalue().count('req/s'), 12)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_middleware_runs_natively_under_asgi(self):
+        """
+        Test that no middleware pushes ASGI requests through a thread
+        """
+        self.assertEqual(sync_only_middleware(), [])
+
+
+class MedicalRecordExportTest(APITestCase):
+    def setUp(self):
+        self.admin = create_user('export-admin@example.com', 'admin')
+        get_user_model().objects.filter(pk=self.admin.pk).update(is_superuser=True)
+        self.admin.is_superuser = True
+
+        self.doctors = []
+        for index in range(2):
+            user = create_user(f'export-doctor-{index}@example.com', 'doctor')
+            self.doctors.append(Doctor.objects.create(user=user, full_name=f'Dr. Export {index}', specialization='General'))
+        self.patient_user = create_user('export-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Export Patient')
+
+        for day in range(1, 6):
+            record = MedicalRecord.objects.create(
+                patient=self.patient, doctor=self.doctors[day % 2], diagnosis=f'Diagnosis {day}',
+                treatment='Rest, fluids', notes='line one\nline two'
+            )
+            MedicalRecord.objects.filter(pk=record.pk).update(created_at=timezone.make_aware(datetime(2025, 4, day, 12)))
+
+        self.url = reverse('medical-record-export')
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_requires_superuser(self):
+        """
+        Test that only superusers can export records
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_ndjson_export(self):
+        """
+        Test that the default export streams one JSON object per record with names filled in
+        """
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['diagnosis'] for row in rows], [f'Diagnosis {day}' for day in range(1, 6)])
+        self.assertEqual(rows[0]['doctor_name'], 'Dr. Export 1')
+        self.assertEqual(rows[0]['patient_name'], 'Export Patient')
+        self.assertEqual(rows[0]['notes'], 'line one\nline two')
+
+    def test_csv_export_with_filters(self):
+        """
+        Test the CSV export limited to a date range and a doctor
+        """
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url, {
+            'output': 'csv', 'start_date': '2025-04-02', 'end_date': '2025-04-04', 'doctor_ids': str(self.doctors[0].id)
+        })
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(self.read(response).splitlines(keepends=True)))
+        self.assertEqual([row['diagnosis'] for row in rows], ['Diagnosis 2', 'Diagnosis 4'])
+        self.assertEqual(rows[0]['treatment'], 'Rest, fluids')
+        self.assertEqual(rows[0]['notes'], 'line one\nline two')
+
+    def test_date_range_covers_whole_days_on_the_index(self):
+        """
+        Test that the date range includes the whole end date and filters created_at without a date function
+        """
+        from .export import export_queryset
+
+        late = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctors[0], diagnosis='Late', treatment='None')
+        MedicalRecord.objects.filter(pk=late.pk).update(created_at=timezone.make_aware(datetime(2025, 4, 4, 23, 59)))
+        records = export_queryset(start_date=datetime(2025, 4, 4).date(), end_date=datetime(2025, 4, 4).date())
+
+        self.assertEqual([record.diagnosis for record in records], ['Diagnosis 4', 'Late'])
+        self.assertNotIn('django_datetime_cast_date', str(records.query))
+
+    def test_invalid_parameters(self):
+        """
+        Test that bad formats, dates and doctor ids are rejected
+        """
+        self.client.force_authenticate(user=self.admin)
+        for params in ({'output': 'xml'}, {'start_date': '04/01/2025'}, {'doctor_ids': 'a,b'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_export_is_lazy_and_chunked(self):
+        """
+        Test that records are only queried while the response is consumed, a chunk at a time
+        """
+        from .export import export_queryset, stream_records
+
+        self.client.force_authenticate(user=self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertFalse(any('api_medicalrecord' in query['sql'] for query in queries))
+
+        lines = stream_records(export_queryset(), 'ndjson', chunk_size=2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(list(lines)), 5)
+        record_queries = [query['sql'] for query in queries if 'api_medicalrecord' in query['sql']]
+        self.assertEqual(len(record_queries), 1)
+        self.assertIn('INNER JOIN', record_queries[0])
+        self.read(response)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        """
+        Test that under ASGI the export is served from an async iterator
+        """
+        await self.async_client.aforce_login(self.admin)
+
+        response = await self.async_client.get(self.url, {'output': 'csv'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(list(csv.DictReader(content.splitlines(keepends=True)))), 5)
+
+    def test_export_command(self):
+        """
+        Test that the management command writes the filtered export to a file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records.csv')
+            errors = StringIO()
+            call_command('export_medical_records', output_format='csv', output=path, doctor_ids=[self.doctors[1].id], stderr=errors)
+
+            with open(path, newline='', encoding='utf-8') as exported:
+                rows = list(csv.DictReader(exported))
+        self.assertEqual([row['diagnosis'] for row in rows], ['Diagnosis 1', 'Diagnosis 3', 'Diagnosis 5'])
+        self.assertIn('Exported 3 records', errors.getvalue())
+
+
+class BulkImportCommandTest(APITestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        output, errors = StringIO(), StringIO()
+        call_command('bulk_import', path, workers=2, stdout=output, stderr=errors, **options)
+        return output.getvalue(), errors.getvalue()
+
+    def test_import_users_csv(self):
+        """
+        Test that users are created with their profiles and hashed passwords
+        """
+        path = self.write('users.csv', (
+            'email,username,password,role,full_name,phone,specialization,available_days\n'
+            'ann@example.com,ann,secret-1,patient,Ann Smith,0700,,\n'
+            'bob@example.com,,secret-2,doctor,Dr. Bob,,Cardiology,"{""Monday"": {""start"": ""09:00"", ""end"": ""12:00""}}"\n'
+            'bad@example.com,bad,x,nurse,,,,\n'
+        ))
+        output, errors = self.run_import(path)
+
+        self.assertIn('2 created', output)
+        self.assertIn('rows/s', output)
+        self.assertIn("unknown role 'nurse'", errors)
+        ann = get_user_model().objects.get(email='ann@example.com')
+        self.assertTrue(ann.check_password('secret-1'))
+        self.assertEqual(ann.patient_profile.phone, '0700')
+        bob = Doctor.objects.get(user__email='bob@example.com')
+        self.assertEqual(bob.user.username, 'bob')
+        self.assertEqual(bob.available_days['Monday']['end'], '12:00')
+
+    def test_duplicates_skip_or_merge(self):
+        """
+        Test that existing emails are skipped or merged into their profiles, and conflicts reported
+        """
+        user = create_user('dup@example.com', 'patient')
+        Patient.objects.create(user=user, full_name='Old Name')
+        path = self.write('users.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'email': 'dup@example.com', 'role': 'patient', 'full_name': 'New Name'},
+            {'email': 'other@example.com', 'username': 'dup', 'role': 'patient'},
+            {'email': 'new@example.com', 'role': 'patient'},
+            {'email': 'new@example.com', 'role': 'patient'},
+        ]))
+
+        output, errors = self.run_import(path)
+        self.assertIn('1 created, 0 merged, 1 skipped, 2 failed', output)
+        self.assertIn("username 'dup' is already taken", errors)
+        self.assertIn('appears twice', errors)
+        self.assertEqual(Patient.objects.get(user=user).full_name, 'Old Name')
+
+        output, errors = self.run_import(path, on_duplicate='merge')
+        self.assertIn('0 created, 2 merged', output)
+        self.assertEqual(Patient.objects.get(user=user).full_name, 'New Name')
+
+    def test_lookups_are_per_batch(self):
+        """
+        Test that duplicate detection costs the same queries however many rows a batch has
+        """
+        counts = []
+        for size in (5, 50):
+            path = self.write(f'users-{size}.jsonl', '\n'.join(
+                json.dumps({'email': f'batch{size}-{index}@example.com', 'role': 'patient'}) for index in range(size)
+            ))
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import(path)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_import_appointments(self):
+        """
+        Test that appointments are imported, taken slots skipped and the slot index kept right
+        """
+        doctor_user = create_user('imp-doctor@example.com', 'doctor')
+        doctor = Doctor.objects.create(
+            user=doctor_user, full_name='Dr. Import', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '11:00'}}
+        )
+        patient = Patient.objects.create(user=create_user('imp-patient@example.com', 'patient'), full_name='Import Patient')
+        Appointment.objects.create(patient=patient, doctor=doctor, date='2025-04-14', time='09:00')
+        DoctorSlot.objects.all().delete()
+        cache.clear()
+
+        path = self.write('appointments.csv', (
+            'patient_email,doctor_email,date,time,reason\n'
+            'imp-patient@example.com,imp-doctor@example.com,2025-04-14,09:00,taken\n'
+            'imp-patient@example.com,imp-doctor@example.com,2025-04-14,09:30,checkup\n'
+            'imp-patient@example.com,nobody@example.com,2025-04-14,10:00,\n'
+            'imp-patient@example.com,imp-doctor@example.com,14/04/2025,10:00,\n'
+        ))
+        output, errors = self.run_import(path, kind='appointments')
+
+        self.assertIn('1 created, 0 merged, 1 skipped, 2 failed', output)
+        self.assertIn('no doctor with email nobody@example.com', errors)
+        self.assertEqual(Appointment.objects.get(time='09:30').reason, 'checkup')
+
+        self.client.force_authenticate(user=doctor_user)
+        response = self.client.get(reverse('doctor-availability', args=[doctor.id]), {'date': '2025-04-14'})
+        self.assertEqual([slot['available'] for slot in response.data['time_slots']], [False, False, True, True])
+
+
+class ProfileProvisioningTest(APITestCase):
+
+    def test_register_creates_profile(self):
+        """
+        Test that registering a patient or a doctor creates the matching profile
+        """
+        for role in ('patient', 'doctor'):
+            response = self.client.post(reverse('register'), {
+                'email': f'prov-{role}@example.com', 'password': 'password123', 'username': f'prov-{role}', 'role': role
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(Patient.objects.get(user__email='prov-patient@example.com').full_name, 'prov-patient')
+        doctor = Doctor.objects.get(user__email='prov-doctor@example.com')
+        self.assertEqual((doctor.specialization, doctor.available_days), ('General', {}))
+
+    def test_admin_has_no_profile(self):
+        """
+        Test that admins are created without a profile
+        """
+        from .provisioning import create_user as provision_user
+        user = provision_user('prov-admin@example.com', 'prov-admin', role='admin')
+        self.assertFalse(Patient.objects.filter(user=user).exists())
+        self.assertFalse(Doctor.objects.filter(user=user).exists())
+
+    def test_bulk_create_users(self):
+        """
+        Test that bulk creation inserts the profiles with one query per role, using the given fields
+        """
+        from .provisioning import bulk_create_users
+        User = get_user_model()
+        users = [User(email=f'bulk{index}@example.com', username=f'bulk{index}', role='patient') for index in range(10)]
+        users += [User(email='bulk-doctor@example.com', username='bulk-doctor', role='doctor')]
+        users += [User(email='bulk-admin@example.com', username='bulk-admin', role='admin')]
+
+        with CaptureQueriesContext(connection) as queries:
+            bulk_create_users(users, profiles=[{}] * 10 + [{'specialization': 'Cardiology'}, {}])
+
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Patient.objects.filter(user__email__startswith='bulk').count(), 10)
+        self.assertEqual(Doctor.objects.get(user__email='bulk-doctor@example.com').specialization, 'Cardiology')
+
+    def test_bulk_create_users_is_atomic(self):
+        """
+        Test that a failing profile insert rolls back the users
+        """
+        from .provisioning import bulk_create_users
+        User = get_user_model()
+        users = [User(email='atomic@example.com', username='atomic', role='patient')]
+        with self.assertRaises(Exception):
+            bulk_create_users(users, profiles=[{'age': 'not a number'}])
+        self.assertFalse(User.objects.filter(email='atomic@example.com').exists())
+
+
+class JobQueueTest(APITestCase):
+
+    def setUp(self):
+        self.doctor_user = create_user('jobs-doctor@example.com', 'doctor')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, full_name='Dr. Jobs', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '12:00'}}
+        )
+        self.patient_user = create_user('jobs-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Jobs Patient')
+
+    def run_due_jobs(self):
+        from .jobs import claim, run
+        return [run(job) for job in claim('test', 100)]
+
+    def test_booking_queues_confirmation_email(self):
+        """
+        Test that booking queues the confirmation email instead of sending it, and the worker sends it
+        """
+        from django.core import mail
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.post(reverse('appointments'), {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '09:00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.get().name, 'send_appointment_confirmation_email')
+
+        self.assertEqual(self.run_due_jobs(), ['done'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['jobs-patient@example.com'])
+
+    def test_completing_appointment_creates_record(self):
+        """
+        Test that completing an appointment queues the follow-up medical record
+        """
+        appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        self.client.force_authenticate(user=self.doctor_user)
+        url = reverse('appointment-update', args=[appointment.id])
+        self.client.put(url, {'status': 'completed'}, format='json')
+        self.client.put(url, {'status': 'completed'}, format='json')
+
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertFalse(MedicalRecord.objects.exists())
+        self.assertEqual(self.run_due_jobs(), ['done'])
+        self.assertEqual(MedicalRecord.objects.get().appointment, appointment)
+
+    def test_claims_do_not_overlap(self):
+        """
+        Test that a claimed job is not handed to another worker until its lease expires
+        """
+        from .jobs import claim, enqueue
+        for index in range(3):
+            enqueue('send_appointment_confirmation_email', [index])
+        first = claim('one', 2)
+        second = claim('two', 2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({job.id for job in first} & {job.id for job in second})
+        self.assertEqual(claim('three', 2), [])
+
+        Job.objects.filter(id=first[0].id).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([job.id for job in claim('three', 2)], [first[0].id])
+
+    def test_retries_with_backoff_then_fails(self):
+        """
+        Test that a failing job is retried later with a growing delay and marked failed after its last attempt
+        """
+        from .jobs import claim, enqueue, run
+        job = enqueue('send_appointment_confirmation_email', [0], max_attempts=2)
+
+        self.assertEqual(self.run_due_jobs(), ['queued'])
+        job.refresh_from_db()
+        self.assertIn('DoesNotExist', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(claim('test', 1), [])
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.assertEqual(self.run_due_jobs(), ['failed'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_stale_worker_cannot_record_outcome(self):
+        """
+        Test that a worker whose claim was taken over does not overwrite the new claim
+        """
+        from .jobs import claim, enqueue, run
+        enqueue('send_appointment_confirmation_email', [0])
+        stale = claim('one')[0]
+        Job.objects.filter(id=stale.id).update(locked_at=timezone.now() - timedelta(hours=1))
+        current = claim('two')[0]
+
+        run(stale)
+        self.assertEqual(Job.objects.get(id=current.id).status, 'running')
+
+
+class JobWorkerCommandTest(TransactionTestCase):
+
+    def test_worker_drains_queue(self):
+        """
+        Test that the worker command runs every due job with a thread pool and exits with --once
+        """
+        from django.core import mail
+        from .jobs import enqueue
+        patient = Patient.objects.create(user=create_user('worker-patient@example.com', 'patient'), full_name='Worker')
+        doctor = Doctor.objects.create(user=create_user('worker-doctor@example.com', 'doctor'), full_name='Dr. Worker', specialization='General')
+        appointments = [
+            Appointment.objects.create(patient=patient, doctor=doctor, date='2025-04-14', time=f'{hour:02}:00')
+            for hour in range(9, 14)
+        ]
+        for appointment in appointments:
+            enqueue('send_appointment_confirmation_email', [appointment.id])
+        enqueue('send_appointment_confirmation_email', [0])
+
+        out = StringIO()
+        call_command('run_jobs', '--once', '--workers', '3', '--poll-interval', '0.05', stdout=out)
+        self.assertIn('5 done, 1 to retry, 0 failed', out.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(Job.objects.filter(status='done').count(), 5)
+
+
+@override_settings(SIGNED_TOKENS={'ENABLED': True, 'ACCESS_TTL': 300, 'REFRESH_TTL': 3600})
+class SignedTokenTest(APITestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='signed@example.com', username='signed', password='password123', role='patient'
+        )
+        self.patient = Patient.objects.create(user=self.user, full_name='Signed Patient')
+        doctor = Doctor.objects.create(
+            user=create_user('signed-doctor@example.com', 'doctor'), full_name='Dr. Signed', specialization='General'
+        )
+        Appointment.objects.create(patient=self.patient, doctor=doctor, date='2025-04-14', time='09:00')
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'email': 'signed@example.com', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_login_skips_session_and_token_rows(self):
+        """
+        Test that signed login returns an access/refresh pair without writing a session or a token
+        """
+        from django.contrib.sessions.models import Session
+        data = self.login()
+        self.assertEqual(set(data), {'access', 'refresh', 'expires_in', 'role'})
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Token.objects.exists())
+
+    def test_access_token_verifies_without_query(self):
+        """
+        Test that a request with an access token authenticates and resolves the caller without a query
+        """
+        from .authentication import SignedTokenAuthentication
+        access = self.login()['access']
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        with self.assertNumQueries(0):
+            user, claims = SignedTokenAuthentication().authenticate(request)
+            caller = Caller(user)
+            self.assertEqual((user.pk, caller.role, caller.patient_id, caller.doctor_id), (self.user.pk, 'patient', self.patient.id, None))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('appointments'))
+        self.assertEqual(len(response.data['appointments']), 1)
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        """
+        Test that a modified or expired access token is refused
+        """
+        access = self.login()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access[:-2]}xx')
+        self.assertEqual(self.client.get(reverse('appointments')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with override_settings(SIGNED_TOKENS={'ENABLED': True, 'ACCESS_TTL': -1}):
+            self.assertEqual(self.client.get(reverse('appointments')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh_rotates_and_logout_revokes(self):
+        """
+        Test that a refresh token can be used once, and not at all after logout
+        """
+        tokens = self.login()
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        again = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(again.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        refresh = response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.post(reverse('logout'), {'refresh': refresh}, format='json').status_code, status.HTTP_200_OK)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_concurrent_refreshes_issue_one_pair(self):
+        """
+        Test that of two refreshes with the same token that both pass the revocation check, only one gets a new pair
+        """
+        refresh = self.login()['refresh']
+
+        def read_then_lose_race(token):
+            # the other request revokes the token right after this one read it
+            claims = read_refresh_token(token)
+            revoke_refresh_token(claims)
+            return claims
+
+        with mock.patch('api.views.read_refresh_token', side_effect=read_then_lose_race):
+            response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('access', response.data)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+    def test_disabled_by_default(self):
+        """
+        Test that bearer tokens are refused and login issues classic tokens while signed tokens are off
+        """
+        access = self.login()['access']
+        with override_settings(SIGNED_TOKENS={'ENABLED': False}):
+            self.assertIn('token', self.login())
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+            self.client.logout()
+            self.assertEqual(self.client.get(reverse('appointments')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SQLiteProfileTest(TransactionTestCase):
+
+    def test_tuned_pragmas_applied(self):
+        """
+        Test that connections open in WAL mode with IMMEDIATE transactions and the busy timeout
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        # ASGI requests never reuse a persistent connection, it would only linger until GC
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
+
+    def test_benchmark_command(self):
+        """
+        Test that the benchmark runs both profiles, cleans up after itself and restores the connection settings
+        """
+        output = StringIO()
+        call_command('bench_sqlite', workers=2, requests=10, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['default', 'tuned'])
+        self.assertFalse(CustomUser.objects.exists())
+        self.assertEqual(connection.settings_dict['OPTIONS'], settings.SQLITE_PROFILES['tuned']['OPTIONS'])
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+
+@override_settings(REPLICA_ROUTING={'ENABLED': True, 'STICKY_SECONDS': 10})
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = Doctor.objects.create(
+            user=create_user('replica-doctor@example.com', 'doctor'), full_name='Dr. Replica', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '11:00'}}
+        )
+        self.patient_user = create_user('replica-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Replica Patient')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-14', time='09:00')
+        self.sync_replica()
+        # written after the last sync, so only the primary has it
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date='2025-04-21', time='09:00')
+
+    def sync_replica(self):
+        from .replicas import copy_sqlite_database
+        copy_sqlite_database('default', 'replica')
+
+    def list_appointments(self):
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('appointments'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [appointment['date'] for appointment in response.data['appointments']]
+
+    def test_reads_go_to_replica(self):
+        """
+        Test that list reads are served from the replica, sync and async views alike
+        """
+        self.assertEqual(self.list_appointments(), ['2025-04-14'])
+
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.patient_user)
+        response = sync_views.AppointmentView.as_view()(request)
+        self.assertEqual(len(response.data['appointments']), 1)
+
+        self.sync_replica()
+        self.assertEqual(self.list_appointments(), ['2025-04-14', '2025-04-21'])
+
+    def test_writer_reads_own_writes(self):
+        """
+        Test that a user who wrote reads from the primary until the sticky window ends
+        """
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.post(reverse('appointments'), {
+            'doctor': self.doctor.id, 'date': '2025-04-14', 'time': '10:00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.using('default').count(), 3)
+        self.assertEqual(Appointment.objects.using('replica').count(), 1)
+        self.assertEqual(len(self.list_appointments()), 3)
+
+        cache.clear()
+        self.assertEqual(len(self.list_appointments()), 1)
+
+    def test_stored_slots_come_from_primary(self):
+        """
+        Test that slot index rows built while reading from the replica reflect the primary's bookings
+        """
+        DoctorSlot.objects.all().delete()
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('doctor-availability', args=[self.doctor.id]), {'date': '2025-04-21'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slot = DoctorSlot.objects.using('default').get(doctor=self.doctor, date='2025-04-21')
+        self.assertTrue(slot.is_booked(0))
+
+    def test_async_middleware_pins_writers(self):
+        """
+        Test that under ASGI the middleware runs as a coroutine, pins writers and resets the replica flag views set
+        """
+        from .replicas import PrimaryPinMiddleware, _use_replica, is_pinned
+
+        async def get_response(request):
+            _use_replica.set(True)
+            return HttpResponse(status=201)
+
+        async def call(request):
+            response = await middleware(request)
+            return response, _use_replica.get()
+
+        middleware = PrimaryPinMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        for user in (self.patient_user, SimpleLazyObject(lambda: self.patient_user)):
+            cache.clear()
+            request = APIRequestFactory().post('/')
+            request.user = user
+
+            async def auser():
+                return self.patient_user
+            request.auser = auser
+
+            response, reading_replica = async_to_sync(call)(request)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertFalse(reading_replica)
+            self.assertTrue(is_pinned(self.patient_user.pk))
+
+    def test_disabled_routing_reads_primary(self):
+        """
+        Test that without REPLICA_ROUTING everything reads from the primary
+        """
+        with override_settings(REPLICA_ROUTING={'ENABLED': False}):
+            self.assertEqual(len(self.list_appointments()), 2)
+
+
+class SyntheticLoadTest(TransactionTestCase):
+
+    def generate(self, **options):
+        output = StringIO()
+        call_command(
+            'generate_data', doctors=3, patients=10, appointments=40, records=25, days=30, batch_size=7, seed=1,
+            stdout=output, **options
+        )
+        return output.getvalue()
+
+    def test_generate_data(self):
+        """
+        Test that the generator creates the requested rows with valid, distinct slots and clears them again
+        """
+        self.generate()
+        self.assertEqual(Doctor.objects.count(), 3)
+        self.assertEqual(Patient.objects.count(), 10)
+        self.assertEqual(Appointment.objects.count(), 40)
+        self.assertEqual(MedicalRecord.objects.count(), 25)
+        self.assertEqual(
+            Appointment.objects.values('doctor', 'date', 'time').distinct().count(), 40
+        )
+        for record in MedicalRecord.objects.exclude(appointment=None).select_related('appointment'):
+            self.assertEqual(record.appointment.status, 'completed')
+        self.assertTrue(CustomUser.objects.first().check_password('password'))
+
+        self.generate(clear=True)
+        self.assertEqual(CustomUser.objects.count(), 13)
+
+    def test_load_test_report(self):
+        """
+        Test that the load test covers every route, writes diffable JSON and removes the users it created
+        """
+        self.generate()
+        users = CustomUser.objects.count()
+        path = os.path.join(tempfile.mkdtemp(), 'load.json')
+        call_command('load_test', requests=3, concurrency=2, output=path, stdout=StringIO())
+        with open(path) as file:
+            report = json.load(file)
+
+        self.assertEqual(report['uncovered_routes'], [])
+        self.assertEqual({scenario['route'] for scenario in report['scenarios'].values()}, {
+            pattern.name for pattern in api_urls.urlpatterns
+        })
+        appointments = report['scenarios']['appointments (patient)']
+        self.assertEqual(appointments['statuses'], {'200': 3})
+        self.assertEqual(sorted(appointments['latency_ms']), ['p50', 'p95', 'p99'])
+        self.assertGreater(appointments['queries']['mean'], 0)
+        self.assertEqual(CustomUser.objects.count(), users)
+
+    def test_load_test_read_only(self):
+        """
+        Test that --read-only skips every scenario that writes
+        """
+        self.generate()
+        output = StringIO()
+        call_command('load_test', requests=2, concurrency=2, read_only=True, route=['appointments'], stdout=output)
+        self.assertEqual(
+            [line[:24].strip() for line in output.getvalue().splitlines()], ['appointments (patient)', 'appointments (doctor)']
+        )
+
+
+class MetricsTest(APITestCase):
+
+    def setUp(self):
+        registry.clear()
+        self.admin = create_user('metrics-admin@example.com', 'admin')
+        self.patient = create_user('metrics-patient@example.com', 'patient')
+        Patient.objects.create(user=self.patient, full_name='Metrics Patient', age=30, gender='female', phone='1', address='x')
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        return response, response.content.decode()
+
+    def test_records_route_status_and_queries(self):
+        """
+        Test that requests are counted by URL name, method and status along with their queries and response size
+        """
+        self.client.force_authenticate(user=self.patient)
+        self.client.get(reverse('appointments'))
+        self.client.get(reverse('appointments'))
+        self.client.get('/no-such-page/')
+
+        self.client.force_authenticate(user=self.admin)
+        response, text = self.scrape()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('api_requests_total{route="appointments",method="GET",status="200"} 2', text)
+        self.assertIn('api_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('api_request_duration_seconds_bucket{route="appointments",method="GET",le="+Inf"} 2', text)
+        self.assertIn('api_request_duration_seconds_count{route="appointments",method="GET"} 2', text)
+        samples = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+        self.assertGreater(int(samples['api_db_queries_total{route="appointments",method="GET"}']), 0)
+        self.assertGreater(int(samples['api_response_bytes_total{route="appointments",method="GET"}']), 0)
+        self.assertIn('api_token_cache_hits_total', text)
+
+    def test_access(self):
+        """
+        Test that only admins and a scraper with the configured token can read the metrics
+        """
+        self.assertEqual(self.scrape()[0].status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.patient)
+        self.assertEqual(self.scrape()[0].status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+
+        with override_settings(METRICS={'TOKEN': 'scrape-secret'}):
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')[0].status_code, status.HTTP_200_OK)
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong')[0].status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_requests(self):
+        """
+        Test that under ASGI the middleware runs as a coroutine and records the route and queries of async views
+        """
+        async def get_response(request):
+            request.resolver_match = resolve(reverse('appointments'))
+            await Patient.objects.acount()
+            return HttpResponse(b'ok')
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(APIRequestFactory().get(reverse('appointments')))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        [series] = registry.snapshot()['series']
+        self.assertEqual((series['route'], series['statuses'], series['queries']), ('appointments', {'200': 1}, 1))
+        self.assertEqual(series['response_bytes'], 2)
+
+    def test_merges_worker_files(self):
+        """
+        Test that with a shared directory the totals of every worker are added up
+        """
+        directory = tempfile.mkdtemp()
+        other_worker = {
+            'series': [{
+                'route': 'appointments', 'method': 'GET', 'statuses': {'200': 5, '500': 1}, 'buckets': [6] + [0] * 10,
+                'count': 6, 'seconds': 0.01, 'queries': 12, 'query_seconds': 0.002, 'response_bytes': 600,
+            }],
+            'token_cache': {'size': 1, 'max_size': 10, 'ttl': 60, 'hits': 4, 'misses': 1, 'evictions': 0},
+        }
+        with open(os.path.join(directory, 'metrics-1-other.json'), 'w') as file:
+            json.dump(other_worker, file)
+
+        with override_settings(METRICS={'DIR': directory}):
+            self.client.force_authenticate(user=self.patient)
+            self.client.get(reverse('appointments'))
+            self.client.force_authenticate(user=self.admin)
+            response, text = self.scrape()
+        self.assertIn('api_requests_total{route="appointments",method="GET",status="200"} 6', text)
+        self.assertIn('api_requests_total{route="appointments",method="GET",status="500"} 1', text)
+        self.assertIn('api_request_duration_seconds_count{route="appointments",method="GET"} 7', text)
+        self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.json')]), 2)
+
+    def test_stale_workers_left_out_of_gauges(self):
+        """
+        Test that a worker file older than a few flushes still adds its counters but not its token cache size
+        """
+        def worker(size, hits, age):
+            return {
+                'series': [], 'written_at': wall_clock() - age,
+                'token_cache': {'size': size, 'max_size': 10, 'ttl': 60, 'hits': hits, 'misses': 0, 'evictions': 0},
+            }
+
+        with override_settings(METRICS={'FLUSH_SECONDS': 5}):
+            _, cache = merge([worker(3, 1, age=1), worker(7, 2, age=3600)])
+        self.assertEqual((cache['size'], cache['hits']), (3, 3))
+
+
+class CachedSchemaTest(APITestCase):
+
+    def setUp(self):
+        clear_schema()
+        self.addCleanup(clear_schema)
+
+    def test_spec_served_with_cache_headers(self):
+        """
+        Test that the spec is built once and served with an ETag, a long max-age and 304 on a matching If-None-Match
+        """
+        with mock.patch('api.schema.build_schema', wraps=build_schema) as build:
+            first = self.client.get('/swagger.json')
+            ui_spec = self.client.get('/', {'format': 'openapi'})
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('/api/appointments/', json.loads(first.content)['paths'])
+        self.assertEqual(ui_spec.content, first.content)
+        self.assertIn('max-age=86400', first['Cache-Control'])
+
+        not_modified = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+
+        yaml = self.client.get('/swagger.yaml')
+        self.assertEqual(yaml['Content-Type'], 'application/yaml')
+        self.assertNotEqual(yaml['ETag'], first['ETag'])
+        self.assertEqual(self.client.get('/').status_code, status.HTTP_200_OK)
+
+    def test_reads_schema_written_on_deploy(self):
+        """
+        Test that generate_schema writes the schema and the views serve it from there without introspecting
+        """
+        directory = tempfile.mkdtemp()
+        call_command('generate_schema', dir=directory, stdout=StringIO())
+        with open(os.path.join(directory, 'openapi.json'), 'wb') as file:
+            file.write(b'{"swagger": "2.0", "paths": {}}')
+
+        with override_settings(OPENAPI_SCHEMA={'DIR': directory}), mock.patch('api.schema.build_schema') as build:
+            response = self.client.get('/swagger.json')
+        build.assert_not_called()
+        self.assertEqual(json.loads(response.content), {'swagger': '2.0', 'paths': {}})
+
+    def test_benchmark_command(self):
+        """
+        Test that the benchmark compares the stock and cached views on every schema route
+        """
+        output = StringIO()
+        call_command('bench_schema', requests=2, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(all('stock p50' in line and 'cached p50' in line for line in lines))
+
+
+class StartupTest(APITestCase):
+
+    def test_warm_up_steps(self):
+        """
+        Test that the warmup runs each step without touching the database, and skips the schema when asked
+        """
+        with CaptureQueriesContext(connection) as queries:
+            timings = warm_up()
+        self.assertEqual(list(timings), ['urls', 'views', 'serializers', 'schema'])
+        self.assertEqual(len(queries), 0)
+        with override_settings(WARMUP={'SCHEMA': False}):
+            self.assertNotIn('schema', warm_up())
+        with override_settings(WARMUP={'ENABLED': False}):
+            self.assertIsNone(warm_up_if_enabled())
+
+    def test_warm_serializers_skips_only_context_errors(self):
+        """
+        Test that a serializer needing a request is skipped and logged, while other errors propagate
+        """
+        from rest_framework import serializers as drf_serializers
+        from . import serializers
+        from .startup import warm_serializers
+
+        class NeedsRequest(drf_serializers.Serializer):
+            def get_fields(self):
+                return {'user': self.context['request'].user}
+
+        class Broken(drf_serializers.Serializer):
+            def get_fields(self):
+                raise ValueError('broken')
+
+        for serializer_class in (NeedsRequest, Broken):
+            serializer_class.__module__ = serializers.__name__
+
+        with mock.patch.dict(vars(serializers), {'NeedsRequest': NeedsRequest}):
+            with self.assertLogs('api.startup', 'DEBUG') as logs:
+                warm_serializers()
+        self.assertIn('NeedsRequest', logs.output[0])
+
+        with mock.patch.dict(vars(serializers), {'Broken': Broken}), self.assertRaises(ValueError):
+            warm_serializers()
+
+    def test_startup_report(self):
+        """
+        Test that the report breaks boot time down per app and times the first requests after the warmup
+        """
+        output = StringIO()
+        call_command('startup_report', json=True, top=5, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertIn('api', report['apps'])
+        self.assertEqual(set(report['apps']['api']), {'import', 'import_models', 'ready'})
+        self.assertEqual(list(report['warmup']), ['urls', 'views', 'serializers', 'schema'])
+        self.assertEqual(len(report['requests']), 2)
+        self.assertEqual(len(report['imports']), 5)
+
+
+class MedicalRecordSearchTest(APITestCase):
+
+    def setUp(self):
+        self.doctors = []
+        for index in range(2):
+            user = create_user(f'search-doctor-{index}@example.com', 'doctor')
+            self.doctors.append(Doctor.objects.create(user=user, full_name=f'Dr. Search {index}', specialization='General'))
+        self.patient_user = create_user('search-patient@example.com', 'patient')
+        self.patient = Patient.objects.create(user=self.patient_user, full_name='Search Patient')
+        self.other_patient = Patient.objects.create(user=create_user('search-other@example.com', 'patient'), full_name='Other')
+
+        self.headache = self.record(0, 'Tension headache', 'Ibuprofen')
+        self.mentioned = self.record(0, 'Hypertension', 'Lifestyle changes', notes='Also reported a headache last week')
+        self.other_doctor = self.record(1, 'Tension headache', 'Rest')
+        self.url = reverse('medical-record-search')
+
+    def record(self, doctor, diagnosis, treatment, notes=None, patient=None):
+        return MedicalRecord.objects.create(
+            patient=patient or self.patient, doctor=self.doctors[doctor], diagnosis=diagnosis, treatment=treatment, notes=notes
+        )
+
+    def search(self, user, q, **params):
+        self.client.force_authenticate(user=user)
+        return self.client.get(self.url, {'q': q, **params})
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_ranked_and_scoped_to_caller(self):
+        """
+        Test that a doctor only finds their own records, diagnosis matches ranking above notes matches
+        """
+        response = self.search(self.doctors[0].user, 'headache')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [self.headache.id, self.mentioned.id])
+        self.assertEqual(response.data['results'][0]['snippet'], 'Tension <mark>headache</mark>')
+
+        self.assertEqual(self.ids(self.search(self.patient_user, 'headache')), [self.headache.id, self.other_doctor.id, self.mentioned.id])
+        self.assertEqual(self.ids(self.search(self.other_patient.user, 'headache')), [])
+
+    def test_stemming_prefix_and_syntax(self):
+        """
+        Test that word forms match, a trailing * matches a prefix, and FTS5 syntax in the query is taken literally
+        """
+        user = self.doctors[0].user
+        self.assertEqual(self.ids(self.search(user, 'headaches')), [self.headache.id, self.mentioned.id])
+        self.assertEqual(self.ids(self.search(user, 'ibupro')), [])
+        self.assertEqual(self.ids(self.search(user, 'ibupro*')), [self.headache.id])
+        # the scope tokens are not searchable text
+        self.assertEqual(self.ids(self.search(user, f'd{self.doctors[0].id}')), [])
+        self.assertEqual(self.ids(self.search(user, 'tension ibuprofen')), [self.headache.id])
+        self.assertEqual(self.search(user, 'headache" OR *').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.search(user, ' ').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_updates_and_deletes(self):
+        """
+        Test that the triggers keep the index in sync with record inserts, updates and deletes
+        """
+        user = self.doctors[0].user
+        MedicalRecord.objects.filter(pk=self.headache.pk).update(diagnosis='Cluster migraine')
+        self.assertEqual(self.ids(self.search(user, 'headache')), [self.mentioned.id])
+        self.assertEqual(self.ids(self.search(user, 'migraine')), [self.headache.id])
+        self.mentioned.delete()
+        self.assertEqual(self.ids(self.search(user, 'headache')), [])
+
+    def test_snippet_is_escaped(self):
+        """
+        Test that record text is HTML-escaped in the snippet and only the match markers are tags
+        """
+        self.record(0, 'Rash', 'Cream', notes='<b>itchy</b> rash')
+        snippet = self.search(self.doctors[0].user, 'itchy').data['results'][0]['snippet']
+        self.assertEqual(snippet, '&lt;b&gt;<mark>itchy</mark>&lt;/b&gt; rash')
+
+    def test_cursor_pagination(self):
+        """
+        Test that paging forward visits every match once in rank order and paging back returns the first page
+        """
+        for index in range(5):
+            self.record(0, 'Asthma', 'Inhaler' + ' inhaler' * index)
+        user = self.doctors[0].user
+        first = self.search(user, 'inhaler', page_size=2)
+        seen, response = self.ids(first), first
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(self.ids(response))
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        ranks = [item['rank'] for item in first.data['results']]
+        self.assertEqual(ranks, sorted(ranks))
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.ids(self.client.get(second.data['previous'])), self.ids(first))
+
+    def test_missing_index_is_not_remembered(self):
+        """
+        Test that a database without the index is checked again, so the index is found once it has been created
+        """
+        from . import search
+
+        with mock.patch.dict(search._available, clear=True):
+            with mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+                self.assertFalse(search.search_available())
+            self.assertTrue(search.search_available())
+            with mock.patch.object(connection.introspection, 'table_names', side_effect=AssertionError('introspected')):
+                self.assertTrue(search.search_available())
+
+    def test_rebuild_command(self):
+        """
+        Test that rebuilding restores an index that lost its contents
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO api_medicalrecord_fts(api_medicalrecord_fts) VALUES ('delete-all')")
+        self.assertEqual(self.ids(self.search(self.doctors[0].user, 'headache')), [])
+        call_command('rebuild_search_index', optimize=True, stdout=StringIO())
+        self.assertEqual(self.ids(self.search(self.doctors[0].user, 'headache')), [self.headache.id, self.mentioned.id])
+
+    def test_benchmark_command(self):
+        """
+        Test that the benchmark runs both searches for both scopes
+        """
+        output = StringIO()
+        call_command('bench_search', queries=3, baseline_queries=2, stdout=output)
+        labels = [line.split()[0] + ' ' + line.split()[1] for line in output.getvalue().splitlines()[1:]]
+        self.assertEqual(labels, ['fts5 (doctor)', 'icontains (doctor)', 'fts5 (all)', 'icontains (all)'])
+
+
+class DoctorDirectoryTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.patient = Patient.objects.create(user=create_user('directory-patient@example.com', 'patient'), full_name='Directory Patient')
+        self.monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        schedule = {'Monday': {'start': '09:00', 'end': '10:00'}}
+        self.aberg = self.doctor('Dr. Zoë Åberg', 'Cardiology', schedule)
+        self.smith = self.doctor('Dr. John Smith', 'cardiology', schedule)
+        self.smithers = self.doctor('Jane Smithers', 'Dermatology', schedule)
+        self.jones = self.doctor('Mary Jones', 'Pediatrics', {})
+        self.url = reverse('doctor-directory')
+        self.client.force_authenticate(user=self.patient.user)
+
+    def doctor(self, full_name, specialization, available_days):
+        user = create_user(f'directory-{len(full_name)}-{specialization}@example.com', 'doctor')
+        return Doctor.objects.create(user=user, full_name=full_name, specialization=specialization, available_days=available_days)
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_prefix_search_on_name_and_surname(self):
+        """
+        Test that names match by prefix of the full name or surname, ignoring case, accents and titles
+        """
+        response = self.client.get(self.url, {'q': 'SMI'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [self.smithers.id, self.smith.id])
+        self.assertEqual(self.ids(self.client.get(self.url, {'q': 'john sm'})), [self.smith.id])
+        self.assertEqual(self.ids(self.client.get(self.url, {'q': 'zoe'})), [self.aberg.id])
+        self.assertEqual(self.ids(self.client.get(self.url, {'q': 'aberg'})), [self.aberg.id])
+        self.assertEqual(self.ids(self.client.get(self.url, {'q': 'mith'})), [])
+        self.assertEqual(
+            self.ids(self.client.get(self.url)), [self.smithers.id, self.smith.id, self.jones.id, self.aberg.id]
+        )
+        self.assertNotIn('search_name', self.client.get(self.url).data['results'][0])
+
+    def test_specialization_filter_and_facets(self):
+        """
+        Test that specializations filter by prefix and are counted together across spellings
+        """
+        response = self.client.get(self.url, {'specialization': 'cardio'})
+        self.assertEqual(self.ids(response), [self.smith.id, self.aberg.id])
+        self.assertEqual(response.data['facets']['specializations'], [
+            {'specialization': 'Cardiology', 'count': 2},
+            {'specialization': 'Dermatology', 'count': 1},
+            {'specialization': 'Pediatrics', 'count': 1},
+        ])
+
+        # a name search counts the doctors it matched
+        response = self.client.get(self.url, {'q': 'smith'})
+        self.assertEqual(response.data['facets']['specializations'], [
+            {'specialization': 'cardiology', 'count': 1},
+            {'specialization': 'Dermatology', 'count': 1},
+        ])
+
+    def test_facets_cached_until_specializations_change(self):
+        """
+        Test that the landing page reads cached facets, dropped when a doctor is added, removed or re-specialized
+        """
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([query for query in queries if 'GROUP BY' in query['sql']])
+
+        self.jones.bio = 'Children and teenagers'
+        self.jones.save()
+        self.assertIsNotNone(cache.get('directory:specializations'))
+
+        self.jones.specialization = 'Dermatology'
+        self.jones.save()
+        facets = self.client.get(self.url).data['facets']['specializations']
+        self.assertEqual(facets[-1], {'specialization': 'Dermatology', 'count': 2})
+
+        self.smithers.user.delete()
+        facets = self.client.get(self.url).data['facets']['specializations']
+        self.assertEqual(facets[-1], {'specialization': 'Dermatology', 'count': 1})
+
+        self.doctor('Ann Lee', 'Oncology', {})
+        facets = self.client.get(self.url).data['facets']['specializations']
+        self.assertEqual(facets[-1], {'specialization': 'Oncology', 'count': 1})
+
+    def test_available_on_date(self):
+        """
+        Test that the date filter keeps doctors working that day with a free slot
+        """
+        for slot_time in ('09:00', '09:30'):
+            Appointment.objects.create(patient=self.patient, doctor=self.smith, date=self.monday, time=slot_time)
+        Appointment.objects.create(patient=self.patient, doctor=self.aberg, date=self.monday, time='09:00')
+
+        response = self.client.get(self.url, {'date': self.monday.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(response), [self.smithers.id, self.aberg.id])
+        tuesday = self.monday + timedelta(days=1)
+        self.assertEqual(self.ids(self.client.get(self.url, {'date': tuesday.isoformat()})), [])
+        self.assertEqual(self.client.get(self.url, {'date': '2025-13-01'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_available_on_date_pages(self):
+        """
+        Test that pages of the date filter fill up across chunks and link both ways
+        """
+        schedule = {'Monday': {'start': '09:00', 'end': '10:00'}}
+        for index in range(6):
+            self.doctor(f'Page Doctor {index}', f'Page {index}', schedule if index % 2 else {})
+        expected = list(
+            Doctor.objects.filter(available_days__has_key='Monday').order_by('search_name', 'id').values_list('id', flat=True)
+        )
+
+        with mock.patch('api.pagination.DoctorCursorPagination.chunk_size', 2):
+            first = self.client.get(self.url, {'date': self.monday.isoformat(), 'page_size': 2})
+            seen, response = self.ids(first), first
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                seen.extend(self.ids(response))
+            second = self.client.get(first.data['next'])
+            self.assertEqual(self.ids(self.client.get(second.data['previous'])), self.ids(first))
+        self.assertEqual(seen, expected)
+
+    def test_bulk_created_doctors_are_searchable(self):
+        """
+        Test that doctors created in bulk get their search columns and show up in the facets
+        """
+        self.client.get(self.url)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email='bulk-directory@example.com', username='bulk-directory', role='doctor')
+        ])
+        provision_profiles(users, [{'full_name': 'Dr. Ngozi Okafor', 'specialization': 'Oncology'}])
+
+        response = self.client.get(self.url, {'q': 'okaf'})
+        self.assertEqual([item['full_name'] for item in response.data['results']], ['Dr. Ngozi Okafor'])
+        facets = self.client.get(self.url).data['facets']['specializations']
+        self.assertIn({'specialization': 'Oncology', 'count': 1}, facets)
+
+
+class CompiledScheduleTest(APITestCase):
+
+    def setUp(self):
+        self.patient = Patient.objects.create(user=create_user('compiled-patient@example.com', 'patient'), full_name='Compiled Patient')
+        self.doctor = Doctor.objects.create(
+            user=create_user('compiled-doctor@example.com', 'doctor'), full_name='Dr. Compiled', specialization='General',
+            available_days={'Monday': {'start': '09:00', 'end': '12:30'}, 'Wednesday': {'start': '9:15', 'end': '10:00'}},
+        )
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.wednesday = self.monday + timedelta(days=2)
+        self.client.force_authenticate(user=self.patient.user)
+
+    def test_compiled_on_save(self):
+        """
+        Test that saving a doctor compiles the schedule into minute ranges and a weekday mask
+        """
+        self.assertEqual(self.doctor.schedule, [[540, 750], None, [555, 600], None, None, None, None])
+        self.assertEqual(self.doctor.working_days, 0b101)
+
+        doctor = Doctor.objects.get(id=self.doctor.id)
+        doctor.available_days = {'Friday': {'start': '08:00', 'end': '09:00'}}
+        doctor.save(update_fields=['available_days'])
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.schedule, [None, None, None, None, [480, 540], None, None])
+        self.assertEqual(doctor.working_days, 0b10000)
+
+        users = CustomUser.objects.bulk_create([CustomUser(email='compiled-bulk@example.com', username='compiled-bulk', role='doctor')])
+        provision_profiles(users, [{'available_days': {'Sunday': {'start': '10:00', 'end': '11:00'}}}])
+        self.assertEqual(Doctor.objects.get(user=users[0]).working_days, 0b1000000)
+
+    def test_slots_built_without_parsing(self):
+        """
+        Test that availability and booking read the compiled schedule instead of parsing available_days
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.wednesday, time='09:45')
+        with mock.patch('api.availability.working_hours', side_effect=AssertionError('parsed the schedule')):
+            response = self.client.get(
+                reverse('doctor-availability', args=[self.doctor.id]), {'date': self.wednesday.isoformat()}
+            )
+            self.assertEqual(response.data['time_slots'], [
+                {'time': '09:15', 'available': True},
+                {'time': '09:45', 'available': False},
+            ])
+            response = self.client.post(reverse('appointments'), {
+                'doctor': self.doctor.id, 'date': self.monday.isoformat(), 'time': '12:00',
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DoctorSlot.objects.get(doctor=self.doctor, date=self.monday).booked_mask, 1 << 6)
+
+    def test_malformed_day_falls_back(self):
+        """
+        Test that a schedule with a malformed day keeps working for its other days and reports the bad one
+        """
+        Doctor.objects.filter(id=self.doctor.id).update(available_days={
+            'Monday': {'start': '09:00', 'end': '10:00'}, 'Wednesday': {'start': 'nine'},
+        })
+        doctor = Doctor.objects.get(id=self.doctor.id)
+        doctor.save()
+        self.assertIsNone(doctor.schedule)
+        self.assertEqual(doctor.working_days, 0b101)
+
+        url = reverse('doctor-availability', args=[doctor.id])
+        self.assertEqual(len(self.client.get(url, {'date': self.monday.isoformat()}).data['time_slots']), 2)
+        response = self.client.get(url, {'date': self.wednesday.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_series_checks_bookings_in_the_index(self):
+        """
+        Test that a series booking finds taken slots in the slot index without querying appointments
+        """
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday + timedelta(days=7), time='09:00')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('appointment-series'), {
+                'doctor': self.doctor.id, 'date': self.monday.isoformat(), 'time': '09:00',
+                'frequency': 'weekly', 'count': 3,
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # missing slot rows are built from one range query, no lookup of the time itself
+        self.assertFalse([query for query in queries if '"api_appointment"."time" =' in query['sql']])
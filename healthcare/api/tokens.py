@@ -0,0 +1,87 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .caller import Caller
+from .models import RevokedToken
+
+ACCESS_SALT = 'api.tokens.access'
+REFRESH_SALT = 'api.tokens.refresh'
+
+
+def token_setting(name):
+    defaults = {'ENABLED': False, 'ACCESS_TTL': 300, 'REFRESH_TTL': 14 * 24 * 3600}
+    return getattr(settings, 'SIGNED_TOKENS', {}).get(name, defaults[name])
+
+
+def issue_access_token(user, profile_id=None):
+    """
+    A short-lived token carrying everything the API needs to know about the
+    caller, signed with SECRET_KEY so it verifies without a query.
+    """
+    claims = {'uid': user.pk, 'role': user.role, 'pid': profile_id, 'su': user.is_superuser, 'staff': user.is_staff}
+    return signing.TimestampSigner(salt=ACCESS_SALT).sign_object(claims)
+
+
+def issue_refresh_token(user):
+    return signing.TimestampSigner(salt=REFRESH_SALT).sign_object({'uid': user.pk, 'jti': uuid.uuid4().hex})
+
+
+def issue_tokens(user):
+    """An access and refresh token pair for ``user``, with the id of the profile matching their role."""
+    caller = Caller(user)
+    profile_id = getattr(caller, f'{user.role}_id') if user.role in ('doctor', 'patient') else None
+    return {
+        'access': issue_access_token(user, profile_id),
+        'refresh': issue_refresh_token(user),
+        'expires_in': token_setting('ACCESS_TTL'),
+    }
+
+
+def read_access_token(token):
+    """Return the claims of a valid access token, raises signing.BadSignature otherwise."""
+    return signing.TimestampSigner(salt=ACCESS_SALT).unsign_object(token, max_age=token_setting('ACCESS_TTL'))
+
+
+def user_from_claims(claims):
+    """
+    An in-memory user built from access token claims. It only has the fields
+    the claims carry, so it must never be saved.
+    """
+    user = get_user_model()(
+        id=claims['uid'], role=claims['role'], is_superuser=claims['su'], is_staff=claims['staff'], is_active=True
+    )
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    user.token_claims = claims
+    return user
+
+
+def read_refresh_token(token):
+    """
+    Return the claims of a valid, unrevoked refresh token, raises
+    signing.BadSignature otherwise.
+    """
+    claims = signing.TimestampSigner(salt=REFRESH_SALT).unsign_object(token, max_age=token_setting('REFRESH_TTL'))
+    if RevokedToken.objects.filter(jti=claims['jti']).exists():
+        raise signing.BadSignature('Token has been revoked.')
+    return claims
+
+
+def revoke_refresh_token(claims):
+    """
+    Deny a refresh token until it would have expired, and forget expired
+    denials. Returns False if it was revoked already, e.g. by a concurrent
+    refresh that passed read_refresh_token at the same time.
+    """
+    now = timezone.now()
+    RevokedToken.objects.filter(expires_at__lte=now).delete()
+    _, created = RevokedToken.objects.get_or_create(
+        jti=claims['jti'], defaults={'expires_at': now + timedelta(seconds=token_setting('REFRESH_TTL'))}
+    )
+    return created
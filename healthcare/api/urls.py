@@ -8,17 +8,24 @@ urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
+    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('auth/token-cache/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
 
     # # profiles
     path('patients/profile/', PatientProfileView.as_view(), name='patient-profile'),
     path('doctors/profile/', DoctorProfileView.as_view(), name='doctor-profile'),
+    path('doctors/', DoctorDirectoryView.as_view(), name='doctor-directory'),
 
     # # appointments management
     path('appointments/', AppointmentView.as_view(), name='appointments'),
+    path('appointments/series/', AppointmentSeriesView.as_view(), name='appointment-series'),
     path('appointments/<int:appointment_id>/', AppointmentUpdateView.as_view(), name='appointment-update'),
     path('appointments/doctor/<int:doctor_id>/availability/', DoctorAvailabilityView.as_view(), name='doctor-availability'),
+    path('appointments/availability/', DoctorAvailabilitySearchView.as_view(), name='doctor-availability-search'),
 
     # medical records
     path('medical-records/', MedicalRecordListCreateView.as_view(), name='medical-records'),
+    path('medical-records/search/', MedicalRecordSearchView.as_view(), name='medical-record-search'),
+    path('medical-records/export/', MedicalRecordExportView.as_view(), name='medical-record-export'),
     path('medical-records/<int:pk>/', MedicalRecordDetailView.as_view(), name='medical-record-detail'),
 ]
\ No newline at end of file
@@ -6,12 +6,40 @@ from django.contrib.auth import login, logout
 from rest_framework.response import Response
 from .serializers import *
 from .permissions import *
+from .availability import get_slot, get_slots, date_range, day_availability, mark_booked_many
+from .availability_cache import get_or_build, get_version, invalidate_doctor, make_etag
+from .pagination import (
+    AppointmentCursorPagination, DoctorAvailabilityPagination, DoctorCursorPagination, MedicalRecordCursorPagination,
+    SearchCursorPagination,
+)
+from django.db import IntegrityError, router, transaction
 from rest_framework.authtoken.models import Token
 from rest_framework.authentication import TokenAuthentication
+from .authentication import MetricsTokenAuthentication, token_cache
+from .caller import get_caller
+from .directory import available_on, directory_facets, name_filter, prefix_filter, specialization_counts, working_on
+from .metrics import registry, render
+from .replicas import ReplicaReadMixin
+from .search import match_query, search_available, search_records
+from .tokens import issue_tokens, read_refresh_token, revoke_refresh_token, token_setting
+from django.core import signing
+from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.settings import api_settings
+from django.core.handlers.asgi import ASGIRequest
+from .export import FORMATS, astream_records, export_queryset, stream_records
+from .tasks import create_medical_record_after_appointment, send_appointment_confirmation_email
 import json
 
+
+def get_expand(request):
+    """Parse the ``expand`` query parameter, e.g. ``?expand=doctor,patient``."""
+    return {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+
+
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -36,35 +64,89 @@ class LoginView(APIView):
             if not user:
                 return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+            if token_setting('ENABLED'):
+                # signed tokens need neither a session nor a token row
+                return Response({**issue_tokens(user), 'role': user.role}, status=status.HTTP_200_OK)
+
             login(request, user)
-            print(request.user)
             token, created = Token.objects.get_or_create(user=user)
             return Response({'token': token.key, 'role': user.role}, status=status.HTTP_200_OK)
 
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
-        request.user.auth_token.delete()
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                claims = read_refresh_token(refresh)
+            except signing.BadSignature:
+                claims = None
+            if claims is not None and claims['uid'] == request.user.pk:
+                revoke_refresh_token(claims)
+
+        token_cache.invalidate_user(request.user.pk)
+        Token.objects.filter(user=request.user).delete()
         logout(request)
         return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
 
 
+class TokenRefreshView(APIView):
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        if not token_setting('ENABLED'):
+            return Response({"error": "Signed tokens are not enabled."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            claims = read_refresh_token(request.data.get('refresh') or '')
+        except signing.BadSignature:
+            return Response({"error": "Invalid or expired refresh token."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = get_user_model().objects.select_related('doctor_profile', 'patient_profile').filter(
+            pk=claims['uid'], is_active=True
+        ).first()
+        if user is None:
+            return Response({"error": "User inactive or deleted."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # refresh tokens are single use, the new pair replaces this one; only
+        # the request that revokes it gets the pair
+        if not revoke_refresh_token(claims):
+            return Response({"error": "Invalid or expired refresh token."}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({**issue_tokens(user), 'role': user.role}, status=status.HTTP_200_OK)
+
+
+class TokenCacheStatsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        # counters are per process
+        return Response(token_cache.stats())
+
+
+class MetricsView(APIView):
+    """Request metrics of all workers in the Prometheus text format."""
+    authentication_classes = [MetricsTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    permission_classes = [CanReadMetrics]
+
+    def get(self, request):
+        return HttpResponse(render(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # patient views
 
-class PatientProfileView(APIView):
+class PatientProfileView(ReplicaReadMixin, APIView):
     permission_classes = [IsPatient]
     serializer_class = PatientSerializer
 
     def get(self, request):
-        try:
-            patient = request.user.patient_profile
-            serializer = self.serializer_class(patient)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Patient.DoesNotExist:
+        patient = get_caller(request).patient
+        if patient is None:
             return Response({"error": "Patient profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.serializer_class(patient)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
-        if hasattr(request.user, 'patient_profile'):
+        if get_caller(request).patient is not None:
             return Response({"error": "Patient profile already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.serializer_class(data=request.data)
@@ -74,39 +156,36 @@ class PatientProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request):
-        try:
-            patient = request.user.patient_profile
-            serializer = self.serializer_class(patient, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except Patient.DoesNotExist:
+        patient = get_caller(request).patient
+        if patient is None:
             return Response({"error": "Patient profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.serializer_class(patient, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
-        try:
-            patient = request.user.patient_profile
-            patient.delete()
-            return Response({"message": "Patient profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
-        except Patient.DoesNotExist:
+        patient = get_caller(request).patient
+        if patient is None:
             return Response({"error": "Patient profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        patient.delete()
+        return Response({"message": "Patient profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 # doctor views
-class DoctorProfileView(APIView):
+class DoctorProfileView(ReplicaReadMixin, APIView):
     permission_classes = [IsDoctor]
     serializer_class = DoctorSerializer
 
     def get(self, request):
-        try:
-            doctor = request.user.doctor_profile
-            serializer = self.serializer_class(doctor)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Doctor.DoesNotExist:
+        doctor = get_caller(request).doctor
+        if doctor is None:
             return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.serializer_class(doctor)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
-        if hasattr(request.user, 'doctor_profile'):
+        if get_caller(request).doctor is not None:
             return Response({"error": "Doctor profile already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
         data = request.data.copy()
@@ -126,54 +205,69 @@ class DoctorProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request):
-        try:
-            doctor = request.user.doctor_profile
-            data = request.data.copy()
-            available_days = data.get('available_days')
-            if isinstance(available_days, str):
-                import json
-                try:
-                    data['available_days'] = json.loads(available_days)
-                except json.JSONDecodeError:
-                    return Response({"error": "Invalid format for available_days."}, status=status.HTTP_400_BAD_REQUEST)
+        doctor = get_caller(request).doctor
+        if doctor is None:
+            return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
-            serializer = self.serializer_class(doctor, data=data, partial=True)
-            if serializer.is_valid():
+        data = request.data.copy()
+        available_days = data.get('available_days')
+        if isinstance(available_days, str):
+            import json
+            try:
+                data['available_days'] = json.loads(available_days)
+            except json.JSONDecodeError:
+                return Response({"error": "Invalid format for available_days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.serializer_class(doctor, data=data, partial=True)
+        if serializer.is_valid():
+            # schedule changes reset the doctor's slot index in the same transaction
+            with transaction.atomic():
                 serializer.save()
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except Doctor.DoesNotExist:
-            return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
-        try:
-            doctor = request.user.doctor_profile
-            doctor.delete()
-            return Response({"message": "Doctor profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
-        except Doctor.DoesNotExist:
+        doctor = get_caller(request).doctor
+        if doctor is None:
             return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        doctor.delete()
+        return Response({"message": "Doctor profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 # appointment endpoints
-class AppointmentView(APIView):
+class AppointmentView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        if hasattr(user, 'patient_profile'):
-            appointments = Appointment.objects.filter(patient=user.patient_profile)
-        elif hasattr(user, 'doctor_profile'):
-            appointments = Appointment.objects.filter(doctor=user.doctor_profile)
-        else:
+        appointments = self.caller_queryset(get_caller(request))
+        if appointments is None:
             return Response({"error": "Unauthorized user."}, status=status.HTTP_403_FORBIDDEN)
 
-        serializer = AppointmentSerializer(appointments, many=True)
+        paginator = AppointmentCursorPagination()
+        page = paginator.paginate_queryset(appointments, request, view=self)
+        return self.list_response(request, paginator, page)
+
+    def caller_queryset(self, caller):
+        """The caller's appointments, or None if they have no profile."""
+        if caller.patient_id is not None:
+            appointments = Appointment.objects.filter(patient_id=caller.patient_id)
+        elif caller.doctor_id is not None:
+            appointments = Appointment.objects.filter(doctor_id=caller.doctor_id)
+        else:
+            return None
+        return appointments.select_related('doctor', 'patient')
+
+    def list_response(self, request, paginator, page):
+        serializer = AppointmentSerializer(page, many=True, context={'expand': get_expand(request)})
         return Response({
             "message": "Appointments fetched successfully.",
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "appointments": serializer.data
         })
 
     def post(self, request):
-        if not hasattr(request.user, 'patient_profile'):
+        patient = get_caller(request).patient
+        if patient is None:
             return Response({"error": "Only patients can book appointments."}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = AppointmentSerializer(data=request.data)
@@ -184,29 +278,33 @@ class AppointmentView(APIView):
 
             # Check if doctor is available that day
             weekday_name = date.strftime('%A')  # e.g. 'Monday'
-            if weekday_name not in doctor.available_days:
+            slot = get_slot(doctor, date)
+            if slot is None or not slot.is_working_day:
                 return Response({
                     "message": f"Doctor is not available on {weekday_name}.",
                     "available": False
                 }, status=status.HTTP_400_BAD_REQUEST)
 
             # Check if time falls within doctor's working hours
-            if not (doctor.available_time_start <= time <= doctor.available_time_end):
+            if not slot.covers(time):
                 return Response({
                     "message": "Time selected is outside of doctor's working hours.",
                     "available": False
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Check for conflicting appointments
-            if Appointment.objects.filter(doctor=doctor, date=date, time=time).exists():
+            # Save appointment, the insert itself is the conflict check and the
+            # slot index is updated in the same transaction
+            try:
+                with transaction.atomic():
+                    appointment = serializer.save(patient=patient)
+                    # the worker sends it, the job commits with the booking
+                    send_appointment_confirmation_email.delay(appointment.id)
+            except IntegrityError:
                 return Response({
                     "message": "This slot is already booked.",
                     "available": False
                 }, status=status.HTTP_409_CONFLICT)
 
-            # Save appointment
-            appointment = serializer.save(patient=request.user.patient_profile)
-
             return Response({
                 "message": "Appointment booked successfully.",
                 "appointment": AppointmentSerializer(appointment).data,
@@ -219,6 +317,95 @@ class AppointmentView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AppointmentSeriesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        patient = get_caller(request).patient
+        if patient is None:
+            return Response({"error": "Only patients can book appointments."}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = AppointmentSeriesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                "message": "Validation failed.",
+                "errors": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        doctor = serializer.validated_data['doctor']
+        time = serializer.validated_data['time']
+        dates = serializer.occurrences()
+
+        # Check every occurrence against the schedule and existing bookings
+        # with one slot index read, times off the slot grid aren't in the
+        # index and take one query
+        slots = get_slots([doctor], dates)
+        booked_dates = set()
+        off_grid = []
+        for date in dates:
+            slot = slots[(doctor.id, date)]
+            index = slot.slot_index(time) if slot is not None else None
+            if index is not None:
+                if slot.is_booked(index):
+                    booked_dates.add(date)
+            elif slot is not None and slot.covers(time):
+                off_grid.append(date)
+        if off_grid:
+            booked_dates.update(
+                Appointment.objects.filter(doctor=doctor, date__in=off_grid, time=time)
+                .exclude(status='cancelled').values_list('date', flat=True)
+            )
+
+        occurrences = []
+        for date in dates:
+            slot = slots[(doctor.id, date)]
+            if slot is None or not slot.is_working_day:
+                occurrences.append({"date": date, "booked": False, "message": f"Doctor is not available on {date.strftime('%A')}."})
+            elif not slot.covers(time):
+                occurrences.append({"date": date, "booked": False, "message": "Time selected is outside of doctor's working hours."})
+            elif date in booked_dates:
+                occurrences.append({"date": date, "booked": False, "message": "This slot is already booked."})
+            else:
+                occurrences.append({"date": date, "booked": True})
+
+        if not all(occurrence["booked"] for occurrence in occurrences):
+            for occurrence in occurrences:
+                occurrence["booked"] = False
+            return Response({
+                "message": "Some occurrences cannot be booked, no appointments were created.",
+                "occurrences": occurrences
+            }, status=status.HTTP_409_CONFLICT if booked_dates else status.HTTP_400_BAD_REQUEST)
+
+        appointments = [
+            Appointment(
+                patient=patient, doctor=doctor, date=date, time=time,
+                reason=serializer.validated_data.get('reason')
+            )
+            for date in dates
+        ]
+        try:
+            with transaction.atomic():
+                appointments = Appointment.objects.bulk_create(appointments)
+                # bulk_create skips the signals that maintain the slot index and availability cache
+                mark_booked_many(doctor, [(date, time) for date in dates])
+                invalidate_doctor(doctor.id)
+                # one confirmation per appointment, the jobs commit with the bookings
+                send_appointment_confirmation_email.delay_many([(appointment.id,) for appointment in appointments])
+        except IntegrityError:
+            return Response({
+                "message": "Some occurrences were booked by someone else, no appointments were created.",
+                "occurrences": [{"date": date, "booked": False} for date in dates]
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "message": "Appointment series booked successfully.",
+            "occurrences": [
+                {"date": appointment.date, "booked": True, "appointment": AppointmentSerializer(appointment).data}
+                for appointment in appointments
+            ]
+        }, status=status.HTTP_201_CREATED)
+
+
 class AppointmentUpdateView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -228,11 +415,29 @@ class AppointmentUpdateView(APIView):
         except Appointment.DoesNotExist:
             return Response({"error": "Appointment not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if hasattr(request.user, 'doctor_profile') and appointment.doctor == request.user.doctor_profile:
+        doctor = get_caller(request).doctor
+        if doctor is not None and appointment.doctor_id == doctor.id:
             status_value = request.data.get("status")
             if status_value:
+                # stored lowercase, as in STATUS_CHOICES
+                status_value = str(status_value).lower()
+                if status_value not in {value for value, label in STATUS_CHOICES}:
+                    return Response({"error": f"'{status_value}' is not a valid status."}, status=status.HTTP_400_BAD_REQUEST)
+                changed = status_value != appointment.status
                 appointment.status = status_value
-                appointment.save()
+                # reactivating a cancelled appointment fails if its slot was booked again since
+                try:
+                    with transaction.atomic():
+                        appointment.save()
+                        if changed and status_value == 'confirmed':
+                            send_appointment_confirmation_email.delay(appointment.id)
+                        elif changed and status_value == 'completed':
+                            create_medical_record_after_appointment.delay(appointment.id)
+                except IntegrityError:
+                    return Response({
+                        "message": "This slot is already booked.",
+                        "available": False
+                    }, status=status.HTTP_409_CONFLICT)
                 return Response({
                     "message": "Appointment status updated.",
                     "appointment": AppointmentSerializer(appointment).data
@@ -246,16 +451,17 @@ class AppointmentUpdateView(APIView):
             appointment = Appointment.objects.get(id=appointment_id)
         except Appointment.DoesNotExist:
             return Response({"error": "Appointment not found."}, status=status.HTTP_404_NOT_FOUND)
-        user = request.user
-        if not (user.is_superuser or (hasattr(user, 'doctor_profile') or hasattr(request.user, 'patient_profile') and appointment.doctor == user.doctor_profile or appointment.patient == user.patient_profile)):
+        caller = get_caller(request)
+        if not (caller.is_superuser or caller.owns(appointment)):
             return Response({"error": "You do not have permission to delete this appointment."}, status=status.HTTP_403_FORBIDDEN)
 
-        appointment.delete()
+        with transaction.atomic():
+            appointment.delete()
         return Response({'message': 'Appointment deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
 
 
 
-class DoctorAvailabilityView(APIView):
+class DoctorAvailabilityView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, doctor_id):
@@ -265,111 +471,354 @@ class DoctorAvailabilityView(APIView):
         if not date_str:
             return Response({"error": "'date' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # The version changes whenever the doctor's appointments or profile do,
+        # so it identifies the response without reading anything else
+        etag = make_etag(doctor_id, get_version(doctor_id), date_str, time_str or '')
+        if self.is_not_modified(request, etag):
+            return self.not_modified(etag)
+
+        status_code, data = get_or_build(
+            f'availability:{doctor_id}:{etag[1:-1]}',
+            lambda: self.build(doctor_id, date_str, time_str)
+        )
+        return self.cached_response(status_code, data, etag)
+
+    def is_not_modified(self, request, etag):
+        if_none_match = request.headers.get('If-None-Match', '')
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+
+    def not_modified(self, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    def cached_response(self, status_code, data, etag):
+        response = Response(data, status=status_code)
+        if status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def build(self, doctor_id, date_str, time_str):
+        """Compute the (status, data) of an availability response from the slot index."""
         try:
             doctor = Doctor.objects.get(id=doctor_id)
         except Doctor.DoesNotExist:
-            return Response({"error": "Doctor not found."}, status=status.HTTP_404_NOT_FOUND)
+            return status.HTTP_404_NOT_FOUND, {"error": "Doctor not found."}
 
         try:
             date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
         except ValueError:
-            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
-
+            return status.HTTP_400_BAD_REQUEST, {"error": "Invalid date format. Use YYYY-MM-DD."}
+
+        # Read the day from the slot index
+        slot = get_slot(doctor, date_obj)
+        result = self.describe(doctor_id, date_str, time_str, date_obj, slot)
+        if result is None:
+            # off-grid times aren't in the index
+            is_booked = self.booked_at(doctor, date_obj, time_str).exists()
+            result = self.time_result(doctor_id, date_str, time_str, is_booked)
+        return result
+
+    def describe(self, doctor_id, date_str, time_str, date_obj, slot):
+        """
+        Build the (status, data) of a response from the day's slot index row, or
+        None if the requested time is off the slot grid and has to be queried.
+        """
         day_name = date_obj.strftime('%A')
-        available_days = doctor.available_days
+        if slot is None:
+            return status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": f"Invalid time format in availability for {day_name}."}
 
         # Doctor is not available on this day
-        if day_name not in available_days:
-            return Response({
+        if not slot.is_working_day:
+            return status.HTTP_200_OK, {
                 "doctor_id": doctor_id,
                 "date": date_str,
                 "available": False,
                 "message": f"Doctor is not available on {day_name}."
-            }, status=status.HTTP_200_OK)
-
-        try:
-            start_time = datetime.strptime(available_days[day_name]["start"], "%H:%M")
-            end_time = datetime.strptime(available_days[day_name]["end"], "%H:%M")
-        except Exception:
-            return Response({"error": f"Invalid time format in availability for {day_name}."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        slot_duration = timedelta(minutes=30)
-
-        # Fetch booked slots
-        booked_times = set(
-            Appointment.objects.filter(doctor=doctor, date=date_str)
-            .values_list('time', flat=True)
-        )
+            }
 
         # If checking a specific time
         if time_str:
             try:
                 check_time = datetime.strptime(time_str, "%H:%M").time()
             except ValueError:
-                return Response({"error": "Invalid time format. Use HH:MM."}, status=status.HTTP_400_BAD_REQUEST)
+                return status.HTTP_400_BAD_REQUEST, {"error": "Invalid time format. Use HH:MM."}
 
-            if not (start_time.time() <= check_time < end_time.time()):
-                return Response({
+            if not slot.covers(check_time):
+                return status.HTTP_200_OK, {
                     "doctor_id": doctor_id,
                     "date": date_str,
                     "time": time_str,
                     "available": False,
                     "message": "Requested time is outside doctor's available hours."
-                })
+                }
 
-            is_booked = check_time in booked_times
-            return Response({
-                "doctor_id": doctor_id,
-                "date": date_str,
-                "time": time_str,
-                "available": not is_booked
-            })
+            index = slot.slot_index(check_time)
+            if index is None:
+                return None
+            return self.time_result(doctor_id, date_str, time_str, slot.is_booked(index))
 
         # If checking full day slots
-        current = start_time
-        time_slots = []
-        while current < end_time:
-            slot_time = current.time()
-            time_slots.append({
-                "time": slot_time.strftime("%H:%M"),
-                "available": slot_time not in booked_times
-            })
-            current += slot_duration
+        time_slots = [
+            {"time": slot_time.strftime("%H:%M"), "available": available}
+            for slot_time, available in slot.time_slots()
+        ]
 
-        return Response({
+        return status.HTTP_200_OK, {
             "doctor_id": doctor_id,
             "date": date_str,
             "time_slots": time_slots
+        }
+
+    def time_result(self, doctor_id, date_str, time_str, is_booked):
+        return status.HTTP_200_OK, {
+            "doctor_id": doctor_id,
+            "date": date_str,
+            "time": time_str,
+            "available": not is_booked
+        }
+
+    def booked_at(self, doctor, date_obj, time_str):
+        check_time = datetime.strptime(time_str, "%H:%M").time()
+        return Appointment.objects.filter(doctor=doctor, date=date_obj, time=check_time).exclude(status='cancelled')
+
+
+class DoctorAvailabilitySearchView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    max_days = 31
+    max_doctors = 50
+
+    def get(self, request):
+        error, params = self.parse(request)
+        if error is not None:
+            return error
+        start_date, end_date, doctors = params
+
+        doctors = self.page(list(doctors))
+        dates = date_range(start_date, end_date)
+
+        # One slot index read for every doctor and day in the range
+        slots = get_slots(doctors, dates)
+        return self.respond(start_date, end_date, doctors, dates, slots)
+
+    def parse(self, request):
+        """
+        Validate the query parameters into (error response, None) or
+        (None, (start_date, end_date, doctor queryset)). A specialization can
+        have any number of doctors, so those are read a page at a time, see
+        page().
+        """
+        start_str = request.query_params.get('start_date')  # YYYY-MM-DD
+        end_str = request.query_params.get('end_date', start_str)  # Optional YYYY-MM-DD
+        doctor_ids_str = request.query_params.get('doctor_ids')  # e.g. 1,2,3
+        specialization = request.query_params.get('specialization')
+
+        if not start_str:
+            return Response({"error": "'start_date' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST), None
+        if not (doctor_ids_str or specialization):
+            return Response({"error": "Provide either 'doctor_ids' or 'specialization'."}, status=status.HTTP_400_BAD_REQUEST), None
+
+        try:
+            start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST), None
+
+        if end_date < start_date:
+            return Response({"error": "'end_date' must not be before 'start_date'."}, status=status.HTTP_400_BAD_REQUEST), None
+        if (end_date - start_date).days >= self.max_days:
+            return Response({"error": f"Date range cannot exceed {self.max_days} days."}, status=status.HTTP_400_BAD_REQUEST), None
+
+        self.paginator = None
+        if doctor_ids_str:
+            try:
+                doctor_ids = {int(doctor_id) for doctor_id in doctor_ids_str.split(',') if doctor_id.strip()}
+            except ValueError:
+                return Response({"error": "'doctor_ids' must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST), None
+            if len(doctor_ids) > self.max_doctors:
+                return Response({"error": f"At most {self.max_doctors} doctors can be searched at once."}, status=status.HTTP_400_BAD_REQUEST), None
+            doctors = Doctor.objects.filter(id__in=doctor_ids).order_by('id')
+        else:
+            # the indexed search key rather than a case-insensitive LIKE,
+            # spelling variants match too
+            self.paginator = DoctorAvailabilityPagination()
+            doctors = self.paginator.page_queryset(
+                Doctor.objects.filter(search_specialization=search_key(specialization)), request
+            )
+
+        return None, (start_date, end_date, doctors)
+
+    def page(self, doctors):
+        """The doctors to show out of the ones read, the page of them when searching by specialization."""
+        if self.paginator is None:
+            return doctors
+        return self.paginator.set_page(doctors)
+
+    def respond(self, start_date, end_date, doctors, dates, slots):
+        results = []
+        for doctor in doctors:
+            results.append({
+                "doctor_id": doctor.id,
+                "full_name": doctor.full_name,
+                "specialization": doctor.specialization,
+                "days": [
+                    day_availability(slots[(doctor.id, date)], date)
+                    for date in dates
+                ]
+            })
+
+        return Response({
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "doctors": results,
+            "next": self.paginator.get_next_link() if self.paginator is not None else None,
+            "previous": self.paginator.get_previous_link() if self.paginator is not None else None,
         })
 
-# medical records
-class MedicalRecordListCreateView(APIView):
+class DoctorDirectoryView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
+
     def get(self, request):
-        user = request.user
-        if user.is_superuser:
-            records = MedicalRecord.objects.all()
-        elif hasattr(user, 'doctor_profile'):
-            records = MedicalRecord.objects.filter(doctor=user.doctor_profile)
-        elif hasattr(user, 'patient_profile'):
-            records = MedicalRecord.objects.filter(patient=user.patient_profile)
+        name = request.query_params.get('q', '')
+        specialization = search_key(request.query_params.get('specialization', ''))
+        date_str = request.query_params.get('date')  # Optional YYYY-MM-DD
+
+        date_obj = None
+        if date_str:
+            try:
+                date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+            except ValueError:
+                return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        doctors = Doctor.objects.only('id', 'full_name', 'specialization', 'search_name', 'available_days', 'schedule')
+        matching_name = name_filter(name)
+        if matching_name is not None:
+            doctors = doctors.filter(matching_name)
+            # a name prefix narrows the directory to a handful of rows, count them directly
+            facets = specialization_counts(doctors)
+        else:
+            facets = directory_facets()
+        if specialization:
+            doctors = doctors.filter(prefix_filter('search_specialization', specialization))
+
+        paginator = DoctorCursorPagination()
+        if date_obj is not None:
+            doctors = working_on(doctors, date_obj)
+            page = paginator.paginate_filtered(doctors, request, available_on(date_obj))
         else:
+            page = paginator.paginate_queryset(doctors, request, view=self)
+
+        response = paginator.get_paginated_response(DoctorSummarySerializer(page, many=True).data)
+        response.data['facets'] = {'specializations': facets}
+        return response
+
+# medical records
+class MedicalRecordListCreateView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        records = self.caller_queryset(get_caller(request))
+        if records is None:
             return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
 
-        serializer = MedicalRecordSerializer(records, many=True)
-        return Response(serializer.data)
+        paginator = MedicalRecordCursorPagination()
+        page = paginator.paginate_queryset(records, request, view=self)
+        serializer = MedicalRecordSerializer(page, many=True, context={'expand': get_expand(request)})
+        return paginator.get_paginated_response(serializer.data)
+
+    def caller_queryset(self, caller):
+        """The records the caller may see, or None if they have no profile."""
+        if caller.is_superuser:
+            records = MedicalRecord.objects.all()
+        elif caller.doctor_id is not None:
+            records = MedicalRecord.objects.filter(doctor_id=caller.doctor_id)
+        elif caller.patient_id is not None:
+            records = MedicalRecord.objects.filter(patient_id=caller.patient_id)
+        else:
+            return None
+        return records.select_related('doctor', 'patient')
 
     def post(self, request):
-        user = request.user
-        if not (user.is_superuser or hasattr(user, 'doctor_profile')):
+        caller = get_caller(request)
+        if not (caller.is_superuser or caller.doctor is not None):
             return Response({'error': 'Only doctors or admins can create medical records.'}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = MedicalRecordSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(doctor=user.doctor_profile if hasattr(user, 'doctor_profile') else None)
+            serializer.save(doctor=caller.doctor)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class MedicalRecordSearchView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = match_query(request.query_params.get('q', ''))
+        if query is None:
+            return Response({"error": "'q' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # same scope as the record list
+        caller = get_caller(request)
+        if caller.is_superuser:
+            scope = {}
+        elif caller.doctor_id is not None:
+            scope = {'doctor_id': caller.doctor_id}
+        elif caller.patient_id is not None:
+            scope = {'patient_id': caller.patient_id}
+        else:
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        using = router.db_for_read(MedicalRecord)
+        if not search_available(using):
+            return Response({'error': 'Search is not available on this database.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        paginator = SearchCursorPagination()
+        page = paginator.paginate_search(
+            lambda position, reverse, limit: search_records(query, **scope, position=position, reverse=reverse, limit=limit, using=using),
+            request
+        )
+        data = MedicalRecordSerializer(page, many=True, context={'expand': get_expand(request)}).data
+        for item, record in zip(data, page):
+            item['snippet'] = record.snippet
+            item['rank'] = record.rank
+        return paginator.get_paginated_response(data)
+
+class MedicalRecordExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not get_caller(request).is_superuser:
+            return Response({'error': 'Only admins can export medical records.'}, status=status.HTTP_403_FORBIDDEN)
+
+        # not 'format', DRF reserves it for picking a renderer
+        output = request.query_params.get('output', 'ndjson')
+        if output not in FORMATS:
+            return Response({'error': f"'output' must be one of: {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start_date, end_date = [
+                datetime.strptime(value, "%Y-%m-%d").date() if value else None
+                for value in (request.query_params.get('start_date'), request.query_params.get('end_date'))
+            ]
+        except ValueError:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            doctor_ids = {int(doctor_id) for doctor_id in request.query_params.get('doctor_ids', '').split(',') if doctor_id.strip()}
+        except ValueError:
+            return Response({"error": "'doctor_ids' must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        records = export_queryset(start_date, end_date, doctor_ids)
+        # under ASGI a sync iterator would be read into memory before sending
+        if isinstance(request._request, ASGIRequest):
+            content = astream_records(records, output)
+        else:
+            content = stream_records(records, output)
+
+        response = StreamingHttpResponse(content, content_type=FORMATS[output])
+        response['Content-Disposition'] = f'attachment; filename="medical-records.{output}"'
+        return response
+
+
 class MedicalRecordDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -379,8 +828,8 @@ class MedicalRecordDetailView(APIView):
             record = MedicalRecord.objects.get(id=pk)
         except MedicalRecord.DoesNotExist:
             return Response({"error": "Record not found."}, status=status.HTTP_404_NOT_FOUND)
-        user = request.user
-        if not (user.is_superuser or (hasattr(user, 'doctor_profile') and record.doctor == user.doctor_profile)):
+        caller = get_caller(request)
+        if not (caller.is_superuser or (caller.doctor_id is not None and record.doctor_id == caller.doctor_id)):
             return Response({'error': 'You do not have permission to update this record.'}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = MedicalRecordSerializer(record, data=request.data, partial=True)
@@ -394,8 +843,8 @@ class MedicalRecordDetailView(APIView):
             record = MedicalRecord.objects.get(id=pk)
         except MedicalRecord.DoesNotExist:
             return Response({"error": "Record not found."}, status=status.HTTP_404_NOT_FOUND)
-        user = request.user
-        if not (user.is_superuser or (hasattr(user, 'doctor_profile') and record.doctor == user.doctor_profile)):
+        caller = get_caller(request)
+        if not (caller.is_superuser or (caller.doctor_id is not None and record.doctor_id == caller.doctor_id)):
             return Response({'error': 'You do not have permission to delete this record.'}, status=status.HTTP_403_FORBIDDEN)
 
         record.delete()
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
+# the async read views only pay off under ASGI, under WSGI Django would run
+# them through async_to_sync
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'healthcare.asgi_urls')
 
 application = get_asgi_application()
+
+# build what the first request would otherwise pay for before taking traffic
+from api.startup import warm_up_if_enabled
+warm_up_if_enabled()
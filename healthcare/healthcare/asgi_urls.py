@@ -0,0 +1,12 @@
+"""
+URL configuration under ASGI, set by healthcare.asgi: the routes of
+healthcare.urls with the API from api.asgi_urls.
+"""
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [
+    path('api/', include('api.asgi_urls')) if str(pattern.pattern) == 'api/' else pattern
+    for pattern in urls.urlpatterns
+]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,7 +44,6 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'api',
     # 'oauth2_provider',
-    'drf_spectacular',
     'drf_yasg',
 ]
 
@@ -51,18 +51,22 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'api.CustomUser'
 
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.AsyncWhiteNoiseMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.replicas.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'healthcare.urls'
+# healthcare.asgi switches to healthcare.asgi_urls, which serves the read
+# endpoints with the async views
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'healthcare.urls')
 
 TEMPLATES = [
     {
@@ -85,12 +89,71 @@ WSGI_APPLICATION = 'healthcare.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# test database
+# SQLite connection profiles. "tuned" is the one to run several server
+# processes with: WAL lets readers carry on while a writer commits, IMMEDIATE
+# transactions take the write lock when they begin instead of failing to
+# upgrade a read lock, and writers wait up to `timeout` seconds for the lock
+# rather than raising "database is locked". Connections are not kept open
+# between requests: under ASGI every request runs in a new context, so a
+# persistent connection is never reused nor closed, and opening a SQLite file
+# is cheap. "default" is Django's stock setup, kept for comparison (see the
+# bench_sqlite command).
+SQLITE_PROFILES = {
+    'default': {
+        'OPTIONS': {},
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+    },
+    'tuned': {
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        **SQLITE_PROFILES[os.environ.get('SQLITE_PROFILE', 'tuned')],
+        # file-backed so concurrency tests can open real connections from
+        # other threads, an in-memory shared cache fails them with "table is locked"
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # read replica of default, only used while REPLICA_ROUTING is enabled.
+    # Locally a second SQLite file refreshed with `manage.py sync_replica`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('REPLICA_DATABASE_NAME', BASE_DIR / 'db_replica.sqlite3'),
+        **SQLITE_PROFILES[os.environ.get('SQLITE_PROFILE', 'tuned')],
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db_replica.sqlite3',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# reads of the list, availability and profile endpoints go to the replica,
+# writes to default. A user who sent a write reads from default for the next
+# STICKY_SECONDS so they see their own changes; that window should exceed the
+# replica's usual lag. Pins live in the default cache, which must be shared
+# between server processes.
+REPLICA_ROUTING = {
+    'ENABLED': os.environ.get('REPLICA_ROUTING') == '1',
+    'STICKY_SECONDS': 10,
 }
 
 
@@ -98,10 +161,79 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 
-    # 'DEFAULT_AUTHENTICATION_CLASSES': (
-    #     'rest_framework.authentication.TokenAuthentication',
-    #     # 'rest_framework.authentication.SessionAuthentication',
-    # ),
+    # session first so unauthenticated requests keep getting 403 rather than 401
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.SignedTokenAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ),
+}
+
+# per-process token -> user cache used by CachedTokenAuthentication,
+# TTL in seconds bounds how long other workers may serve a revoked token
+TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
+# signed access/refresh tokens (api.tokens). When enabled, login returns a
+# short-lived access token that verifies without a query, sent as
+# "Authorization: Bearer <token>", and a refresh token. Access tokens can't be
+# revoked, ACCESS_TTL bounds how long one outlives a logout or role change.
+SIGNED_TOKENS = {
+    'ENABLED': False,
+    'ACCESS_TTL': 300,
+    'REFRESH_TTL': 14 * 24 * 3600,
+}
+
+# availability responses are cached per doctor and invalidated through a
+# version counter in the default cache. With several server processes the
+# default cache must be shared (Redis, Memcached, database) or processes
+# keep serving their own stale copies until AVAILABILITY_CACHE_TIMEOUT.
+AVAILABILITY_CACHE_TIMEOUT = 300
+
+# background job queue (api.jobs), run with `manage.py run_jobs`. Failed
+# jobs are retried after BACKOFF * 2^(attempt - 1) seconds, capped at
+# MAX_BACKOFF; a job whose worker died is claimed again after LEASE seconds.
+JOB_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 10,
+    'MAX_BACKOFF': 3600,
+    'LEASE': 600,
+}
+
+DEFAULT_FROM_EMAIL = 'no-reply@example.com'
+
+# the OpenAPI schema behind /swagger.json and the UI pages is built once per
+# process and served with an ETag and a max-age of MAX_AGE seconds. Run
+# `manage.py generate_schema` on deploy to write it to DIR, so processes
+# read it from there instead of introspecting the API.
+OPENAPI_SCHEMA = {
+    'DIR': os.environ.get('OPENAPI_SCHEMA_DIR') or None,
+    'MAX_AGE': 24 * 3600,
+}
+
+# the WSGI and ASGI entry points import the URLconf, resolve every view's
+# classes, build the serializers' fields and, with SCHEMA, the OpenAPI schema
+# before the worker takes traffic (api.startup). `manage.py startup_report`
+# shows what each step and each app's startup costs.
+WARMUP = {
+    'ENABLED': os.environ.get('WARMUP', '1') == '1',
+    'SCHEMA': True,
+}
+
+# per-route request metrics (api.metrics), served at /metrics in the
+# Prometheus text format to admins and to a scraper sending
+# "Authorization: Bearer <TOKEN>". Each process keeps its own totals; with
+# several worker processes set DIR to a directory they share (empty it on
+# deploy) and each writes its totals there at most every FLUSH_SECONDS.
+METRICS = {
+    'ENABLED': True,
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+    'DIR': os.environ.get('METRICS_DIR') or None,
+    'FLUSH_SECONDS': 5,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
 }
 
 # actuall database
@@ -171,7 +303,6 @@ CORS_ALLOW_HEADERS = [
 ]
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
-import os
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
@@ -19,28 +19,26 @@ from django.urls import include, path
 from django.urls import path, re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from api.schema import API_INFO, cached_schema_view
+from api.views import MetricsView
 
+# the stock drf_yasg view introspects the API on every hit, the cached one
+# serves the spec from api.schema.get_schema()
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Healthcare Appointment API",
-        default_version='v1',
-        description="API documentation for the healthcare appointment scheduling system.",
-        owner="the-quiesscent-hub.vercel.app",
-        contact=openapi.Contact(email="ephesianslewis@gmail.com"),
-        license=openapi.License(name="MIT License"),
-    ),
+    API_INFO,
     public=True,
     # permission_classes=(permissions.AllowAny),
 )
+cached_schema = cached_schema_view(schema_view)
 
 urlpatterns = [
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', cached_schema.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', cached_schema.without_ui(cache_timeout=0), name='schema-json'),
+    path('', cached_schema.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('swagger/', cached_schema.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     # path('o/', include('oauth2_provider.urls', namespace='oauth2_provider')),
 
 
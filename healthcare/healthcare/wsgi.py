@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
 
 application = get_wsgi_application()
+
+# build what the first request would otherwise pay for before taking traffic
+from api.startup import warm_up_if_enabled
+warm_up_if_enabled()